@@ -0,0 +1,26 @@
+from datetime import datetime
+from core.exports import Colonne, DefinitionExport
+from .models import MouvementCaisse
+
+
+def filtrer_mouvements(params):
+    """Mouvements de caisse de la période demandée (dates invalides ignorées)"""
+    qs = MouvementCaisse.objects.order_by('date', 'id')
+    for param, lookup in (('date_debut', 'date__gte'), ('date_fin', 'date__lte')):
+        valeur = params.get(param)
+        if not valeur:
+            continue
+        try:
+            qs = qs.filter(**{lookup: datetime.strptime(valeur, '%Y-%m-%d').date()})
+        except ValueError:
+            pass
+    return qs
+
+
+MOUVEMENTS_CAISSE = DefinitionExport('caisse_export', 'Caisse', [
+    Colonne('Date', 'date', formater=lambda d: d.isoformat()),
+    Colonne('Libellé', 'libelle'),
+    Colonne('Montant entrée', 'montant_entree', formater=str),
+    Colonne('Montant sortie', 'montant_sortie', formater=str),
+    Colonne('Observations', 'observations', formater=lambda o: (o or '').replace('\n', ' ')),
+], filtrer_mouvements)
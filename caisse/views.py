@@ -1,11 +1,13 @@
 from django.shortcuts import render, redirect
 from django.contrib import messages
 from django.urls import reverse
-from django.http import HttpResponse
 from django.db.models import Sum
 from django.db.models.functions import TruncMonth
 from datetime import datetime
+from core.agregats import calculer_totaux, somme
+from core.exports import reponse_export
 from .models import MouvementCaisse
+from . import exports
 from .forms import MouvementCaisseForm
 
 
@@ -32,21 +34,14 @@ def caisse_list(request):
     elif date_fin:
         qs = qs.filter(date__lte=date_fin)
 
-    total_entree = qs.aggregate(s=Sum('montant_entree'))['s'] or 0
-    total_sortie = qs.aggregate(s=Sum('montant_sortie'))['s'] or 0
+    totaux = calculer_totaux(qs, total_entree=somme('montant_entree'), total_sortie=somme('montant_sortie'))
+    total_entree = totaux['total_entree']
+    total_sortie = totaux['total_sortie']
     solde = total_entree - total_sortie
 
     # Export CSV
     if request.GET.get('export') == 'csv':
-        import csv
-        response = HttpResponse(content_type='text/csv')
-        filename = 'caisse_export.csv'
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        writer = csv.writer(response)
-        writer.writerow(['Date', 'Libellé', 'Montant entrée', 'Montant sortie', 'Observations'])
-        for m in qs.order_by('date', 'id'):
-            writer.writerow([m.date.isoformat(), m.libelle or '', f"{m.montant_entree}", f"{m.montant_sortie}", (m.observations or '').replace('\n', ' ')])
-        return response
+        return reponse_export(request, exports.MOUVEMENTS_CAISSE, format_fichier='csv')
 
     # Résumés quotidiens et mensuels
     resume_jour_qs = (
@@ -109,8 +104,9 @@ def caisse_print(request):
     elif date_fin:
         qs = qs.filter(date__lte=date_fin)
 
-    total_entree = qs.aggregate(s=Sum('montant_entree'))['s'] or 0
-    total_sortie = qs.aggregate(s=Sum('montant_sortie'))['s'] or 0
+    totaux = calculer_totaux(qs, total_entree=somme('montant_entree'), total_sortie=somme('montant_sortie'))
+    total_entree = totaux['total_entree']
+    total_sortie = totaux['total_sortie']
     solde = total_entree - total_sortie
 
     resume_jour_qs = (
@@ -1,9 +1,10 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Sum, Count, Q
+from django.db.models import Count, Q
 from django.utils import timezone
 from django.core.paginator import Paginator
+from core.agregats import calculer_totaux, somme
 from .models import CategorieCharge, Charge, BudgetAnnuel
 
 
@@ -14,18 +15,18 @@ def charge_list(request):
 
     # Statistiques rapides pour l'en-tête
     now = timezone.now()
-    total_charges = charges.aggregate(total=Sum('montant'))['total'] or 0
-    charges_mois = charges.filter(date__year=now.year, date__month=now.month).aggregate(total=Sum('montant'))['total'] or 0
-    charges_fixes = charges.filter(categorie__type_charge='fixe').aggregate(total=Sum('montant'))['total'] or 0
-    charges_variables = charges.filter(categorie__type_charge='variable').aggregate(total=Sum('montant'))['total'] or 0
+    totaux = calculer_totaux(
+        charges,
+        total_charges=somme('montant'),
+        charges_mois=somme('montant', date__year=now.year, date__month=now.month),
+        charges_fixes=somme('montant', categorie__type_charge='fixe'),
+        charges_variables=somme('montant', categorie__type_charge='variable'),
+    )
     
     context = {
         'title': 'Gestion des Charges',
         'charges': charges,
-        'total_charges': total_charges,
-        'charges_mois': charges_mois,
-        'charges_fixes': charges_fixes,
-        'charges_variables': charges_variables,
+        **totaux,
     }
     return render(request, 'charges/charge_list.html', context)
 
@@ -98,18 +99,15 @@ def budget_create(request):
 @login_required
 def statistiques_charges(request):
     """Statistiques des charges"""
-    total_charges = Charge.objects.aggregate(Sum('montant'))['montant__sum'] or 0
-    charges_fixes = Charge.objects.filter(categorie__type_charge='fixe').aggregate(
-        Sum('montant')
-    )['montant__sum'] or 0
-    charges_variables = Charge.objects.filter(categorie__type_charge='variable').aggregate(
-        Sum('montant')
-    )['montant__sum'] or 0
+    totaux = calculer_totaux(
+        Charge.objects.all(),
+        total_charges=somme('montant'),
+        charges_fixes=somme('montant', categorie__type_charge='fixe'),
+        charges_variables=somme('montant', categorie__type_charge='variable'),
+    )
     
     context = {
         'title': 'Statistiques Charges',
-        'total_charges': total_charges,
-        'charges_fixes': charges_fixes,
-        'charges_variables': charges_variables,
+        **totaux,
     }
     return render(request, 'charges/statistiques.html', context)
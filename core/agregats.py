@@ -0,0 +1,22 @@
+from django.db.models import Q, Sum
+
+
+def somme(champ, **filtres):
+    """
+    Somme d'un champ, restreinte aux lignes vérifiant les filtres donnés
+    (équivalent SQL : SUM(...) FILTER (WHERE ...))
+    """
+    if filtres:
+        return Sum(champ, filter=Q(**filtres))
+    return Sum(champ)
+
+
+def calculer_totaux(queryset, **agregats):
+    """
+    Calcule tous les totaux d'une vue en une seule requête aggregate().
+    Les totaux sans aucune ligne valent 0.
+    Usage: calculer_totaux(ventes, total=somme('total_vente'),
+                           cash=somme('total_vente', type_vente='cash'))
+    """
+    resultats = queryset.aggregate(**agregats)
+    return {nom: valeur or 0 for nom, valeur in resultats.items()}
@@ -5,3 +5,13 @@ class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
     verbose_name = 'Tableau de bord'
+
+    def ready(self):
+        from django.db.models.signals import post_migrate
+        from .recherche import installer_tout
+        from .recherche_globale import installer_apres_migrate
+        from .signals import connecter_referentiels, connecter_sequences
+        connecter_referentiels()
+        connecter_sequences()
+        post_migrate.connect(installer_tout, sender=self, dispatch_uid='core.recherche')
+        post_migrate.connect(installer_apres_migrate, sender=self, dispatch_uid='core.recherche_globale')
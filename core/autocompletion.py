@@ -0,0 +1,330 @@
+"""
+Index en mémoire pour l'autocomplétion (clients, produits).
+
+Les fiches sont rangées dans deux textes contigus (texte normalisé pour la
+recherche, texte d'affichage), une fiche par ligne, avec des tableaux
+d'entiers pour les positions et les identifiants. Les débuts de mots du
+texte normalisé sont triés par ordre alphabétique : une recherche par
+préfixe (sur le nom, le prénom, le téléphone...) est une recherche
+dichotomique, quel que soit le nombre de fiches. Si elle ne suffit pas à
+remplir la réponse, la recherche par sous-chaîne part des trigrammes :
+chaque suite de trois caractères d'une fiche y renvoie (liste triée des
+numéros de fiche), et seules les fiches de la liste la plus courte parmi
+les trigrammes de la requête sont vérifiées. Une sous-chaîne rare ou
+absente ne parcourt donc plus tout le texte. Sur 500 000 clients, les
+trigrammes ajoutent environ 45 Mo et 6 s de construction ; les requêtes
+ne contenant que des trigrammes très courants et presque sans réponse
+(« ama ama ») restent les plus lentes, autour de 3 à 5 ms.
+
+L'index est tenu à jour fiche par fiche à partir des signaux des modèles
+(voir core.referentiel.abonner). Une modification faite par un autre
+processus est détectée par le numéro de version du référentiel (avec un
+cache partagé) ou, avec le cache local par défaut, par l'âge de l'index
+(DUREE_INDEX) ; elle déclenche une reconstruction en arrière-plan, et
+l'ancien index continue de répondre pendant ce temps.
+"""
+import re
+import threading
+import time
+import unicodedata
+from array import array
+from bisect import bisect_left, bisect_right, insort
+
+import numpy as np
+
+from django.apps import apps
+
+from . import referentiel
+
+# Nombre maximal de résultats renvoyés
+LIMITE = 20
+
+# Nombre de caractères utilisés pour trier les débuts de mots
+LONGUEUR_TRI = 32
+
+# Candidats examinés au plus pour une recherche à plusieurs mots
+MAX_CANDIDATS = 5000
+
+# Au-delà, les fiches candidates d'une recherche par sous-chaîne sont
+# d'abord réduites aux fiches contenant aussi les autres trigrammes
+MAX_VERIFICATIONS = 500
+
+# Longueur des sous-chaînes indexées (et longueur minimale d'une recherche
+# par sous-chaîne)
+TAILLE_TRIGRAMME = 3
+
+# Âge maximal de l'index avant une reconstruction en arrière-plan
+# (secondes) : délai maximal avant que les modifications des autres
+# processus soient vues avec le cache local par défaut
+DUREE_INDEX = 300
+
+MOT = re.compile(r'[^ \n]+')
+
+
+def normaliser(valeur):
+    """Minuscules sans accents, sans retour à la ligne"""
+    if not valeur:
+        return ''
+    texte = unicodedata.normalize('NFKD', str(valeur))
+    texte = ''.join(c for c in texte if not unicodedata.combining(c))
+    return texte.lower().replace('\n', ' ')
+
+
+class IndexAutocompletion:
+    """
+    Index d'autocomplétion d'un référentiel.
+    champs: champs du modèle indexés ; libelle: fonction recevant les
+    valeurs de ces champs et retournant le texte affiché.
+    """
+    def __init__(self, nom, modele, champs, libelle):
+        self.nom = nom
+        self.modele = modele
+        self.champs = champs
+        self.libelle = libelle
+        self._verrou = threading.Lock()
+        self._verrou_chargement = threading.Lock()
+        self._reconstruction = None
+        self._charge = False
+        referentiel.abonner(nom, self.appliquer)
+
+    # Construction
+
+    def _texte_recherche(self, valeurs):
+        mots = []
+        for valeur in valeurs:
+            valeur = normaliser(valeur)
+            if not valeur:
+                continue
+            mots.append(valeur)
+            chiffres = ''.join(c for c in valeur if c.isdigit())
+            if len(chiffres) >= 4 and chiffres not in valeur:
+                # Téléphone saisi avec des espaces : aussi cherchable d'un bloc
+                mots.append(chiffres)
+        return ' '.join(mots)
+
+    def _construire(self):
+        """Lit toutes les fiches en base et retourne le nouvel état de l'index"""
+        lecture = time.monotonic()
+        version = referentiel.version(self.nom)
+        lignes = apps.get_model(self.modele).objects.order_by('pk').values_list('pk', *self.champs)
+        pks = array('q')
+        recherche, affichage = [], []
+        for pk, *valeurs in lignes.iterator(chunk_size=5000):
+            pks.append(pk)
+            recherche.append(self._texte_recherche(valeurs))
+            affichage.append(self.libelle(*valeurs).replace('\n', ' '))
+        texte = '\n' + '\n'.join(recherche) + '\n'
+        debuts = array('q')
+        position = 1
+        for ligne in recherche:
+            debuts.append(position)
+            position += len(ligne) + 1
+        texte_affichage = '\n'.join(affichage)
+        debuts_affichage = array('q')
+        position = 0
+        for ligne in affichage:
+            debuts_affichage.append(position)
+            position += len(ligne) + 1
+        mots = array('q', sorted(self._debuts_de_mots(texte, 1, len(texte)), key=self._cle_tri(texte)))
+        trigrammes = {}
+        for i, ligne in enumerate(recherche):
+            self._indexer_trigrammes(trigrammes, ligne, i)
+        return {
+            'version': version, 'texte': texte, 'debuts': debuts, 'pks': pks, 'nb_base': len(pks),
+            'affichage': texte_affichage, 'debuts_affichage': debuts_affichage,
+            'mots': mots, 'trigrammes': trigrammes, 'ajouts': {}, 'supprimes': set(),
+            'lecture': lecture, 'appliquees': set(),
+        }
+
+    @staticmethod
+    def _indexer_trigrammes(trigrammes, ligne, i):
+        """Ajoute la fiche numéro i à la liste de chacun des trigrammes de sa ligne"""
+        for trigramme in {ligne[k:k + TAILLE_TRIGRAMME] for k in range(len(ligne) - TAILLE_TRIGRAMME + 1)}:
+            fiches = trigrammes.get(trigramme)
+            if fiches is None:
+                fiches = trigrammes[trigramme] = array('i')
+            fiches.append(i)
+
+    @staticmethod
+    def _debuts_de_mots(texte, debut, fin):
+        return (mot.start() for mot in MOT.finditer(texte, debut, fin))
+
+    @staticmethod
+    def _cle_tri(texte):
+        return lambda position: texte[position:position + LONGUEUR_TRI]
+
+    def _installer(self, etat):
+        with self._verrou:
+            self.__dict__.update({'_' + cle: valeur for cle, valeur in etat.items()})
+            self._charge = True
+
+    def _verifier(self):
+        """Charge l'index au premier appel, ou le reconstruit s'il est périmé"""
+        if not self._charge:
+            with self._verrou_chargement:
+                if not self._charge:
+                    self._installer(self._construire())
+            return
+        if self._reconstruction is None and not self._a_jour():
+            self._reconstruction = threading.Thread(target=self._reconstruire, daemon=True)
+            self._reconstruction.start()
+
+    def _a_jour(self):
+        """
+        Vrai si l'index a moins de DUREE_INDEX secondes et n'a manqué aucune
+        version : celles qui ont suivi sa construction ont toutes été
+        appliquées ici, fiche par fiche
+        """
+        if time.monotonic() - self._lecture >= DUREE_INDEX:
+            return False
+        courante = referentiel.version(self.nom)
+        if courante < self._version or courante - self._version > len(self._appliquees):
+            return False
+        return all(v in self._appliquees for v in range(self._version + 1, courante + 1))
+
+    def _reconstruire(self):
+        from django.db import connection
+        try:
+            self._installer(self._construire())
+        finally:
+            self._reconstruction = None
+            connection.close()
+
+    # Mise à jour fiche par fiche
+
+    def _position(self, pk):
+        """Numéro de la fiche courante d'un identifiant, ou None"""
+        if pk in self._ajouts:
+            return self._ajouts[pk]
+        i = bisect_left(self._pks, pk, 0, self._nb_base)
+        if i < self._nb_base and self._pks[i] == pk and i not in self._supprimes:
+            return i
+        return None
+
+    def appliquer(self, instance, supprime):
+        """Reporte dans l'index l'enregistrement ou la suppression d'une fiche"""
+        if not self._charge:
+            return
+        with self._verrou:
+            ancienne = self._position(instance.pk)
+            if ancienne is not None:
+                self._supprimes.add(ancienne)
+                self._ajouts.pop(instance.pk, None)
+            if not supprime:
+                valeurs = [getattr(instance, champ) for champ in self.champs]
+                ligne = self._texte_recherche(valeurs)
+                debut = len(self._texte)
+                self._texte += ligne + '\n'
+                self._debuts.append(debut)
+                self._pks.append(instance.pk)
+                self._ajouts[instance.pk] = len(self._pks) - 1
+                self._debuts_affichage.append(len(self._affichage) + 1)
+                self._affichage += '\n' + self.libelle(*valeurs).replace('\n', ' ')
+                cle = self._cle_tri(self._texte)
+                for position in self._debuts_de_mots(self._texte, debut, len(self._texte) - 1):
+                    insort(self._mots, position, key=cle)
+                self._indexer_trigrammes(self._trigrammes, ligne, len(self._pks) - 1)
+            # La version de construction reste celle de la lecture en base : une
+            # modification d'un autre processus non appliquée ici reste visible
+            self._appliquees.add(referentiel.version(self.nom))
+            trop_de_supprimes = len(self._supprimes) > max(1000, len(self._pks) // 10)
+        if trop_de_supprimes and self._reconstruction is None:
+            self._reconstruction = threading.Thread(target=self._reconstruire, daemon=True)
+            self._reconstruction.start()
+
+    # Recherche
+
+    def _intervalle(self, prefixe):
+        """Intervalle de self._mots dont le mot commence par le préfixe"""
+        cle = self._cle_tri(self._texte)
+        debut = bisect_left(self._mots, prefixe, key=lambda p: cle(p)[:len(prefixe)])
+        fin = bisect_right(self._mots, prefixe, lo=debut, key=lambda p: cle(p)[:len(prefixe)])
+        return debut, fin
+
+    def _fiche(self, position):
+        return bisect_right(self._debuts, position) - 1
+
+    def _texte_fiche(self, i):
+        fin = self._debuts[i + 1] - 1 if i + 1 < len(self._debuts) else len(self._texte) - 1
+        return self._texte[self._debuts[i]:fin]
+
+    def _candidats(self, requete):
+        """
+        Numéros des fiches pouvant contenir la requête (3 caractères ou
+        plus), dans l'ordre : celles de son trigramme le plus rare. Au-delà
+        des MAX_VERIFICATIONS premières, le reste n'est parcouru qu'une fois
+        réduit aux fiches contenant aussi tous les autres trigrammes
+        (requête faite seulement de trigrammes courants, peu de réponses).
+        """
+        listes = sorted(
+            (self._trigrammes.get(requete[k:k + TAILLE_TRIGRAMME], ())
+             for k in range(len(requete) - TAILLE_TRIGRAMME + 1)),
+            key=len,
+        )
+        yield from listes[0][:MAX_VERIFICATIONS]
+        if len(listes[0]) <= MAX_VERIFICATIONS:
+            return
+        # Listes triées : intersection par recherche dichotomique (NumPy)
+        communes = np.array(listes[0][MAX_VERIFICATIONS:], dtype=np.int32)
+        for fiches in listes[1:]:
+            fiches = np.array(fiches, dtype=np.int32)
+            if not len(fiches):
+                return
+            positions = np.minimum(np.searchsorted(fiches, communes), len(fiches) - 1)
+            communes = communes[fiches[positions] == communes]
+        yield from communes.tolist()
+
+    def _libelle_fiche(self, i):
+        debut = self._debuts_affichage[i]
+        fin = self._debuts_affichage[i + 1] - 1 if i + 1 < len(self._debuts_affichage) else len(self._affichage)
+        return self._affichage[debut:fin]
+
+    def rechercher(self, requete, limite=LIMITE):
+        """
+        Fiches dont un mot commence par chaque mot de la requête, complétées
+        par les fiches contenant la requête. Retourne [(pk, libellé), ...].
+        """
+        mots = normaliser(requete).split()
+        if not mots:
+            return []
+        if all(m.isdigit() for m in mots):
+            # Numéro de téléphone tapé avec des espaces
+            mots = [''.join(mots)]
+        self._verifier()
+        with self._verrou:
+            trouvees = []
+            vues = set()
+
+            # Parcours des débuts de mots du préfixe le plus sélectif,
+            # les autres mots sont vérifiés sur la fiche
+            intervalles = [self._intervalle(m[:LONGUEUR_TRI]) for m in mots]
+            rang = min(range(len(mots)), key=lambda k: intervalles[k][1] - intervalles[k][0])
+            debut, fin = intervalles[rang]
+            autres = [' ' + m for k, m in enumerate(mots) if k != rang]
+            for position in self._mots[debut:min(fin, debut + MAX_CANDIDATS)]:
+                i = self._fiche(position)
+                if i in vues or i in self._supprimes:
+                    continue
+                vues.add(i)
+                if autres:
+                    texte = ' ' + self._texte_fiche(i)
+                    if not all(m in texte for m in autres):
+                        continue
+                trouvees.append(i)
+                if len(trouvees) >= limite:
+                    break
+
+            # Sous-chaîne n'importe où dans la fiche
+            requete_normalisee = ' '.join(mots)
+            if len(trouvees) < limite and len(requete_normalisee) >= TAILLE_TRIGRAMME:
+                for i in self._candidats(requete_normalisee):
+                    if i in vues or i in self._supprimes:
+                        continue
+                    fin = self._debuts[i + 1] - 1 if i + 1 < len(self._debuts) else len(self._texte) - 1
+                    if self._texte.find(requete_normalisee, self._debuts[i], fin) != -1:
+                        vues.add(i)
+                        trouvees.append(i)
+                        if len(trouvees) >= limite:
+                            break
+
+            return [(self._pks[i], self._libelle_fiche(i)) for i in trouvees]
@@ -0,0 +1,181 @@
+"""
+Moteur d'export Excel/CSV en flux.
+
+Chaque export est déclaré par une DefinitionExport (colonnes + fonction de
+filtrage). Les lignes sont lues par lots avec values_list().iterator(),
+sans instancier de modèles, puis écrites dans un classeur en écriture seule
+(XLSX) ou directement dans la réponse (CSV) : la mémoire reste constante
+quel que soit le nombre de lignes exportées.
+"""
+import csv
+import tempfile
+
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils.module_loading import import_string
+
+CONTENT_TYPE_XLSX = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# Nombre de lignes lues en base par aller-retour
+TAILLE_LOT = 2000
+
+# Exports disponibles en tâche de fond : nom -> (libellé, définition)
+DEFINITIONS = {
+    'ventes': ('Ventes', 'ventes.exports.VENTES'),
+    'clients': ('Clients', 'ventes.exports.CLIENTS'),
+    'credits': ('Crédits clients', 'credits.exports.CREDITS'),
+    'livraisons': ('Livraisons', 'fournisseurs.exports.LIVRAISONS'),
+    'fournisseurs': ('Fournisseurs', 'fournisseurs.exports.FOURNISSEURS'),
+    'produits': ('Produits', 'fournisseurs.exports.PRODUITS'),
+    'stock_actuel': ('Stock actuel', 'stocks.exports.STOCK_ACTUEL'),
+    'employes': ('Employés', 'personnel.exports.EMPLOYES'),
+}
+
+
+def obtenir_definition(nom):
+    """Retourne la DefinitionExport enregistrée sous ce nom"""
+    return import_string(DEFINITIONS[nom][1])
+
+
+# Formats de cellules usuels
+
+def texte(valeur):
+    return valeur if valeur is not None else ''
+
+
+def nombre(valeur):
+    return float(valeur) if valeur is not None else 0
+
+
+def entier(valeur):
+    return int(round(valeur)) if valeur is not None else 0
+
+
+def date_fr(valeur):
+    return valeur.strftime('%d/%m/%Y') if valeur else ''
+
+
+def date_heure_fr(valeur):
+    return valeur.strftime('%d/%m/%Y %H:%M') if valeur else ''
+
+
+def nom_complet(nom, prenom):
+    if prenom:
+        return f"{nom} {prenom}"
+    return nom or ''
+
+
+def oui_non(valeur):
+    return 'Oui' if valeur else 'Non'
+
+
+class Colonne:
+    """
+    Colonne d'export : un en-tête, un ou plusieurs champs values_list()
+    et une fonction de mise en forme recevant les valeurs de ces champs.
+    """
+    def __init__(self, entete, *champs, formater=texte):
+        self.entete = entete
+        self.champs = champs
+        self.formater = formater
+
+
+class DefinitionExport:
+    """
+    Déclaration d'un export : nom de fichier, titre de feuille, colonnes
+    et fonction construisant le queryset filtré à partir des paramètres
+    (request.GET ou dictionnaire équivalent).
+    """
+    def __init__(self, nom, titre, colonnes, filtrer):
+        self.nom = nom
+        self.titre = titre
+        self.colonnes = colonnes
+        self.filtrer = filtrer
+
+    @property
+    def entetes(self):
+        return [c.entete for c in self.colonnes]
+
+    def lignes(self, params, taille_lot=TAILLE_LOT):
+        """
+        Générateur des lignes mises en forme, lues par lots en base
+        """
+        champs = []
+        for colonne in self.colonnes:
+            for champ in colonne.champs:
+                if champ not in champs:
+                    champs.append(champ)
+        positions = [[champs.index(champ) for champ in c.champs] for c in self.colonnes]
+        queryset = self.filtrer(params).values_list(*champs)
+        for valeurs in queryset.iterator(chunk_size=taille_lot):
+            yield [
+                colonne.formater(*[valeurs[i] for i in position])
+                for colonne, position in zip(self.colonnes, positions)
+            ]
+
+    def ecrire_xlsx(self, fichier, params, progression=None):
+        """
+        Écrit le classeur dans un fichier binaire ouvert et retourne le
+        nombre de lignes exportées. progression, si donnée, est appelée
+        avec le nombre de lignes écrites après chaque lot.
+        """
+        from openpyxl import Workbook
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet(self.titre)
+        ws.append(self.entetes)
+        nb_lignes = 0
+        for ligne in self.lignes(params):
+            ws.append(ligne)
+            nb_lignes += 1
+            if progression and nb_lignes % TAILLE_LOT == 0:
+                progression(nb_lignes)
+        wb.save(fichier)
+        return nb_lignes
+
+    def ecrire_csv(self, fichier, params, progression=None):
+        """
+        Écrit le CSV dans un fichier texte ouvert et retourne le nombre de
+        lignes exportées (progression : voir ecrire_xlsx).
+        """
+        writer = csv.writer(fichier)
+        writer.writerow(self.entetes)
+        nb_lignes = 0
+        for ligne in self.lignes(params):
+            writer.writerow(ligne)
+            nb_lignes += 1
+            if progression and nb_lignes % TAILLE_LOT == 0:
+                progression(nb_lignes)
+        return nb_lignes
+
+
+class _Tampon:
+    """Pseudo-fichier renvoyant directement ce que csv.writer y écrit"""
+    def write(self, valeur):
+        return valeur
+
+
+def reponse_export(request, definition, format_fichier=None):
+    """
+    Réponse HTTP en flux pour un export : XLSX par défaut, CSV avec ?format=csv
+    """
+    format_fichier = format_fichier or request.GET.get('format')
+    if format_fichier == 'csv':
+        writer = csv.writer(_Tampon())
+
+        def flux():
+            yield '\ufeff'  # BOM pour l'ouverture directe dans Excel
+            yield writer.writerow(definition.entetes)
+            for ligne in definition.lignes(request.GET):
+                yield writer.writerow(ligne)
+
+        response = StreamingHttpResponse(flux(), content_type='text/csv; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="{definition.nom}.csv"'
+        return response
+
+    # Le classeur en écriture seule est construit sur disque puis renvoyé par blocs
+    fichier = tempfile.TemporaryFile()
+    definition.ecrire_xlsx(fichier, request.GET)
+    fichier.seek(0)
+    return FileResponse(
+        fichier, as_attachment=True, filename=f"{definition.nom}.xlsx",
+        content_type=CONTENT_TYPE_XLSX,
+    )
@@ -0,0 +1,12 @@
+def identifiant(params, nom):
+    """
+    Identifiant d'objet passé en filtre (magasin, produit, client...) :
+    la valeur du paramètre si c'est un entier positif, sinon None (filtre
+    ignoré). Retourné en chaîne, comme les gabarits le comparent
+    (objet.id|stringformat:"s"). Une valeur modifiée à la main dans l'URL
+    n'atteint ainsi jamais la requête, où elle lèverait une erreur 500.
+    """
+    valeur = (params.get(nom) or '').strip()
+    if valeur.isascii() and valeur.isdigit() and int(valeur) > 0:
+        return str(int(valeur))
+    return None
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from core import recherche_globale
+from core.recherche import INDEX, installer
+
+
+class Command(BaseCommand):
+    help = "Reconstruit les index de recherche plein texte (SQLite FTS5)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('index', nargs='*',
+                            help=f"Index à reconstruire ({', '.join(INDEX)}, globale), tous par défaut")
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            self.stdout.write("Base non SQLite : la recherche utilise des filtres simples, rien à reconstruire.")
+            return
+        noms = options['index'] or [*INDEX, 'globale']
+        inconnus = [nom for nom in noms if nom not in INDEX and nom != 'globale']
+        if inconnus:
+            raise CommandError(f"Index inconnu(s) : {', '.join(inconnus)}")
+        for nom in noms:
+            if nom == 'globale':
+                recherche_globale.installer(reconstruire_index=True)
+            else:
+                installer(nom, reconstruire=True)
+        self.stdout.write(self.style.SUCCESS(f"{len(noms)} index reconstruit(s)."))
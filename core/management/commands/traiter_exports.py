@@ -0,0 +1,35 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from core.models import TacheExport
+
+
+class Command(BaseCommand):
+    help = "Traite les exports demandés en tâche de fond (worker)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--une-fois', action='store_true',
+                            help="Traiter les tâches en attente puis s'arrêter")
+        parser.add_argument('--intervalle', type=float, default=5,
+                            help="Secondes d'attente lorsque la file est vide")
+        parser.add_argument('--delai-abandon', type=int, default=10,
+                            help="Minutes sans signe de vie après lesquelles une tâche en cours "
+                                 "est reprise (worker arrêté pendant le traitement)")
+
+    def handle(self, *args, **options):
+        delai_abandon = timedelta(minutes=options['delai_abandon'])
+        while True:
+            tache = TacheExport.prendre_suivante(delai_abandon)
+            if tache is None:
+                if options['une_fois']:
+                    return
+                time.sleep(options['intervalle'])
+                continue
+            self.stdout.write(f"Traitement de {tache}...")
+            if not tache.executer():
+                self.stdout.write(self.style.WARNING(f"{tache} : reprise par un autre worker, résultat ignoré"))
+            elif tache.statut == 'termine':
+                self.stdout.write(self.style.SUCCESS(f"{tache} : {tache.nb_lignes} ligne(s)"))
+            else:
+                self.stdout.write(self.style.ERROR(f"{tache} : {tache.erreur}"))
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.30 on 2026-10-17 14:22
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TacheExport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type_export', models.CharField(choices=[('ventes', 'Ventes'), ('clients', 'Clients'), ('credits', 'Crédits clients'), ('livraisons', 'Livraisons'), ('fournisseurs', 'Fournisseurs'), ('produits', 'Produits'), ('stock_actuel', 'Stock actuel'), ('employes', 'Employés')], max_length=50, verbose_name="Type d'export")),
+                ('format_fichier', models.CharField(choices=[('xlsx', 'Excel'), ('csv', 'CSV')], default='xlsx', max_length=4, verbose_name='Format')),
+                ('parametres', models.JSONField(blank=True, default=dict, verbose_name='Filtres')),
+                ('statut', models.CharField(choices=[('en_attente', 'En attente'), ('en_cours', 'En cours'), ('termine', 'Terminé'), ('echec', 'Échec')], default='en_attente', max_length=20, verbose_name='Statut')),
+                ('fichier', models.FileField(blank=True, null=True, upload_to='exports/', verbose_name='Fichier')),
+                ('nb_lignes', models.IntegerField(blank=True, null=True, verbose_name='Lignes exportées')),
+                ('erreur', models.TextField(blank=True, null=True, verbose_name='Erreur')),
+                ('date_creation', models.DateTimeField(auto_now_add=True, verbose_name='Date de demande')),
+                ('date_debut', models.DateTimeField(blank=True, null=True, verbose_name='Début du traitement')),
+                ('date_fin', models.DateTimeField(blank=True, null=True, verbose_name='Fin du traitement')),
+                ('utilisateur', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='taches_export', to=settings.AUTH_USER_MODEL, verbose_name='Utilisateur')),
+            ],
+            options={
+                'verbose_name': "Tâche d'export",
+                'verbose_name_plural': "Tâches d'export",
+                'ordering': ['-date_creation'],
+                'indexes': [models.Index(fields=['statut', 'date_creation'], name='tache_export_file_idx')],
+            },
+        ),
+    ]
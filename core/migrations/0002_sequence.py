@@ -0,0 +1,26 @@
+# Generated by Django 4.2.30 on 2026-10-17 14:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Sequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('prefixe', models.CharField(max_length=10, unique=True, verbose_name='Préfixe')),
+                ('prochain', models.BigIntegerField(default=1, verbose_name='Prochain numéro libre')),
+            ],
+            options={
+                'verbose_name': 'Séquence de numérotation',
+                'verbose_name_plural': 'Séquences de numérotation',
+                'ordering': ['prefixe'],
+            },
+        ),
+    ]
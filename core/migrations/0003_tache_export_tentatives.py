@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-17 15:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_sequence'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tacheexport',
+            name='tentatives',
+            field=models.PositiveSmallIntegerField(default=0, verbose_name='Prises en charge'),
+        ),
+    ]
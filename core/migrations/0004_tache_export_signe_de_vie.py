@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-17 16:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_tache_export_tentatives'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tacheexport',
+            name='date_signe_de_vie',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Dernier signe de vie'),
+        ),
+    ]
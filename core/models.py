@@ -0,0 +1,181 @@
+import io
+import tempfile
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import models
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .exports import DEFINITIONS, obtenir_definition
+
+# Une tâche en cours sans signe de vie depuis plus longtemps a perdu son
+# worker (arrêt brutal)
+DELAI_ABANDON = timedelta(minutes=10)
+# Intervalle entre deux signes de vie d'une tâche en cours (secondes)
+INTERVALLE_SIGNE_DE_VIE = 30
+# Nombre de prises en charge avant de déclarer une tâche abandonnée en échec
+TENTATIVES_MAX = 3
+
+
+class TacheReprise(Exception):
+    """La tâche a été reprise par un autre worker pendant son traitement"""
+
+
+class TacheExport(models.Model):
+    """
+    Export long exécuté en tâche de fond par la commande traiter_exports.
+    Le fichier produit est enregistré sous MEDIA_ROOT/exports/.
+    """
+    STATUT_CHOICES = [
+        ('en_attente', 'En attente'),
+        ('en_cours', 'En cours'),
+        ('termine', 'Terminé'),
+        ('echec', 'Échec'),
+    ]
+    FORMAT_CHOICES = [
+        ('xlsx', 'Excel'),
+        ('csv', 'CSV'),
+    ]
+
+    utilisateur = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE,
+                                    related_name='taches_export', verbose_name="Utilisateur")
+    type_export = models.CharField(max_length=50, verbose_name="Type d'export",
+                                   choices=[(nom, libelle) for nom, (libelle, _) in DEFINITIONS.items()])
+    format_fichier = models.CharField(max_length=4, choices=FORMAT_CHOICES, default='xlsx',
+                                      verbose_name="Format")
+    parametres = models.JSONField(default=dict, blank=True, verbose_name="Filtres")
+    statut = models.CharField(max_length=20, choices=STATUT_CHOICES, default='en_attente',
+                              verbose_name="Statut")
+    fichier = models.FileField(upload_to='exports/', blank=True, null=True, verbose_name="Fichier")
+    nb_lignes = models.IntegerField(blank=True, null=True, verbose_name="Lignes exportées")
+    erreur = models.TextField(blank=True, null=True, verbose_name="Erreur")
+    tentatives = models.PositiveSmallIntegerField(default=0, verbose_name="Prises en charge")
+
+    # Champs automatiques
+    date_creation = models.DateTimeField(auto_now_add=True, verbose_name="Date de demande")
+    date_debut = models.DateTimeField(blank=True, null=True, verbose_name="Début du traitement")
+    date_fin = models.DateTimeField(blank=True, null=True, verbose_name="Fin du traitement")
+    date_signe_de_vie = models.DateTimeField(blank=True, null=True, verbose_name="Dernier signe de vie")
+
+    class Meta:
+        verbose_name = "Tâche d'export"
+        verbose_name_plural = "Tâches d'export"
+        ordering = ['-date_creation']
+        indexes = [
+            models.Index(fields=['statut', 'date_creation'], name='tache_export_file_idx'),
+        ]
+
+    def __str__(self):
+        return f"Export {self.get_type_export_display()} #{self.pk} ({self.get_statut_display()})"
+
+    @classmethod
+    def reprendre_abandonnees(cls, delai=DELAI_ABANDON):
+        """
+        Remet en attente les tâches en cours sans signe de vie depuis plus
+        de delai (worker arrêté pendant le traitement), ou les passe en
+        échec après TENTATIVES_MAX prises en charge. Retourne le nombre de
+        tâches remises en attente.
+        """
+        limite = timezone.now() - delai
+        abandonnees = cls.objects.filter(
+            Q(date_signe_de_vie__lt=limite) | Q(date_signe_de_vie__isnull=True, date_debut__lt=limite),
+            statut='en_cours',
+        )
+        abandonnees.filter(tentatives__gte=TENTATIVES_MAX).update(
+            statut='echec', erreur="Traitement interrompu à plusieurs reprises.", date_fin=timezone.now()
+        )
+        return abandonnees.update(statut='en_attente', date_debut=None)
+
+    @classmethod
+    def prendre_suivante(cls, delai_abandon=DELAI_ABANDON):
+        """
+        Réserve la plus ancienne tâche en attente, après avoir remis en
+        attente les tâches abandonnées. La réservation est une mise à jour
+        conditionnelle : deux workers ne peuvent pas prendre la même tâche.
+        Retourne None s'il n'y a rien à traiter.
+        """
+        cls.reprendre_abandonnees(delai_abandon)
+        while True:
+            tache = cls.objects.filter(statut='en_attente').order_by('date_creation', 'id').first()
+            if tache is None:
+                return None
+            maintenant = timezone.now()
+            reservee = cls.objects.filter(pk=tache.pk, statut='en_attente').update(
+                statut='en_cours', date_debut=maintenant, date_signe_de_vie=maintenant,
+                tentatives=F('tentatives') + 1,
+            )
+            if reservee:
+                tache.refresh_from_db()
+                return tache
+
+    def _prise_en_charge(self):
+        """Cette prise en charge de la tâche, tant qu'elle n'a pas été reprise par un autre worker"""
+        return TacheExport.objects.filter(pk=self.pk, statut='en_cours', tentatives=self.tentatives)
+
+    def executer(self):
+        """
+        Produit le fichier d'export et enregistre le résultat de la tâche.
+        Un signe de vie est enregistré pendant l'export (au plus toutes les
+        INTERVALLE_SIGNE_DE_VIE secondes) : une tâche longue n'est pas
+        reprise tant qu'elle avance. Le résultat n'est enregistré que si la
+        tâche est toujours à ce worker ; sinon le fichier produit est
+        supprimé. Retourne False dans ce cas.
+        """
+        definition = obtenir_definition(self.type_export)
+        horodatage = timezone.now().strftime('%Y%m%d_%H%M%S')
+        nom_fichier = f"{definition.nom}_{horodatage}.{self.format_fichier}"
+        dernier_signe = time.monotonic()
+
+        def signe_de_vie(nb_lignes):
+            nonlocal dernier_signe
+            if time.monotonic() - dernier_signe < INTERVALLE_SIGNE_DE_VIE:
+                return
+            dernier_signe = time.monotonic()
+            if not self._prise_en_charge().update(date_signe_de_vie=timezone.now()):
+                raise TacheReprise()
+
+        try:
+            with tempfile.TemporaryFile() as tmp:
+                if self.format_fichier == 'csv':
+                    texte = io.TextIOWrapper(tmp, encoding='utf-8-sig', newline='')
+                    self.nb_lignes = definition.ecrire_csv(texte, self.parametres, signe_de_vie)
+                    texte.flush()
+                    texte.detach()
+                else:
+                    self.nb_lignes = definition.ecrire_xlsx(tmp, self.parametres, signe_de_vie)
+                tmp.seek(0)
+                self.fichier.save(nom_fichier, File(tmp), save=False)
+            self.statut = 'termine'
+        except TacheReprise:
+            return False
+        except Exception as e:
+            self.statut = 'echec'
+            self.erreur = str(e)
+        self.date_fin = timezone.now()
+        enregistree = self._prise_en_charge().update(
+            statut=self.statut, fichier=self.fichier.name or None, nb_lignes=self.nb_lignes,
+            erreur=self.erreur, date_fin=self.date_fin,
+        )
+        if not enregistree and self.fichier:
+            self.fichier.delete(save=False)
+        return bool(enregistree)
+
+
+class Sequence(models.Model):
+    """
+    Compteur d'une série de numéros de documents (VTE, STK, LIV, CRD).
+    Les numéros sont distribués par blocs par core.sequences.
+    """
+    prefixe = models.CharField(max_length=10, unique=True, verbose_name="Préfixe")
+    prochain = models.BigIntegerField(default=1, verbose_name="Prochain numéro libre")
+
+    class Meta:
+        verbose_name = "Séquence de numérotation"
+        verbose_name_plural = "Séquences de numérotation"
+        ordering = ['prefixe']
+
+    def __str__(self):
+        return f"{self.prefixe} ({self.prochain})"
@@ -0,0 +1,23 @@
+from decimal import Decimal, InvalidOperation
+
+
+def tient_dans(valeur, champ):
+    """Vrai si le nombre (déjà arrondi) tient dans le DecimalField donné (max_digits)"""
+    return valeur.adjusted() < champ.max_digits - champ.decimal_places
+
+
+def lire_decimal(valeur, champ):
+    """
+    Nombre saisi (virgule ou point décimal, espaces ignorés) arrondi aux
+    décimales du DecimalField donné, ou None s'il est illisible, infini ou
+    trop grand pour le champ. Une valeur hors bornes est ainsi une saisie
+    invalide, et non une erreur 500 à l'arrondi ou à l'enregistrement.
+    """
+    try:
+        valeur = Decimal(str(valeur).strip().replace(' ', '').replace(',', '.'))
+        if not valeur.is_finite():
+            return None
+        valeur = valeur.quantize(Decimal(1).scaleb(-champ.decimal_places))
+    except (InvalidOperation, ValueError):
+        return None
+    return valeur if tient_dans(valeur, champ) else None
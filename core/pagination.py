@@ -0,0 +1,148 @@
+import base64
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils.dateparse import parse_date, parse_datetime
+
+# Durée de mise en cache du nombre total de lignes d'une liste (secondes)
+DUREE_CACHE_TOTAL = 300
+
+
+def encoder_curseur(sens, ligne):
+    """
+    Encode la position (date, date_creation, id) d'une ligne en curseur opaque.
+    sens: 's' (page suivante) ou 'p' (page précédente)
+    """
+    donnees = [sens, ligne.date.isoformat(), ligne.date_creation.isoformat(), ligne.pk]
+    brut = json.dumps(donnees, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(brut).decode().rstrip('=')
+
+
+def decoder_curseur(curseur):
+    """
+    Décode un curseur opaque. Retourne (sens, date, date_creation, id),
+    ou None si le curseur est absent ou invalide.
+    """
+    if not curseur:
+        return None
+    try:
+        brut = base64.urlsafe_b64decode(curseur + '=' * (-len(curseur) % 4))
+        sens, date_str, date_creation_str, pk = json.loads(brut)
+        date = parse_date(date_str)
+        date_creation = parse_datetime(date_creation_str)
+        pk = int(pk)
+    except (ValueError, TypeError):
+        return None
+    if sens not in ('s', 'p') or date is None or date_creation is None:
+        return None
+    return sens, date, date_creation, pk
+
+
+class PageCurseur:
+    """
+    Page de résultats obtenue par pagination par clé (keyset)
+    """
+    def __init__(self, object_list, has_next, has_previous):
+        self.object_list = object_list
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self.parametres = ''
+        self.total = None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def curseur_suivant(self):
+        if self._has_next and self.object_list:
+            return encoder_curseur('s', self.object_list[-1])
+        return None
+
+    @property
+    def curseur_precedent(self):
+        if self._has_previous and self.object_list:
+            return encoder_curseur('p', self.object_list[0])
+        return None
+
+
+class PaginateurCurseur:
+    """
+    Pagination par clé sur l'ordre (-date, -date_creation, -id).
+    Chaque page est obtenue par une recherche indexée à partir de la
+    dernière ligne vue, sans COUNT(*) ni OFFSET.
+    """
+    ordre = ('-date', '-date_creation', '-id')
+    ordre_inverse = ('date', 'date_creation', 'id')
+
+    def __init__(self, queryset, par_page):
+        self.queryset = queryset
+        self.par_page = par_page
+
+    def get_page(self, curseur):
+        position = decoder_curseur(curseur)
+        if position is None:
+            lignes = list(self.queryset.order_by(*self.ordre)[:self.par_page + 1])
+            return PageCurseur(lignes[:self.par_page], len(lignes) > self.par_page, False)
+
+        sens, date, date_creation, pk = position
+        if sens == 's':
+            apres = (
+                Q(date__lt=date)
+                | Q(date=date, date_creation__lt=date_creation)
+                | Q(date=date, date_creation=date_creation, id__lt=pk)
+            )
+            lignes = list(self.queryset.filter(apres).order_by(*self.ordre)[:self.par_page + 1])
+            return PageCurseur(lignes[:self.par_page], len(lignes) > self.par_page, True)
+
+        avant = (
+            Q(date__gt=date)
+            | Q(date=date, date_creation__gt=date_creation)
+            | Q(date=date, date_creation=date_creation, id__gt=pk)
+        )
+        lignes = list(self.queryset.filter(avant).order_by(*self.ordre_inverse)[:self.par_page + 1])
+        a_precedente = len(lignes) > self.par_page
+        lignes = lignes[:self.par_page]
+        lignes.reverse()
+        return PageCurseur(lignes, True, a_precedente)
+
+    def compter(self):
+        """
+        Nombre exact de lignes, mis en cache quelques minutes par requête SQL
+        """
+        sql = str(self.queryset.order_by().values('pk').query)
+        cle = 'pagination_total:' + hashlib.md5(sql.encode()).hexdigest()
+        total = cache.get(cle)
+        if total is None:
+            total = self.queryset.count()
+            cache.set(cle, total, DUREE_CACHE_TOTAL)
+        return total
+
+
+def paginer_par_curseur(request, queryset, par_page):
+    """
+    Retourne la page demandée par le paramètre GET 'curseur'.
+    Le total exact n'est calculé (et mis en cache) que si 'total' est demandé.
+    """
+    paginateur = PaginateurCurseur(queryset, par_page)
+    page = paginateur.get_page(request.GET.get('curseur'))
+    parametres = request.GET.copy()
+    parametres.pop('curseur', None)
+    parametres.pop('page', None)
+    page.parametres = parametres.urlencode()
+    if request.GET.get('total'):
+        page.total = paginateur.compter()
+    return page
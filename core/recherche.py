@@ -0,0 +1,133 @@
+"""
+Recherche plein texte des listes (clients, fournisseurs, employés, produits).
+
+Sous SQLite, chaque modèle recherché a une table FTS5 à contenu externe
+(recherche_<nom>) tenue à jour par des triggers sur la table du modèle :
+les insertions, modifications et suppressions, y compris en masse, sont
+indexées dans la même transaction. Le tokenizer unicode61 avec
+remove_diacritics ignore la casse et les accents (« conde » trouve
+« Condé »). Chaque mot saisi est cherché comme préfixe d'un mot indexé.
+
+Les tables et triggers sont (re)créés après chaque migrate : une migration
+qui reconstruit la table d'un modèle (SQLite) supprime ses triggers, ils
+sont alors réinstallés et l'index reconstruit.
+
+Sur une autre base, la recherche retombe sur des filtres icontains.
+"""
+import re
+
+from django.apps import apps
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+# Nom de l'index -> (modèle, champs indexés)
+INDEX = {
+    'clients': ('ventes.Client', ('nom', 'prenom', 'telephone', 'email')),
+    'fournisseurs': ('fournisseurs.Fournisseur', ('nom', 'telephone', 'email')),
+    'employes': ('personnel.Employe', ('nom', 'prenoms', 'matricule', 'numero', 'fonction')),
+    'produits': ('fournisseurs.Produit', ('nom', 'unite_mesure', 'description')),
+}
+
+TERME = re.compile(r'\w+')
+
+
+def _fts_disponible():
+    return connection.vendor == 'sqlite'
+
+
+def _table(nom):
+    return f'recherche_{nom}'
+
+
+def _sql_installation(nom):
+    """Instructions (idempotentes) créant la table FTS5 et ses triggers"""
+    modele, champs = INDEX[nom]
+    source = apps.get_model(modele)._meta.db_table
+    table = _table(nom)
+    colonnes = ', '.join(champs)
+    nouvelles = ', '.join(f'new.{c}' for c in champs)
+    anciennes = ', '.join(f'old.{c}' for c in champs)
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5({colonnes}, "
+        f"content='{source}', content_rowid='id', "
+        f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_ai AFTER INSERT ON {source} BEGIN "
+        f"INSERT INTO {table}(rowid, {colonnes}) VALUES (new.id, {nouvelles}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_ad AFTER DELETE ON {source} BEGIN "
+        f"INSERT INTO {table}({table}, rowid, {colonnes}) VALUES ('delete', old.id, {anciennes}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_au AFTER UPDATE ON {source} BEGIN "
+        f"INSERT INTO {table}({table}, rowid, {colonnes}) VALUES ('delete', old.id, {anciennes}); "
+        f"INSERT INTO {table}(rowid, {colonnes}) VALUES (new.id, {nouvelles}); END",
+    ]
+
+
+def _objets_existants(cursor, noms):
+    cursor.execute(
+        f"SELECT name FROM sqlite_master WHERE name IN ({', '.join(['%s'] * len(noms))})", noms
+    )
+    return {ligne[0] for ligne in cursor.fetchall()}
+
+
+def installer(nom, reconstruire=False):
+    """
+    Crée la table FTS5 et les triggers d'un index s'ils manquent.
+    L'index est reconstruit depuis la table du modèle si un élément
+    manquait (ou si reconstruire=True).
+    """
+    if not _fts_disponible():
+        return
+    table = _table(nom)
+    attendus = [table, f'{table}_ai', f'{table}_ad', f'{table}_au']
+    with connection.cursor() as cursor:
+        manquants = set(attendus) - _objets_existants(cursor, attendus)
+        for instruction in _sql_installation(nom):
+            cursor.execute(instruction)
+        if manquants or reconstruire:
+            cursor.execute(f"INSERT INTO {table}({table}) VALUES ('rebuild')")
+
+
+def installer_tout(**kwargs):
+    """Récepteur post_migrate : installe les index dont les tables existent"""
+    if not _fts_disponible():
+        return
+    tables = set(connection.introspection.table_names())
+    for nom, (modele, _) in INDEX.items():
+        if apps.get_model(modele)._meta.db_table in tables:
+            installer(nom)
+
+
+def expression_fts(texte):
+    """
+    Requête FTS5 : chaque mot saisi doit être le début d'un mot indexé.
+    Retourne None si le texte ne contient aucun mot.
+    """
+    termes = TERME.findall(texte or '')
+    if not termes:
+        return None
+    return ' AND '.join(f'"{terme}"*' for terme in termes)
+
+
+def rechercher(queryset, nom, texte, champ='pk'):
+    """
+    Filtre le queryset sur les fiches de l'index `nom` correspondant au texte.
+    champ: champ du queryset portant l'identifiant de la fiche indexée
+    (ex: 'produit_id' pour filtrer le stock par produit).
+    """
+    expression = expression_fts(texte)
+    if expression is None:
+        return queryset
+    if _fts_disponible():
+        table = _table(nom)
+        identifiants = RawSQL(f"SELECT rowid FROM {table} WHERE {table} MATCH %s", [expression])
+        return queryset.filter(**{f'{champ}__in': identifiants})
+
+    # Repli sans FTS5 : chaque mot dans l'un des champs
+    _, champs = INDEX[nom]
+    prefixe = '' if champ == 'pk' else champ[:-len('_id')] + '__'
+    for terme in TERME.findall(texte):
+        condition = Q()
+        for c in champs:
+            condition |= Q(**{f'{prefixe}{c}__icontains': terme})
+        queryset = queryset.filter(condition)
+    return queryset
@@ -0,0 +1,385 @@
+"""
+Recherche globale : un seul index plein texte pour les ventes, crédits,
+livraisons, mouvements de stock, charges, employés et véhicules.
+
+Sous SQLite, la table FTS5 recherche_globale contient une ligne par
+document avec trois colonnes cherchées : numero (n° du document), noms
+(client, produit, fournisseur, personne...) et refs (autres références).
+Le rowid encode le document : id * NB_TYPES + code du type. Des triggers
+sur les tables des documents tiennent l'index à jour, et des triggers sur
+les tables liées (client, produit, fournisseur...) réindexent les
+documents concernés quand un nom change. Les triggers de modification ne
+s'exécutent que si une colonne indexée change de valeur (clause WHEN) :
+un paiement ou un mouvement de stock ne réécrit pas l'index.
+
+Classement : d'abord les documents dont le numéro correspond (si la
+requête contient un chiffre), puis ceux trouvés par le numéro ou les noms,
+puis par les autres références ; dans chaque palier, du plus récent au
+plus ancien enregistrement. Chaque palier est parcouru par rowid
+décroissant avec LIMIT : FTS5 s'arrête dès que la page est remplie, sans
+classer toutes les correspondances, et le curseur (palier, dernier rowid)
+donne la page suivante par une recherche indexée. Les préfixes de 2 à 5
+caractères ont leur propre index : un mot en cours de saisie est lu comme
+un mot entier, sans fusionner les listes de tous les mots qu'il commence.
+
+Sur une autre base, la recherche retombe sur des filtres icontains,
+document par document.
+"""
+import base64
+import json
+
+from django.apps import apps
+from django.db import connection
+from django.db.models import Q
+from django.urls import reverse
+
+from .recherche import TERME, expression_fts
+
+TABLE = 'recherche_globale'
+
+# rowid de l'index = id du document * NB_TYPES + code du type
+NB_TYPES = 8
+
+PAR_PAGE = 20
+
+# Paliers de classement (expression FTS5 de la requête : {e})
+PALIERS = (
+    'numero : ({e})',
+    '{{numero noms}} : ({e}) NOT numero : ({e})',
+    '({e}) NOT {{numero noms}} : ({e})',
+)
+
+# Sans chiffre dans la requête, pas de palier « numéro » : un palier vide
+# coûterait la lecture de toutes les positions du mot
+PALIERS_SANS_NUMERO = (
+    None,
+    '{{numero noms}} : ({e})',
+    PALIERS[2],
+)
+
+
+def _modifiees(colonnes):
+    """Condition WHEN d'un trigger de modification : une des colonnes a changé"""
+    return ' OR '.join(f"old.{colonne} IS NOT new.{colonne}" for colonne in colonnes)
+
+
+class Document:
+    """
+    Type de document de la recherche globale.
+    code: entier fixe de 1 à NB_TYPES - 1, inscrit dans les rowid de l'index.
+    numero, noms, references: champs du modèle ou chemins 'fk__champ'.
+    vue: nom d'URL de la fiche (fiche=True, avec le pk) ou de la liste.
+    """
+    def __init__(self, type_document, code, libelle, modele, numero, noms=(), references=(),
+                 date='date', vue=None, fiche=False):
+        self.type = type_document
+        self.code = code
+        self.libelle = libelle
+        self.nom_modele = modele
+        self.numero = numero
+        self.noms = noms
+        self.references = references
+        self.date = date
+        self.vue = vue
+        self.fiche = fiche
+
+    @property
+    def modele(self):
+        return apps.get_model(self.nom_modele)
+
+    @property
+    def table(self):
+        return self.modele._meta.db_table
+
+    def url(self, pk):
+        return reverse(self.vue, args=[pk]) if self.fiche else reverse(self.vue)
+
+    # SQL (triggers et reconstruction)
+
+    def _colonne(self, champ):
+        return self.modele._meta.get_field(champ).column
+
+    def _expression(self, chemins, alias):
+        """Expression SQL concaténant les chemins pour la ligne `alias`"""
+        parties = []
+        relations = {}
+        for chemin in chemins:
+            if '__' not in chemin:
+                parties.append(f"coalesce({alias}.{self._colonne(chemin)}, '')")
+                continue
+            fk, champ = chemin.split('__')
+            if fk not in relations:
+                relations[fk] = []
+                parties.append(fk)
+            relations[fk].append(champ)
+        for fk, champs in relations.items():
+            champ_fk = self.modele._meta.get_field(fk)
+            cible = champ_fk.related_model
+            valeurs = " || ' ' || ".join(f"coalesce({cible._meta.get_field(c).column}, '')" for c in champs)
+            parties[parties.index(fk)] = (
+                f"coalesce((SELECT {valeurs} FROM {cible._meta.db_table} "
+                f"WHERE id = {alias}.{champ_fk.column}), '')"
+            )
+        return " || ' ' || ".join(parties) or "''"
+
+    def _colonnes_indexees(self):
+        """Colonnes de la table du document dont dépend sa ligne d'index (clés étrangères comprises)"""
+        colonnes = []
+        for chemin in (self.numero, *self.noms, *self.references, self.date):
+            colonne = self._colonne(chemin.split('__')[0])
+            if colonne not in colonnes:
+                colonnes.append(colonne)
+        return colonnes
+
+    def _rowid(self, alias):
+        return f"{alias}.id * {NB_TYPES} + {self.code}"
+
+    def _valeurs(self, alias):
+        return ', '.join([
+            self._rowid(alias),
+            self._expression([self.numero], alias),
+            self._expression(self.noms, alias),
+            self._expression(self.references, alias),
+            f"{alias}.{self._colonne(self.date)}",
+        ])
+
+    def sql_insertion(self, condition=''):
+        """INSERT ... SELECT indexant les lignes de la table (filtrées)"""
+        return (f"INSERT INTO {TABLE}(rowid, numero, noms, refs, date) "
+                f"SELECT {self._valeurs('d')} FROM {self.table} d {condition}")
+
+    def relations(self):
+        """[(clé étrangère, table liée, colonne de la clé, colonnes indexées de la table liée)]"""
+        relations = {}
+        for chemin in (*self.noms, *self.references):
+            if '__' in chemin:
+                fk, champ = chemin.split('__')
+                relations.setdefault(fk, []).append(champ)
+        resultat = []
+        for fk, champs in relations.items():
+            champ_fk = self.modele._meta.get_field(fk)
+            cible = champ_fk.related_model
+            resultat.append((fk, cible._meta.db_table, champ_fk.column,
+                             [cible._meta.get_field(c).column for c in champs]))
+        return resultat
+
+    def triggers(self):
+        """{nom du trigger: instruction CREATE TRIGGER, telle que SQLite la garde dans sqlite_master}"""
+        prefixe = f'{TABLE}_{self.type}'
+        insertion = f"INSERT INTO {TABLE}(rowid, numero, noms, refs, date) VALUES ({self._valeurs('new')})"
+        suppression = f"DELETE FROM {TABLE} WHERE rowid = {self._rowid('old')}"
+        triggers = {
+            f'{prefixe}_ai': f"AFTER INSERT ON {self.table} BEGIN {insertion}; END",
+            f'{prefixe}_ad': f"AFTER DELETE ON {self.table} BEGIN {suppression}; END",
+            f'{prefixe}_au': (f"AFTER UPDATE ON {self.table} WHEN {_modifiees(self._colonnes_indexees())} "
+                              f"BEGIN {suppression}; {insertion}; END"),
+        }
+        for fk, table_liee, colonne_fk, colonnes in self.relations():
+            triggers[f'{prefixe}_{fk}_au'] = (
+                f"AFTER UPDATE OF {', '.join(colonnes)} ON {table_liee} WHEN {_modifiees(colonnes)} BEGIN "
+                f"DELETE FROM {TABLE} WHERE rowid IN "
+                f"(SELECT id * {NB_TYPES} + {self.code} FROM {self.table} WHERE {colonne_fk} = new.id); "
+                f"{self.sql_insertion(f'WHERE d.{colonne_fk} = new.id')}; END"
+            )
+        return {nom: f"CREATE TRIGGER {nom} {corps}" for nom, corps in triggers.items()}
+
+    # Repli sans FTS5
+
+    def filtrer(self, termes):
+        """Queryset des documents contenant chaque terme dans l'un des champs"""
+        queryset = self.modele.objects.all()
+        for terme in termes:
+            condition = Q()
+            for chemin in (self.numero, *self.noms, *self.references):
+                condition |= Q(**{f'{chemin}__icontains': terme})
+            queryset = queryset.filter(condition)
+        return queryset
+
+
+DOCUMENTS = [
+    Document('vente', 1, 'Vente', 'ventes.Vente', 'numero',
+             noms=('client__nom', 'client__prenom', 'produit__nom'),
+             vue='ventes:vente_list'),
+    Document('credit', 2, 'Crédit client', 'credits.CreditClient', 'numero',
+             noms=('client__nom', 'client__prenom', 'produit__nom'),
+             vue='credits:credit_detail', fiche=True),
+    Document('livraison', 3, 'Livraison', 'fournisseurs.Livraison', 'numero_enregistrement',
+             noms=('fournisseur__nom', 'produit__nom'), vue='fournisseurs:livraison_list'),
+    Document('mouvement', 4, 'Mouvement de stock', 'stocks.MouvementStock', 'numero',
+             noms=('produit__nom', 'commercial__nom', 'commercial__prenom'),
+             vue='stocks:mouvement_list'),
+    Document('charge', 5, 'Charge', 'charges.Charge', 'numero',
+             noms=('libelle', 'fournisseur'),
+             references=('facture_numero', 'categorie__nom'), vue='charges:charge_list'),
+    Document('employe', 6, 'Employé', 'personnel.Employe', 'numero',
+             noms=('nom', 'prenoms'), references=('matricule', 'fonction', 'telephone'),
+             date='date_embauche', vue='personnel:employe_detail', fiche=True),
+    Document('vehicule', 7, 'Véhicule', 'parc_motorise.Vehicule', 'matricule',
+             noms=('marque', 'modele', 'type_vehicule'), date='date_acquisition',
+             vue='parc_motorise:vehicule_list'),
+]
+
+PAR_TYPE = {document.type: document for document in DOCUMENTS}
+PAR_CODE = {document.code: document for document in DOCUMENTS}
+
+
+def _fts_disponible():
+    return connection.vendor == 'sqlite'
+
+
+# Installation de l'index
+
+def _sql_table():
+    return (f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5(numero, noms, refs, date UNINDEXED, "
+            f"tokenize='unicode61 remove_diacritics 2', prefix='2 3 4 5')")
+
+
+def reconstruire():
+    """
+    Recrée l'index depuis les tables des documents (les triggers, qui ne
+    référencent la table que par son nom, restent en place)
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {TABLE}")
+        cursor.execute(_sql_table())
+        for document in DOCUMENTS:
+            cursor.execute(document.sql_insertion())
+        cursor.execute(f"INSERT INTO {TABLE}({TABLE}) VALUES ('optimize')")
+
+
+def installer(reconstruire_index=False):
+    """
+    Crée la table et les triggers qui manquent, et remplace ceux dont la
+    définition a changé. L'index est reconstruit si un élément manquait
+    (ou si reconstruire_index=True).
+    """
+    if not _fts_disponible():
+        return
+    triggers = {}
+    for document in DOCUMENTS:
+        triggers.update(document.triggers())
+    attendus = [TABLE, *triggers]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT name, sql FROM sqlite_master WHERE name IN ({', '.join(['%s'] * len(attendus))})", attendus
+        )
+        existants = dict(cursor.fetchall())
+        manquants = set(attendus) - set(existants)
+        cursor.execute(_sql_table())
+        for nom, instruction in triggers.items():
+            if existants.get(nom) == instruction:
+                continue
+            if nom in existants:
+                # Définition d'une version précédente
+                cursor.execute(f"DROP TRIGGER {nom}")
+            cursor.execute(instruction)
+    if manquants or reconstruire_index:
+        reconstruire()
+
+
+def installer_apres_migrate(**kwargs):
+    """Récepteur post_migrate : installe l'index quand toutes les tables existent"""
+    if not _fts_disponible():
+        return
+    tables = set(connection.introspection.table_names())
+    if all(document.table in tables for document in DOCUMENTS):
+        installer()
+
+
+# Curseurs
+
+def encoder_curseur(palier, dernier):
+    brut = json.dumps([palier, dernier], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(brut).decode().rstrip('=')
+
+
+def decoder_curseur(curseur):
+    """Retourne (palier, dernier identifiant vu), ou (0, None) si absent ou invalide"""
+    if not curseur:
+        return 0, None
+    try:
+        palier, dernier = json.loads(base64.urlsafe_b64decode(curseur + '=' * (-len(curseur) % 4)))
+        return int(palier), int(dernier)
+    except (ValueError, TypeError):
+        return 0, None
+
+
+# Recherche
+
+def _resultat(document, pk, numero, description, date):
+    return {
+        'type': document.type,
+        'libelle_type': document.libelle,
+        'id': pk,
+        'numero': numero,
+        'description': ' '.join((description or '').split()),
+        'date': date if isinstance(date, str) or date is None else date.isoformat(),
+        'url': document.url(pk),
+    }
+
+
+def _rechercher_fts(expression, paliers, documents, palier, dernier, limite):
+    """Jusqu'à `limite` lignes [(palier, rowid, résultat)] à partir du curseur"""
+    codes = ', '.join(str(d.code) for d in documents)
+    lignes = []
+    for numero_palier in range(palier, len(paliers)):
+        reste = limite - len(lignes)
+        if reste <= 0:
+            break
+        if paliers[numero_palier] is None:
+            continue
+        sql = (f"SELECT rowid, numero, noms, date FROM {TABLE} WHERE {TABLE} MATCH %s "
+               f"AND rowid %% {NB_TYPES} IN ({codes})")
+        params = [paliers[numero_palier].format(e=expression)]
+        if numero_palier == palier and dernier is not None:
+            sql += " AND rowid < %s"
+            params.append(dernier)
+        sql += " ORDER BY rowid DESC LIMIT %s"
+        params.append(reste)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            for rowid, numero, noms, date in cursor.fetchall():
+                pk, code = divmod(rowid, NB_TYPES)
+                lignes.append((numero_palier, rowid, _resultat(PAR_CODE[code], pk, numero, noms, date)))
+    return lignes
+
+
+def _rechercher_orm(termes, documents, palier, dernier, limite):
+    """Repli sans FTS5 : un palier par type de document, par id décroissant"""
+    lignes = []
+    for numero_palier in range(palier, len(documents)):
+        reste = limite - len(lignes)
+        if reste <= 0:
+            break
+        document = documents[numero_palier]
+        queryset = document.filtrer(termes)
+        if numero_palier == palier and dernier is not None:
+            queryset = queryset.filter(pk__lt=dernier)
+        valeurs = queryset.order_by('-pk').values_list('pk', document.numero, document.date, *document.noms)
+        for pk, numero, date, *noms in valeurs[:reste]:
+            description = ' '.join(str(n) for n in noms if n)
+            lignes.append((numero_palier, pk, _resultat(document, pk, numero, description, date)))
+    return lignes
+
+
+def rechercher(texte, curseur=None, types=None, par_page=PAR_PAGE):
+    """
+    Documents correspondant au texte, classés (voir en-tête du module).
+    types: types de documents à inclure (tous par défaut).
+    Retourne (résultats, curseur de la page suivante ou None).
+    """
+    expression = expression_fts(texte)
+    documents = [d for d in DOCUMENTS if not types or d.type in types]
+    if expression is None or not documents:
+        return [], None
+    palier, dernier = decoder_curseur(curseur)
+    if _fts_disponible():
+        paliers = PALIERS if any(c.isdigit() for c in texte) else PALIERS_SANS_NUMERO
+        lignes = _rechercher_fts(expression, paliers, documents, palier, dernier, par_page + 1)
+    else:
+        lignes = _rechercher_orm(TERME.findall(texte), documents, palier, dernier, par_page + 1)
+    suivant = None
+    if len(lignes) > par_page:
+        lignes = lignes[:par_page]
+        suivant = encoder_curseur(*lignes[-1][:2])
+    return [resultat for _, _, resultat in lignes], suivant
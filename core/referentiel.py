@@ -0,0 +1,101 @@
+"""
+Cache en mémoire des listes de référence (magasins, clients, produits,
+fournisseurs) affichées dans les formulaires de saisie.
+
+Chaque liste est gardée dans le processus avec le numéro de version sous
+lequel elle a été lue. Le numéro de version est tenu dans le cache Django
+et incrémenté par les signaux post_save / post_delete des modèles
+concernés : une page de formulaire ne fait plus qu'une lecture de version
+par liste, et la liste n'est relue en base qu'après une modification.
+
+Avec le cache local par défaut, une nouvelle version n'est vue que par le
+processus qui écrit : une liste est donc relue au plus tard
+DUREE_INSTANTANE secondes après sa lecture, délai maximal avant que les
+autres processus voient les modifications (immédiat avec un cache
+partagé). Les mises à jour en masse (queryset.update, bulk_create)
+n'émettent pas de signaux : appeler invalider() après ce type d'écriture.
+"""
+import threading
+import time
+from collections import defaultdict
+
+from django.apps import apps
+from django.core.cache import cache
+
+# Nom de la liste -> modèle
+REFERENTIELS = {
+    'magasins': 'ventes.Magasin',
+    'clients': 'ventes.Client',
+    'produits': 'fournisseurs.Produit',
+    'fournisseurs': 'fournisseurs.Fournisseur',
+}
+
+# Durée maximale de conservation d'une liste dans le processus (secondes)
+DUREE_INSTANTANE = 60
+
+_verrou = threading.Lock()
+_instantanes = {}  # nom -> (version, liste, instant de lecture)
+_abonnes = defaultdict(list)  # nom -> fonctions(instance, supprime)
+
+
+def _cle_version(nom):
+    return f'referentiel:version:{nom}'
+
+
+def version(nom):
+    """Version courante d'une liste (initialisée à 1 au premier accès)"""
+    valeur = cache.get(_cle_version(nom))
+    if valeur is None:
+        cache.add(_cle_version(nom), 1, timeout=None)
+        valeur = cache.get(_cle_version(nom), 1)
+    return valeur
+
+
+def liste(nom):
+    """
+    Liste des objets d'un référentiel, dans l'ordre par défaut du modèle.
+    La liste est partagée entre les requêtes : ne pas la modifier. Elle
+    peut avoir jusqu'à DUREE_INSTANTANE secondes de retard sur une
+    modification faite par un autre processus.
+    """
+    courante = version(nom)
+    instantane = _instantanes.get(nom)
+    if (instantane is not None and instantane[0] == courante
+            and time.monotonic() - instantane[2] < DUREE_INSTANTANE):
+        return instantane[1]
+    lecture = time.monotonic()
+    objets = list(apps.get_model(REFERENTIELS[nom]).objects.all())
+    with _verrou:
+        _instantanes[nom] = (courante, objets, lecture)
+    return objets
+
+
+def invalider(nom):
+    """Passe la liste à la version suivante dans tous les processus"""
+    try:
+        cache.incr(_cle_version(nom))
+    except ValueError:
+        # Version absente du cache (expirée ou jamais lue)
+        cache.add(_cle_version(nom), 2, timeout=None)
+    _instantanes.pop(nom, None)
+
+
+def formulaire(*noms):
+    """Contexte de formulaire : {'magasins': [...], 'clients': [...], ...}"""
+    return {nom: liste(nom) for nom in noms}
+
+
+def abonner(nom, fonction):
+    """
+    Enregistre une fonction appelée avec (instance, supprime) après chaque
+    modification validée d'une fiche du référentiel, une fois la version
+    incrémentée (ex: index d'autocomplétion)
+    """
+    _abonnes[nom].append(fonction)
+
+
+def notifier(nom, instance, supprime=False):
+    """Invalide la liste puis prévient les abonnés de la modification"""
+    invalider(nom)
+    for fonction in _abonnes[nom]:
+        fonction(instance, supprime)
@@ -0,0 +1,152 @@
+"""
+Numérotation automatique des documents (VTE0001, STK0001, LIV0001, CRD0001,
+INV0001).
+
+Chaque processus (terminal, worker) réserve un bloc de numéros par une
+mise à jour conditionnelle de la ligne Sequence, puis les distribue en
+mémoire : le compteur partagé n'est touché qu'une fois par bloc et deux
+processus ne reçoivent jamais le même numéro. Les numéros d'un bloc non
+utilisés à l'arrêt du processus sont perdus (trous dans la série).
+
+Un numéro saisi à la main ou importé fait avancer la séquence au-delà
+(avancer_sequence, appelé à l'enregistrement des documents) ; s'il tombe
+dans un bloc déjà distribué à un autre processus, l'enregistrement du
+document qui reçoit ce numéro échoue sur l'index unique et
+enregistrer_numerote le refait avec le numéro suivant.
+"""
+import re
+import threading
+
+from django.apps import apps
+from django.db import IntegrityError, transaction
+
+from .models import Sequence
+
+# Numéros réservés par aller-retour en base
+TAILLE_BLOC = 20
+
+# Enregistrements tentés avec un numéro attribué avant d'abandonner
+ESSAIS = 5
+
+# Préfixe -> champs déjà numérotés à la main, lus à la création de la séquence
+SEQUENCES = {
+    'VTE': ['ventes.Vente.numero', 'ventes.Ticket.numero'],
+    'STK': ['stocks.MouvementStock.numero'],
+    'LIV': ['fournisseurs.Livraison.numero_enregistrement'],
+    'CRD': ['credits.CreditClient.numero'],
+    'INV': ['stocks.Inventaire.numero'],
+}
+
+_MOTIF_NUMERO = re.compile(r'^([A-Z]+)(\d+)')
+
+_verrou = threading.Lock()
+_blocs = {}  # préfixe -> [prochain numéro du bloc, fin du bloc (exclue)]
+_connus = {}  # préfixe -> valeur du compteur en base dont ce processus est sûr (minimum)
+
+
+def _plus_grand_existant(prefixe):
+    """Plus grand numéro déjà utilisé pour ce préfixe (0 si aucun)"""
+    motif = re.compile(rf'^{prefixe}(\d+)')
+    plus_grand = 0
+    for chemin in SEQUENCES.get(prefixe, []):
+        app_label, modele, champ = chemin.split('.')
+        valeurs = apps.get_model(app_label, modele).objects.filter(
+            **{f'{champ}__startswith': prefixe}
+        ).values_list(champ, flat=True)
+        for valeur in valeurs.iterator():
+            trouve = motif.match(valeur)
+            if trouve:
+                plus_grand = max(plus_grand, int(trouve.group(1)))
+    return plus_grand
+
+
+def _sequence(prefixe):
+    sequence = Sequence.objects.filter(prefixe=prefixe).first()
+    if sequence is not None:
+        return sequence
+    try:
+        with transaction.atomic():
+            return Sequence.objects.create(prefixe=prefixe, prochain=_plus_grand_existant(prefixe) + 1)
+    except IntegrityError:
+        # Séquence créée entre-temps par un autre processus
+        return Sequence.objects.get(prefixe=prefixe)
+
+
+def reserver_bloc(prefixe, taille=TAILLE_BLOC):
+    """
+    Réserve `taille` numéros consécutifs et retourne (début, fin exclue).
+    La réservation ne réussit que si le compteur n'a pas bougé depuis sa
+    lecture ; sinon elle est retentée.
+    """
+    sequence = _sequence(prefixe)
+    while True:
+        debut = Sequence.objects.filter(pk=sequence.pk).values_list('prochain', flat=True).get()
+        if Sequence.objects.filter(pk=sequence.pk, prochain=debut).update(prochain=debut + taille):
+            _connus[prefixe] = max(_connus.get(prefixe, 0), debut + taille)
+            return debut, debut + taille
+
+
+def avancer_sequence(*numeros):
+    """
+    Signale des numéros saisis à la main ou importés : le compteur de leur
+    série est porté au-delà du plus grand pour qu'il ne soit jamais
+    redistribué, et le bloc en mémoire de ce processus le saute. Sans
+    requête quand le numéro est en deçà du compteur connu (cas des
+    numéros attribués).
+    """
+    plus_grands = {}
+    for numero in numeros:
+        trouve = _MOTIF_NUMERO.match(numero or '')
+        if trouve and trouve.group(1) in SEQUENCES:
+            prefixe, valeur = trouve.group(1), int(trouve.group(2))
+            plus_grands[prefixe] = max(plus_grands.get(prefixe, 0), valeur)
+    for prefixe, valeur in plus_grands.items():
+        with _verrou:
+            bloc = _blocs.get(prefixe)
+            if bloc is not None and bloc[0] <= valeur < bloc[1]:
+                bloc[0] = valeur + 1
+            if valeur < _connus.get(prefixe, 0):
+                continue
+        sequence = _sequence(prefixe)
+        Sequence.objects.filter(pk=sequence.pk, prochain__lte=valeur).update(prochain=valeur + 1)
+        with _verrou:
+            _connus[prefixe] = max(_connus.get(prefixe, 0), valeur + 1)
+
+
+def formater(prefixe, valeur):
+    return f"{prefixe}{valeur:04d}"
+
+
+def prochain_numero(prefixe):
+    """
+    Retourne le prochain numéro libre de la série, ex: prochain_numero('VTE') -> 'VTE0042'
+    """
+    with _verrou:
+        bloc = _blocs.get(prefixe)
+        if bloc is None or bloc[0] >= bloc[1]:
+            if transaction.get_connection().in_atomic_block:
+                # Réservation annulable avec la transaction englobante :
+                # un seul numéro, qui n'est pas gardé en mémoire
+                return formater(prefixe, reserver_bloc(prefixe, 1)[0])
+            bloc = _blocs[prefixe] = list(reserver_bloc(prefixe))
+        valeur = bloc[0]
+        bloc[0] += 1
+    return formater(prefixe, valeur)
+
+
+def enregistrer_numerote(prefixe, enregistrer, numero=None):
+    """
+    Appelle enregistrer(numero) dans un point de sauvegarde avec le numéro
+    saisi ou, s'il est vide, le prochain numéro de la série, et retourne
+    son résultat. Un numéro attribué déjà pris (saisi à la main dans un
+    autre processus) est remplacé par le suivant ; un numéro saisi déjà
+    pris lève IntegrityError.
+    """
+    for essai in range(ESSAIS):
+        valeur = numero or prochain_numero(prefixe)
+        try:
+            with transaction.atomic():
+                return enregistrer(valeur)
+        except IntegrityError:
+            if numero or essai == ESSAIS - 1:
+                raise
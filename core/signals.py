@@ -0,0 +1,41 @@
+from django.apps import apps
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from .referentiel import REFERENTIELS, notifier
+from .sequences import SEQUENCES, avancer_sequence
+
+
+def connecter_referentiels():
+    """
+    Invalide la liste de référence d'un modèle à chaque enregistrement
+    ou suppression d'une de ses lignes, une fois la transaction validée
+    """
+    for nom, modele in REFERENTIELS.items():
+        def enregistre(sender, instance, nom=nom, **kwargs):
+            transaction.on_commit(lambda: notifier(nom, instance))
+
+        def supprime(sender, instance, nom=nom, **kwargs):
+            transaction.on_commit(lambda: notifier(nom, instance, supprime=True))
+
+        sender = apps.get_model(modele)
+        post_save.connect(enregistre, sender=sender, weak=False, dispatch_uid=f'referentiel_{nom}_save')
+        post_delete.connect(supprime, sender=sender, weak=False, dispatch_uid=f'referentiel_{nom}_delete')
+
+
+def connecter_sequences():
+    """
+    Fait avancer la séquence de numérotation quand un document est
+    enregistré avec un numéro saisi à la main (sans requête pour les
+    numéros attribués par la séquence)
+    """
+    for prefixe, chemins in SEQUENCES.items():
+        for chemin in chemins:
+            app_label, modele, champ = chemin.split('.')
+
+            def enregistre(sender, instance, champ=champ, raw=False, **kwargs):
+                if not raw:
+                    avancer_sequence(getattr(instance, champ))
+
+            post_save.connect(enregistre, sender=apps.get_model(app_label, modele), weak=False,
+                              dispatch_uid=f'sequence_{chemin}')
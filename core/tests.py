@@ -0,0 +1,224 @@
+import tempfile
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from caisse.models import MouvementCaisse
+from charges.models import CategorieCharge, Charge
+from credits.models import CreditClient
+from fournisseurs.models import Produit
+from stocks.services import entrer_stock
+from ventes.autocompletion import CLIENTS
+from ventes.models import Client, Magasin, Vente
+from . import autocompletion, referentiel
+from .agregats import calculer_totaux, somme
+from .models import DELAI_ABANDON, TacheExport
+from .nombres import lire_decimal
+
+
+class CalculerTotauxTests(TestCase):
+
+    def test_une_requete_et_zero_sans_ligne(self):
+        with self.assertNumQueries(1):
+            totaux = calculer_totaux(
+                MouvementCaisse.objects.all(),
+                total_entree=somme('montant_entree'),
+                entrees_jour=somme('montant_entree', date=date.today()),
+            )
+        self.assertEqual(totaux, {'total_entree': 0, 'entrees_jour': 0})
+
+
+class LireDecimalTests(TestCase):
+
+    def test_bornes_du_champ(self):
+        champ = Vente._meta.get_field('prix_unitaire')
+        self.assertEqual(lire_decimal('1 234,5', champ), Decimal('1234.50'))
+        self.assertEqual(lire_decimal('99999999.99', champ), Decimal('99999999.99'))
+        for valeur in ('1e30', '99999999999999999999999999999', 1e9, '99999999.999', 'Infinity', 'NaN', 'abc', None):
+            with self.subTest(valeur=valeur):
+                self.assertIsNone(lire_decimal(valeur, champ))
+
+
+class TotauxListesTests(TestCase):
+    """
+    Chaque liste calcule tous ses totaux en une seule requête de sommes, et
+    son nombre de requêtes ne dépend pas du nombre de lignes.
+    """
+    LISTES = {
+        'ventes:vente_list': 'ventes_vente',
+        'credits:credit_list': 'credits_creditclient',
+        'charges:charge_list': 'charges_charge',
+        'caisse:list': 'caisse_mouvementcaisse',
+    }
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('test', password='test'))
+        self.magasin = Magasin.objects.create(nom='Magasin test')
+        self.produit = Produit.objects.create(nom='Riz', unite_mesure='sac', prix_vente_conseille=Decimal('10'))
+        self.client_test = Client.objects.create(nom='Client test')
+        self.categories = [
+            CategorieCharge.objects.create(nom='Loyer', type_charge='fixe'),
+            CategorieCharge.objects.create(nom='Transport', type_charge='variable'),
+        ]
+        entrer_stock(self.magasin.pk, self.produit.pk, 1000, Decimal('5'), 'ajustement', 'INIT')
+        self.nb_lignes = 0
+        # Plus d'une page (15 lignes) dès le départ
+        self._ajouter_lignes(20)
+
+    def _ajouter_lignes(self, nombre):
+        aujourdhui = date.today()
+        for i in range(self.nb_lignes, self.nb_lignes + nombre):
+            Vente.objects.create(
+                numero=f'VTE{i + 1:04d}', date=aujourdhui, magasin=self.magasin, client=self.client_test,
+                produit=self.produit, quantite_vendue=Decimal('1'), prix_unitaire=Decimal('10'),
+                type_vente='cash' if i % 2 else 'credit',
+            )
+            CreditClient.objects.create(
+                numero=f'CRD{i + 1:04d}', date=aujourdhui, client=self.client_test, magasin=self.magasin,
+                produit=self.produit, quantite=Decimal('1'), prix_unitaire=Decimal('20'),
+                montant_paye=Decimal('5'),
+            )
+            Charge.objects.create(
+                numero=f'CHG{i + 1:04d}', date=aujourdhui, categorie=self.categories[i % 2],
+                libelle='Charge test', montant=Decimal('30'), mode_paiement='especes',
+            )
+            MouvementCaisse.objects.create(date=aujourdhui, libelle='Mouvement test',
+                                           montant_entree=Decimal('40'), montant_sortie=Decimal('15'))
+        self.nb_lignes += nombre
+
+    def _afficher(self, nom_url):
+        # Les totaux de pagination et les listes de référence sont en cache
+        cache.clear()
+        with CaptureQueriesContext(connection) as requetes:
+            reponse = self.client.get(reverse(nom_url))
+        self.assertEqual(reponse.status_code, 200)
+        return reponse, [requete['sql'] for requete in requetes.captured_queries]
+
+    def test_une_requete_de_sommes_par_liste(self):
+        for nom_url, table in self.LISTES.items():
+            with self.subTest(liste=nom_url):
+                _, requetes = self._afficher(nom_url)
+                # Les ventilations par date (GROUP BY) ne sont pas des totaux
+                sommes = [sql for sql in requetes
+                          if 'SUM(' in sql and f'FROM "{table}"' in sql and 'GROUP BY' not in sql]
+                self.assertEqual(len(sommes), 1, sommes)
+
+    def test_nombre_de_requetes_independant_du_nombre_de_lignes(self):
+        for nom_url in self.LISTES:
+            # Première lecture des listes de référence, gardées dans le processus
+            self._afficher(nom_url)
+        nombres = {nom_url: len(self._afficher(nom_url)[1]) for nom_url in self.LISTES}
+        self._ajouter_lignes(10)
+        for nom_url, nombre in nombres.items():
+            with self.subTest(liste=nom_url):
+                cache.clear()
+                with self.assertNumQueries(nombre):
+                    self.client.get(reverse(nom_url))
+
+    def test_valeurs_des_totaux(self):
+        n = self.nb_lignes
+        reponse, _ = self._afficher('ventes:vente_list')
+        self.assertEqual(reponse.context['total_ventes'], 10 * n)
+        self.assertEqual(reponse.context['ventes_cash'] + reponse.context['ventes_credit'], 10 * n)
+        reponse, _ = self._afficher('credits:credit_list')
+        self.assertEqual(reponse.context['total_credits'], 20 * n)
+        self.assertEqual(reponse.context['total_paye'], 5 * n)
+        self.assertEqual(reponse.context['total_impaye'], 15 * n)
+        reponse, _ = self._afficher('charges:charge_list')
+        self.assertEqual(reponse.context['total_charges'], 30 * n)
+        self.assertEqual(reponse.context['charges_fixes'] + reponse.context['charges_variables'], 30 * n)
+        reponse, _ = self._afficher('caisse:list')
+        self.assertEqual(reponse.context['total_entree'], 40 * n)
+        self.assertEqual(reponse.context['total_sortie'], 15 * n)
+
+
+class ReferentielTests(TestCase):
+    """
+    Une fiche écrite par un autre processus (simulée par bulk_create, sans
+    signal) apparaît au plus tard DUREE_INSTANTANE secondes plus tard
+    """
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('test', password='test'))
+        referentiel.invalider('produits')
+
+    def test_liste_relue_apres_expiration(self):
+        referentiel.liste('produits')
+        Produit.objects.bulk_create([Produit(nom='Riz', unite_mesure='sac', prix_vente_conseille=Decimal('10'))])
+        self.assertEqual(referentiel.liste('produits'), [])
+        plus_tard = referentiel.time.monotonic() + referentiel.DUREE_INSTANTANE
+        with mock.patch.object(referentiel.time, 'monotonic', return_value=plus_tard):
+            self.assertEqual([p.nom for p in referentiel.liste('produits')], ['Riz'])
+
+    def test_stock_a_date_avec_liste_perimee(self):
+        magasin = Magasin.objects.create(nom='Magasin test')
+        referentiel.liste('produits')
+        produit, = Produit.objects.bulk_create([
+            Produit(nom='Riz', unite_mesure='sac', prix_vente_conseille=Decimal('10')),
+        ])
+        entrer_stock(magasin.pk, produit.pk, 10, Decimal('5'), 'ajustement', 'INIT')
+        reponse = self.client.get(reverse('stocks:stock_a_date'), {'format': 'json'})
+        self.assertEqual([ligne['produit'] for ligne in reponse.json()['lignes']], ['Riz'])
+
+
+class AutocompletionTests(TestCase):
+    """L'index ne se croit à jour que s'il a appliqué toutes les versions, et pour DUREE_INDEX secondes"""
+
+    def setUp(self):
+        CLIENTS._installer(CLIENTS._construire())
+
+    def test_modification_appliquee(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Client.objects.create(nom='Kourouma')
+        self.assertTrue(CLIENTS._a_jour())
+        self.assertEqual([texte for _, texte in CLIENTS.rechercher('kourou')], ['Kourouma'])
+
+    def test_modification_d_un_autre_processus(self):
+        # Version incrémentée ailleurs (cache partagé), puis modification appliquée ici
+        referentiel.invalider('clients')
+        with self.captureOnCommitCallbacks(execute=True):
+            Client.objects.create(nom='Kourouma')
+        self.assertFalse(CLIENTS._a_jour())
+
+    def test_index_trop_ancien(self):
+        plus_tard = autocompletion.time.monotonic() + autocompletion.DUREE_INDEX
+        with mock.patch.object(autocompletion.time, 'monotonic', return_value=plus_tard):
+            self.assertFalse(CLIENTS._a_jour())
+
+
+class TachesExportTests(TestCase):
+    """Une tâche longue qui donne signe de vie n'est pas reprise ; une tâche reprise n'écrase pas l'autre worker"""
+
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        reglages = override_settings(MEDIA_ROOT=self.media.name)
+        reglages.enable()
+        self.addCleanup(reglages.disable)
+        Produit.objects.create(nom='Riz', unite_mesure='sac', prix_vente_conseille=Decimal('10'))
+        self.tache = TacheExport.objects.create(utilisateur=User.objects.create_user('test'),
+                                                type_export='produits', format_fichier='csv')
+
+    def test_tache_longue_avec_signe_de_vie(self):
+        tache = TacheExport.prendre_suivante()
+        TacheExport.objects.filter(pk=tache.pk).update(date_debut=timezone.now() - 2 * DELAI_ABANDON)
+        self.assertEqual(TacheExport.reprendre_abandonnees(), 0)
+
+    def test_tache_reprise(self):
+        premiere = TacheExport.prendre_suivante()
+        TacheExport.objects.filter(pk=premiere.pk).update(date_signe_de_vie=timezone.now() - timedelta(hours=2))
+        seconde = TacheExport.prendre_suivante()
+        self.assertEqual(seconde.tentatives, 2)
+        self.assertTrue(seconde.executer())
+        self.assertFalse(premiere.executer())
+        self.tache.refresh_from_db()
+        self.assertEqual((self.tache.statut, self.tache.fichier.name, self.tache.nb_lignes),
+                         ('termine', seconde.fichier.name, 1))
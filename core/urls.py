@@ -8,6 +8,15 @@ urlpatterns = [
     path('', views.dashboard, name='dashboard'),
     path('profile/', views.profile_view, name='profile'),
     
+    # Exports en tâche de fond
+    path('exports/', views.mes_exports, name='mes_exports'),
+    path('exports/nouveau/<str:type_export>/', views.export_differe, name='export_differe'),
+    path('exports/<int:pk>/statut/', views.statut_export, name='statut_export'),
+    path('exports/<int:pk>/telecharger/', views.telecharger_export, name='telecharger_export'),
+    
+    # Recherche globale
+    path('recherche/', views.recherche_globale, name='recherche_globale'),
+    
     # URLs d'authentification
     path('login/', auth_views.LoginView.as_view(template_name='registration/login.html'), name='login'),
     path('logout/', auth_views.LogoutView.as_view(), name='logout'),
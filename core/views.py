@@ -1,13 +1,20 @@
-from django.shortcuts import render
+from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
-from django.db.models import Sum, Count, F, Q
+from django.contrib import messages
+from django.http import FileResponse, Http404, JsonResponse
+from django.views.decorators.http import require_POST
+from django.db.models import Sum, Count, Q
 from datetime import datetime, timedelta
 from django.utils import timezone
 import json
-from ventes.models import Vente
+from ventes.models import Vente, VenteJournaliere
 from fournisseurs.models import Fournisseur, Livraison, Produit
 from credits.models import CreditClient
-from stocks.models import StockActuel
+from stocks.models import AlerteStock
+from .agregats import calculer_totaux, somme
+from .exports import DEFINITIONS
+from .models import TacheExport
+from . import recherche_globale as globale
 
 
 @login_required
@@ -28,36 +35,38 @@ def dashboard(request):
     except ValueError:
         date_debut = date_fin - timedelta(days=6)
 
-    # Ventes sur la période
-    ventes_qs = Vente.objects.filter(date__range=(date_debut, date_fin))
-    montant_ventes_periode = ventes_qs.aggregate(total=Sum('total_vente'))['total'] or 0
+    # Ventes sur la période (lues depuis les cumuls journaliers)
+    cumuls_qs = VenteJournaliere.objects.filter(date__range=(date_debut, date_fin))
+    totaux_ventes = calculer_totaux(
+        VenteJournaliere.objects.filter(Q(date__range=(date_debut, date_fin)) | Q(date=today)),
+        montant_ventes_periode=somme('total', date__range=(date_debut, date_fin)),
+        total_ventes_jour=somme('total', date=today),
+    )
+    montant_ventes_periode = totaux_ventes['montant_ventes_periode']
+    total_ventes_jour = totaux_ventes['total_ventes_jour']
 
     # Ventes par jour (labels + data)
     # Génère la liste des dates dans l'intervalle
     nb_jours = (date_fin - date_debut).days + 1
     jours = [date_debut + timedelta(days=i) for i in range(nb_jours)]
     ventes_par_jour_dict = dict(
-        ventes_qs.values('date').annotate(total=Sum('total_vente')).values_list('date', 'total')
+        cumuls_qs.values('date').annotate(montant=Sum('total')).values_list('date', 'montant')
     )
     labels = [j.strftime('%d/%m') for j in jours]
     data = [float(ventes_par_jour_dict.get(j, 0)) for j in jours]
 
-    # Ventes du jour
-    total_ventes_jour = Vente.objects.filter(date=today).aggregate(total=Sum('total_vente'))['total'] or 0
-
     # Produits actifs (ayant été vendus pendant la période)
     total_produits_actifs = (
-        ventes_qs.values('produit_id').distinct().count()
+        cumuls_qs.values('produit_id').distinct().count()
     )
 
     # Crédits impayés (solde > 0)
     credits_impayes = CreditClient.objects.filter(solde_restant__gt=0).aggregate(total=Sum('solde_restant'))['total'] or 0
 
-    # Stocks faibles (quantité <= seuil)
+    # Stocks faibles : alertes en cours, ruptures d'abord (table des alertes)
     stocks_faibles = (
-        StockActuel.objects.select_related('produit', 'magasin')
-        .filter(Q(quantite_actuelle__lte=0) | Q(quantite_actuelle__gt=0, quantite_actuelle__lte=F('seuil_alerte')))
-        .order_by('magasin__nom', 'produit__nom')[:10]
+        AlerteStock.objects.select_related('produit', 'magasin', 'stock')
+        .order_by('-etat', 'magasin__nom', 'produit__nom')[:10]
     )
 
     # Dernières ventes
@@ -98,3 +107,88 @@ def profile_view(request):
         'user': request.user,
     }
     return render(request, 'core/profile.html', context)
+
+
+@login_required
+@require_POST
+def export_differe(request, type_export):
+    """
+    Enregistre un export en tâche de fond (mêmes filtres que l'export direct)
+    et répond immédiatement avec le numéro de la tâche
+    """
+    if type_export not in DEFINITIONS:
+        raise Http404("Export inconnu")
+    parametres = {
+        cle: valeur for cle, valeur in request.POST.items()
+        if cle not in ('csrfmiddlewaretoken', 'format') and valeur
+    }
+    tache = TacheExport.objects.create(
+        utilisateur=request.user,
+        type_export=type_export,
+        format_fichier='csv' if request.POST.get('format') == 'csv' else 'xlsx',
+        parametres=parametres,
+    )
+    if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+        return JsonResponse({'id': tache.pk, 'statut': tache.statut}, status=202)
+    messages.success(request, f"Export n°{tache.pk} enregistré. Il sera disponible dans « Mes exports ».")
+    return redirect('core:mes_exports')
+
+
+@login_required
+def mes_exports(request):
+    """
+    Exports en tâche de fond demandés par l'utilisateur connecté
+    """
+    context = {
+        'title': 'Mes exports',
+        'taches': TacheExport.objects.filter(utilisateur=request.user)[:50],
+    }
+    return render(request, 'core/mes_exports.html', context)
+
+
+@login_required
+def statut_export(request, pk):
+    """Statut d'une tâche d'export (JSON)"""
+    tache = get_object_or_404(TacheExport, pk=pk, utilisateur=request.user)
+    return JsonResponse({
+        'id': tache.pk,
+        'statut': tache.statut,
+        'nb_lignes': tache.nb_lignes,
+        'erreur': tache.erreur,
+    })
+
+
+@login_required
+def telecharger_export(request, pk):
+    """Télécharger le fichier d'un export terminé"""
+    tache = get_object_or_404(TacheExport, pk=pk, utilisateur=request.user, statut='termine')
+    if not tache.fichier:
+        raise Http404("Fichier introuvable")
+    return FileResponse(tache.fichier.open('rb'), as_attachment=True,
+                        filename=tache.fichier.name.rsplit('/', 1)[-1])
+
+
+@login_required
+def recherche_globale(request):
+    """
+    Recherche dans tous les modules (ventes, crédits, livraisons, mouvements,
+    charges, employés, véhicules). Réponse JSON si format=json ou requête AJAX.
+    """
+    q = request.GET.get('q', '').strip()
+    types = [t for t in request.GET.getlist('type') if t in globale.PAR_TYPE]
+    resultats, curseur_suivant = globale.rechercher(q, request.GET.get('curseur'), types)
+    if request.GET.get('format') == 'json' or request.headers.get('x-requested-with') == 'XMLHttpRequest':
+        return JsonResponse({'resultats': resultats, 'curseur_suivant': curseur_suivant})
+
+    parametres = request.GET.copy()
+    parametres.pop('curseur', None)
+    context = {
+        'title': 'Recherche globale',
+        'q': q,
+        'types': types,
+        'documents': globale.DOCUMENTS,
+        'resultats': resultats,
+        'curseur_suivant': curseur_suivant,
+        'parametres': parametres.urlencode(),
+    }
+    return render(request, 'core/recherche_globale.html', context)
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import CreditClient, Paiement
+from .models import CreditClient, EncoursClient, Paiement, RecouvrementMensuel
 
 
 class PaiementInline(admin.TabularInline):
@@ -50,3 +50,18 @@ class PaiementAdmin(admin.ModelAdmin):
     search_fields = ['credit__numero', 'credit__client__nom', 'reference']
     ordering = ['-date_paiement']
     readonly_fields = ['date_creation']
+
+
+@admin.register(EncoursClient)
+class EncoursClientAdmin(admin.ModelAdmin):
+    list_display = ['client', 'encours', 'nb_credits_ouverts', 'date_plus_ancien', 'date_maj']
+    search_fields = ['client__nom', 'client__prenom', 'client__telephone']
+    readonly_fields = ['client', 'encours', 'nb_credits_ouverts', 'date_plus_ancien', 'date_maj']
+
+
+@admin.register(RecouvrementMensuel)
+class RecouvrementMensuelAdmin(admin.ModelAdmin):
+    list_display = ['mois', 'magasin', 'nb_credits', 'montant_credits', 'montant_encaisse', 'solde_restant']
+    list_filter = ['magasin']
+    ordering = ['-mois', 'magasin']
+    readonly_fields = ['mois', 'magasin', 'nb_credits', 'montant_credits', 'montant_encaisse', 'solde_restant']
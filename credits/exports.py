@@ -0,0 +1,55 @@
+from datetime import date as dt_date, datetime
+from core.exports import Colonne, DefinitionExport, date_fr, entier, nom_complet
+from core.filtres import identifiant
+from .models import CreditClient
+from .services import TRANCHES_ANCIENNETE, balance_agee
+
+
+def filtrer_credits(params):
+    """Crédits filtrés par statut (soldé / impayé) et par client"""
+    credits = CreditClient.objects.order_by('-date')
+    statut = params.get('statut')
+    if statut == 'solde':
+        credits = credits.filter(solde_restant__lte=0)
+    elif statut == 'impaye':
+        credits = credits.filter(solde_restant__gt=0)
+    client_id = identifiant(params, 'client')
+    if client_id:
+        credits = credits.filter(client_id=client_id)
+    return credits
+
+
+CREDITS = DefinitionExport('credits', 'Crédits', [
+    Colonne('N° Crédit', 'numero'),
+    Colonne('Date', 'date', formater=date_fr),
+    Colonne('Client', 'client__nom', 'client__prenom', formater=nom_complet),
+    Colonne('Magasin', 'magasin__nom'),
+    Colonne('Produit', 'produit__nom'),
+    Colonne('Quantité', 'quantite', formater=entier),
+    Colonne('Prix unitaire', 'prix_unitaire', formater=entier),
+    Colonne('Montant total', 'montant_total', formater=entier),
+    Colonne('Montant payé', 'montant_paye', formater=entier),
+    Colonne('Solde restant', 'solde_restant', formater=entier),
+    Colonne('Observations', 'observations'),
+], filtrer_credits)
+
+
+def date_reference(params):
+    """Date de référence de la balance âgée (paramètre 'date', aujourd'hui par défaut)"""
+    try:
+        return datetime.strptime(params.get('date') or '', '%Y-%m-%d').date()
+    except ValueError:
+        return dt_date.today()
+
+
+def filtrer_balance_agee(params):
+    """Balance âgée filtrée par magasin et par client"""
+    return balance_agee(date_reference(params), identifiant(params, 'magasin'), identifiant(params, 'client'))
+
+
+BALANCE_AGEE = DefinitionExport('balance_agee', 'Balance âgée', [
+    Colonne('Client', 'client__nom', 'client__prenom', formater=nom_complet),
+    Colonne('Magasin', 'magasin__nom'),
+    *[Colonne(libelle, cle, formater=entier) for cle, libelle, *_ in TRANCHES_ANCIENNETE],
+    Colonne('Total dû', 'total', formater=entier),
+], filtrer_balance_agee)
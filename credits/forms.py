@@ -1,8 +1,11 @@
 from django import forms
+from django.core.exceptions import ValidationError
 from crispy_forms.helper import FormHelper
 from crispy_forms.layout import Layout, Fieldset, Submit, Row, Column
 from .models import CreditClient, Paiement
+from .services import verifier_limite_credit
 from fournisseurs.models import Produit
+from ventes.models import Client
 from stocks.models import StockActuel
 from datetime import date as dt_date
 import re
@@ -24,16 +27,25 @@ class CreditClientForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         # Hints/attrs
+        self.fields['numero'].required = False
         self.fields['numero'].widget.attrs.update({
-            'placeholder': 'CRD0001',
+            'placeholder': 'Automatique',
             'pattern': r'^CRD\\d{4,}$',
-            'title': 'Format attendu: CRD0001'
+            'title': 'Laisser vide pour un numéro automatique, sinon format CRD0001'
         })
         # Listes déroulantes pour client, magasin et produit
         if 'client' in self.fields:
-            self.fields['client'].queryset = self.fields['client'].queryset.order_by('nom')
-            self.fields['client'].empty_label = '— Sélectionner un client —'
+            # La liste n'affiche que le client choisi : les autres sont proposés
+            # par le champ de recherche (autocomplétion)
+            self.fields['client'].empty_label = '— Rechercher un client —'
             self.fields['client'].widget.attrs.update({'class': 'form-select'})
+            client_id = self.data.get('client') or self.initial.get('client') or getattr(self.instance, 'client_id', None)
+            choix = [('', self.fields['client'].empty_label)]
+            if client_id and str(client_id).isdigit():
+                client = self.fields['client'].queryset.filter(pk=client_id).first()
+                if client:
+                    choix.append((client.pk, str(client)))
+            self.fields['client'].widget.choices = choix
         if 'magasin' in self.fields:
             self.fields['magasin'].queryset = self.fields['magasin'].queryset.order_by('nom')
             self.fields['magasin'].empty_label = '— Sélectionner un magasin —'
@@ -81,7 +93,10 @@ class CreditClientForm(forms.ModelForm):
         )
 
     def clean_numero(self):
+        # Vide : numéro attribué à l'enregistrement (credits.views.credit_create)
         numero = (self.cleaned_data.get('numero') or '').strip().upper()
+        if not numero:
+            return numero
         if not re.match(r'^CRD\d{4,}$', numero):
             raise forms.ValidationError('Numéro invalide. Format attendu: CRD0001')
         return numero
@@ -100,6 +115,15 @@ class CreditClientForm(forms.ModelForm):
             # Vérifie que le produit est disponible pour ce magasin
             if not StockActuel.objects.filter(magasin=magasin, produit=produit).exists():
                 self.add_error('produit', "Le produit sélectionné n'est pas disponible dans le magasin choisi.")
+        client = cleaned.get('client')
+        quantite = cleaned.get('quantite')
+        prix_unitaire = cleaned.get('prix_unitaire')
+        if client and quantite and prix_unitaire:
+            montant = quantite * prix_unitaire - (self.instance.montant_paye or 0)
+            try:
+                verifier_limite_credit(client, montant, credit_id=self.instance.pk)
+            except ValidationError as e:
+                self.add_error('client', e)
         return cleaned
 
 
@@ -140,3 +164,40 @@ class PaiementForm(forms.ModelForm):
     def clean_reference(self):
         ref = self.cleaned_data.get('reference')
         return ref.strip().upper() if ref else ref
+
+
+class VersementClientForm(PaiementForm):
+    """
+    Formulaire d'un versement global réparti sur les crédits ouverts d'un client
+    """
+    client = forms.ModelChoiceField(queryset=Client.objects.all(), label="Client")
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Comme pour le crédit : seule l'option du client choisi est rendue,
+        # les autres sont proposées par l'autocomplétion
+        self.fields['client'].empty_label = '— Rechercher un client —'
+        self.fields['client'].widget.attrs.update({'class': 'form-select'})
+        client_id = self.data.get('client') or self.initial.get('client')
+        choix = [('', self.fields['client'].empty_label)]
+        if client_id and str(client_id).isdigit():
+            client = self.fields['client'].queryset.filter(pk=client_id).first()
+            if client:
+                choix.append((client.pk, str(client)))
+        self.fields['client'].widget.choices = choix
+        self.helper.layout = Layout(
+            Fieldset(
+                'Versement du client',
+                'client',
+                Row(
+                    Column('date_paiement', css_class='form-group col-md-6 mb-0'),
+                    Column('montant', css_class='form-group col-md-6 mb-0'),
+                ),
+                Row(
+                    Column('mode_paiement', css_class='form-group col-md-6 mb-0'),
+                    Column('reference', css_class='form-group col-md-6 mb-0'),
+                ),
+                'observations',
+            ),
+            Submit('submit', 'Répartir le versement', css_class='btn btn-success')
+        )
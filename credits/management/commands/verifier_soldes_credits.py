@@ -0,0 +1,57 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Sum
+from credits.models import CreditClient, Paiement
+from credits.services import actualiser_encours, reconstruire_recouvrement
+
+DEUX_DECIMALES = Decimal('0.01')
+
+
+class Command(BaseCommand):
+    help = ("Recalcule le montant payé et le solde de chaque crédit à partir des paiements "
+            "et signale les écarts (--corriger pour les rectifier)")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--corriger', action='store_true',
+                            help="Enregistre les montants recalculés pour les crédits en écart")
+        parser.add_argument('--taille-lot', type=int, default=500,
+                            help="Nombre de crédits mis à jour par requête")
+
+    def handle(self, *args, **options):
+        payes = dict(
+            Paiement.objects.order_by().values('credit_id').annotate(total=Sum('montant'))
+            .values_list('credit_id', 'total')
+        )
+        ecarts = []
+        clients = set()
+        credits = CreditClient.objects.order_by('pk').values_list(
+            'pk', 'numero', 'client_id', 'montant_total', 'montant_paye', 'solde_restant'
+        )
+        for pk, numero, client_id, montant_total, montant_paye, solde_restant in credits.iterator(chunk_size=5000):
+            paye = Decimal(payes.get(pk) or 0).quantize(DEUX_DECIMALES)
+            solde = montant_total - paye
+            if paye != montant_paye or solde != solde_restant:
+                ecarts.append(CreditClient(pk=pk, montant_paye=paye, solde_restant=solde))
+                clients.add(client_id)
+                self.stdout.write(
+                    f"{numero} : payé {montant_paye} au lieu de {paye}, "
+                    f"solde {solde_restant} au lieu de {solde}"
+                )
+
+        if not ecarts:
+            self.stdout.write(self.style.SUCCESS("Aucun écart : tous les soldes sont cohérents."))
+            return
+        if not options['corriger']:
+            self.stdout.write(self.style.WARNING(f"{len(ecarts)} crédit(s) en écart (relancer avec --corriger)."))
+            return
+        with transaction.atomic():
+            CreditClient.objects.bulk_update(ecarts, ['montant_paye', 'solde_restant'],
+                                             batch_size=options['taille_lot'])
+            # bulk_update n'appelle pas save() : encours des clients concernés
+            # et recouvrement mensuel recalculés
+            for client_id in clients:
+                actualiser_encours(client_id)
+            reconstruire_recouvrement()
+        self.stdout.write(self.style.SUCCESS(f"{len(ecarts)} crédit(s) corrigé(s)."))
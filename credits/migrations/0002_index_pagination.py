@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-17 14:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('credits', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='creditclient',
+            index=models.Index(fields=['date', 'date_creation', 'id'], name='credit_pagination_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-17 14:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('credits', '0002_index_pagination'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='creditclient',
+            index=models.Index(fields=['solde_restant', 'date'], name='credit_solde_date_idx'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 4.2.30 on 2026-10-17 14:50
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def initialiser_encours(apps, schema_editor):
+    """Calcule l'encours des clients ayant des crédits non soldés"""
+    CreditClient = apps.get_model('credits', 'CreditClient')
+    EncoursClient = apps.get_model('credits', 'EncoursClient')
+    lignes = (
+        CreditClient.objects.filter(solde_restant__gt=0)
+        .values('client_id')
+        .annotate(total=models.Sum('solde_restant'), nb=models.Count('id'), plus_ancien=models.Min('date'))
+        .order_by()
+    )
+    EncoursClient.objects.bulk_create([
+        EncoursClient(client_id=l['client_id'], encours=l['total'], nb_credits_ouverts=l['nb'],
+                      date_plus_ancien=l['plus_ancien'])
+        for l in lignes
+    ], batch_size=1000)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventes', '0005_client_limite_credit'),
+        ('credits', '0003_index_balance_agee'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EncoursClient',
+            fields=[
+                ('client', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='encours', serialize=False, to='ventes.client', verbose_name='Client')),
+                ('encours', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Encours (solde restant dû)')),
+                ('nb_credits_ouverts', models.PositiveIntegerField(default=0, verbose_name='Crédits en cours')),
+                ('date_plus_ancien', models.DateField(blank=True, null=True, verbose_name='Date du plus ancien crédit en cours')),
+                ('date_maj', models.DateTimeField(auto_now=True, verbose_name='Dernière mise à jour')),
+            ],
+            options={
+                'verbose_name': 'Encours Client',
+                'verbose_name_plural': 'Encours Clients',
+                'ordering': ['-encours'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='creditclient',
+            index=models.Index(fields=['client', 'solde_restant', 'date'], name='credit_client_solde_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='encoursclient',
+            index=models.Index(fields=['-encours'], name='encours_client_idx'),
+        ),
+        migrations.RunPython(initialiser_encours, migrations.RunPython.noop),
+    ]
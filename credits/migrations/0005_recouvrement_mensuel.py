@@ -0,0 +1,64 @@
+# Generated by Django 4.2.30 on 2026-10-17 14:57
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models.functions import TruncMonth
+
+
+def initialiser_recouvrement(apps, schema_editor):
+    CreditClient = apps.get_model('credits', 'CreditClient')
+    Paiement = apps.get_model('credits', 'Paiement')
+    RecouvrementMensuel = apps.get_model('credits', 'RecouvrementMensuel')
+    lignes = {}
+    credits = (
+        CreditClient.objects.order_by().annotate(mois=TruncMonth('date'))
+        .values('mois', 'magasin_id')
+        .annotate(
+            nb_credits=models.Count('id'),
+            montant_credits=models.Sum('montant_total'),
+            solde_restant=models.Sum('solde_restant'),
+        )
+    )
+    for ligne in credits:
+        lignes.setdefault((ligne.pop('mois'), ligne.pop('magasin_id')), {}).update(ligne)
+    paiements = (
+        Paiement.objects.order_by().annotate(mois=TruncMonth('date_paiement'))
+        .values('mois', magasin_id=models.F('credit__magasin_id'))
+        .annotate(montant_encaisse=models.Sum('montant'))
+    )
+    for ligne in paiements:
+        lignes.setdefault((ligne['mois'], ligne['magasin_id']), {})['montant_encaisse'] = ligne['montant_encaisse']
+    RecouvrementMensuel.objects.bulk_create([
+        RecouvrementMensuel(mois=mois, magasin_id=magasin_id, **valeurs)
+        for (mois, magasin_id), valeurs in lignes.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventes', '0005_client_limite_credit'),
+        ('credits', '0004_encours_client'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecouvrementMensuel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mois', models.DateField(verbose_name='Mois (premier jour)')),
+                ('nb_credits', models.IntegerField(default=0, verbose_name='Crédits accordés')),
+                ('montant_credits', models.DecimalField(decimal_places=2, default=0, max_digits=16, verbose_name='Montant des crédits accordés')),
+                ('montant_encaisse', models.DecimalField(decimal_places=2, default=0, max_digits=16, verbose_name='Montant encaissé dans le mois')),
+                ('solde_restant', models.DecimalField(decimal_places=2, default=0, max_digits=16, verbose_name='Solde restant des crédits du mois')),
+                ('magasin', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recouvrements_mensuels', to='ventes.magasin', verbose_name='Magasin')),
+            ],
+            options={
+                'verbose_name': 'Recouvrement mensuel',
+                'verbose_name_plural': 'Recouvrements mensuels',
+                'ordering': ['-mois', 'magasin'],
+                'unique_together': {('mois', 'magasin')},
+            },
+        ),
+        migrations.RunPython(initialiser_recouvrement, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.core.validators import MinValueValidator
 from decimal import Decimal
 from ventes.models import Client, Magasin
@@ -38,14 +38,52 @@ class CreditClient(models.Model):
         verbose_name = "Crédit Client"
         verbose_name_plural = "Crédits Clients"
         ordering = ['-date', '-date_creation']
+        indexes = [
+            # Pagination par clé sur (date, date_creation, id)
+            models.Index(fields=['date', 'date_creation', 'id'], name='credit_pagination_idx'),
+            # Balance âgée : crédits non soldés par date
+            models.Index(fields=['solde_restant', 'date'], name='credit_solde_date_idx'),
+            # Encours d'un client : ses crédits non soldés, sans lire la table
+            models.Index(fields=['client', 'solde_restant', 'date'], name='credit_client_solde_idx'),
+        ]
     
     def save(self, *args, **kwargs):
         """
-        Calcul automatique du montant total et du solde restant
+        Calcul automatique du montant total et du solde restant, et sortie
+        du stock du magasin, mise à jour de l'encours du client et du
+        recouvrement mensuel dans la même transaction. Une modification
+        qui ne touche ni le magasin, ni le produit, ni la quantité, ni la
+        date (paiement) ne fait aucun mouvement de stock.
+        Lève StockInsuffisant si la quantité n'est pas disponible.
         """
+        from stocks.services import sortir_stock, rentrer_stock
+        from .services import actualiser_encours, cumuler_credit
+
         self.montant_total = self.quantite * self.prix_unitaire
         self.solde_restant = self.montant_total - self.montant_paye
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            precedent = None
+            if self.pk:
+                precedent = CreditClient.objects.filter(pk=self.pk).values(
+                    'magasin_id', 'produit_id', 'quantite', 'client_id', 'date', 'montant_total', 'solde_restant'
+                ).first()
+            stock_modifie = not precedent or (
+                (precedent['magasin_id'], precedent['produit_id'], precedent['quantite'], precedent['date'])
+                != (self.magasin_id, self.produit_id, self.quantite, self.date)
+            )
+            if precedent:
+                if stock_modifie:
+                    rentrer_stock(precedent['magasin_id'], precedent['produit_id'], precedent['quantite'],
+                                  'credit', self.numero, precedent['date'])
+                cumuler_credit(precedent['date'], precedent['magasin_id'], precedent['montant_total'],
+                               precedent['solde_restant'], signe=-1)
+            if stock_modifie:
+                sortir_stock(self.magasin_id, self.produit_id, self.quantite, 'credit', self.numero, self.date)
+            super().save(*args, **kwargs)
+            cumuler_credit(self.date, self.magasin_id, self.montant_total, self.solde_restant)
+            actualiser_encours(self.client_id)
+            if precedent and precedent['client_id'] != self.client_id:
+                actualiser_encours(precedent['client_id'])
     
     @property
     def est_solde(self):
@@ -94,15 +132,95 @@ class Paiement(models.Model):
     
     def save(self, *args, **kwargs):
         """
-        Met à jour le montant payé du crédit après enregistrement du paiement
+        Impute le paiement sur le crédit et met à jour l'encours du client
+        et le recouvrement mensuel dans la même transaction. En
+        modification, l'ancien montant est d'abord retiré (éventuellement
+        d'un autre crédit).
         """
-        super().save(*args, **kwargs)
-        # Recalculer le montant total payé pour ce crédit
-        total_paye = self.credit.paiements.aggregate(
-            total=models.Sum('montant')
-        )['total'] or 0
-        self.credit.montant_paye = total_paye
-        self.credit.save()
+        from .services import actualiser_encours, cumuler_paiement, imputer_paiement
+
+        with transaction.atomic():
+            clients = set()
+            if self.pk:
+                precedent = Paiement.objects.filter(pk=self.pk).values(
+                    'credit_id', 'montant', 'date_paiement', 'credit__client_id', 'credit__magasin_id', 'credit__date'
+                ).first()
+                if precedent:
+                    imputer_paiement(precedent['credit_id'], -precedent['montant'])
+                    cumuler_paiement(precedent['credit__magasin_id'], precedent['credit__date'],
+                                     precedent['date_paiement'], -precedent['montant'])
+                    clients.add(precedent['credit__client_id'])
+            super().save(*args, **kwargs)
+            imputer_paiement(self.credit_id, self.montant)
+            credit = CreditClient.objects.filter(pk=self.credit_id).values('client_id', 'magasin_id', 'date').first()
+            cumuler_paiement(credit['magasin_id'], credit['date'], self.date_paiement, self.montant)
+            clients.add(credit['client_id'])
+            for client_id in clients:
+                actualiser_encours(client_id)
+        if Paiement.credit.is_cached(self):
+            self.credit.refresh_from_db(fields=['montant_paye', 'solde_restant', 'date_modification'])
     
     def __str__(self):
         return f"Paiement {self.montant} - {self.credit.numero}"
+
+
+class EncoursClient(models.Model):
+    """
+    Encours de crédit d'un client, recalculé à chaque enregistrement ou
+    suppression d'un de ses crédits ou paiements (credits.services.actualiser_encours)
+    """
+    client = models.OneToOneField(Client, on_delete=models.CASCADE, primary_key=True,
+                                  related_name='encours', verbose_name="Client")
+    encours = models.DecimalField(max_digits=14, decimal_places=2, default=0,
+                                  verbose_name="Encours (solde restant dû)")
+    nb_credits_ouverts = models.PositiveIntegerField(default=0, verbose_name="Crédits en cours")
+    date_plus_ancien = models.DateField(blank=True, null=True,
+                                        verbose_name="Date du plus ancien crédit en cours")
+    date_maj = models.DateTimeField(auto_now=True, verbose_name="Dernière mise à jour")
+
+    class Meta:
+        verbose_name = "Encours Client"
+        verbose_name_plural = "Encours Clients"
+        ordering = ['-encours']
+        indexes = [
+            # Liste des débiteurs par encours décroissant
+            models.Index(fields=['-encours'], name='encours_client_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.client} - {self.encours}"
+
+
+class RecouvrementMensuel(models.Model):
+    """
+    Recouvrement mensuel par magasin : crédits accordés dans le mois,
+    encaissements du mois et solde restant dû sur les crédits du mois.
+    Tenu à jour à chaque écriture de crédit ou de paiement (credits.services).
+    """
+    mois = models.DateField(verbose_name="Mois (premier jour)")
+    magasin = models.ForeignKey(Magasin, on_delete=models.CASCADE,
+                                related_name='recouvrements_mensuels', verbose_name="Magasin")
+    nb_credits = models.IntegerField(default=0, verbose_name="Crédits accordés")
+    montant_credits = models.DecimalField(max_digits=16, decimal_places=2, default=0,
+                                          verbose_name="Montant des crédits accordés")
+    montant_encaisse = models.DecimalField(max_digits=16, decimal_places=2, default=0,
+                                           verbose_name="Montant encaissé dans le mois")
+    solde_restant = models.DecimalField(max_digits=16, decimal_places=2, default=0,
+                                        verbose_name="Solde restant des crédits du mois")
+
+    class Meta:
+        verbose_name = "Recouvrement mensuel"
+        verbose_name_plural = "Recouvrements mensuels"
+        # L'index unique (mois, magasin) sert les séries par plage de mois
+        unique_together = ['mois', 'magasin']
+        ordering = ['-mois', 'magasin']
+
+    @property
+    def taux_recouvrement(self):
+        """Part des crédits du mois déjà remboursée, en pourcentage"""
+        if self.montant_credits > 0:
+            return (self.montant_credits - self.solde_restant) / self.montant_credits * 100
+        return 0
+
+    def __str__(self):
+        return f"{self.mois:%m/%Y} - {self.magasin}"
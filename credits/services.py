@@ -0,0 +1,305 @@
+"""
+Services du module crédits : imputation des paiements sur les crédits,
+encours par client, recouvrement mensuel et balance âgée.
+
+Un paiement ajoute son montant au crédit par une seule requête UPDATE
+avec des expressions F() : le total n'est pas recalculé à partir de
+l'historique des paiements, et deux paiements simultanés sur le même
+crédit s'additionnent au lieu d'écraser le total l'un de l'autre.
+
+L'encours d'un client (EncoursClient) est recalculé depuis ses crédits non
+soldés après chaque écriture, sous verrou de sa ligne : l'index
+(client, solde_restant, date) limite la lecture à ces seuls crédits. Un
+ajustement par différence dériverait lors des suppressions en cascade, où
+crédits et paiements disparaissent dans un ordre quelconque.
+
+Le recouvrement mensuel (RecouvrementMensuel) est au contraire ajusté par
+deltas, comme les cumuls journaliers des ventes : un crédit compte dans le
+mois de sa date, un paiement est encaissé dans le mois de sa date et
+diminue le solde du mois du crédit.
+"""
+from collections import defaultdict
+from datetime import date as dt_date, timedelta
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Min, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+from core.agregats import somme
+from .models import CreditClient, EncoursClient, Paiement, RecouvrementMensuel
+
+# Tranches de la balance âgée : (clé, libellé, âge minimal, âge maximal en jours)
+TRANCHES_ANCIENNETE = (
+    ('jours_0_30', '0-30 jours', 0, 30),
+    ('jours_31_60', '31-60 jours', 31, 60),
+    ('jours_61_90', '61-90 jours', 61, 90),
+    ('jours_90_plus', '+90 jours', 91, None),
+)
+
+# Durée de mise en cache de la balance âgée (secondes)
+DUREE_CACHE_BALANCE = 120
+
+
+def imputer_paiement(credit_id, montant, sans_depasser=False):
+    """
+    Ajoute un montant (négatif pour une annulation) au montant payé du
+    crédit et le retire du solde restant. Avec sans_depasser=True, rien
+    n'est imputé si le montant dépasse le solde. Retourne True si le
+    crédit a été mis à jour.
+    """
+    credits = CreditClient.objects.filter(pk=credit_id)
+    if sans_depasser:
+        credits = credits.filter(solde_restant__gte=montant)
+    return bool(credits.update(
+        montant_paye=F('montant_paye') + montant,
+        solde_restant=F('solde_restant') - montant,
+        date_modification=timezone.now(),
+    ))
+
+
+def ajuster_recouvrement(mois, magasin_id, **deltas):
+    """
+    Applique des deltas (nb_credits, montant_credits, montant_encaisse,
+    solde_restant) à la ligne (mois, magasin) par une mise à jour SQL
+    atomique. La ligne est créée si un delta est positif, et supprimée
+    lorsqu'elle ne compte plus rien.
+    """
+    deltas = {champ: valeur for champ, valeur in deltas.items() if valeur}
+    if not deltas:
+        return
+    lignes = RecouvrementMensuel.objects.filter(mois=mois.replace(day=1), magasin_id=magasin_id)
+    expressions = {champ: F(champ) + valeur for champ, valeur in deltas.items()}
+    if lignes.update(**expressions):
+        if any(valeur < 0 for valeur in deltas.values()):
+            lignes.filter(nb_credits=0, montant_credits=0, montant_encaisse=0, solde_restant=0).delete()
+        return
+    if all(valeur < 0 for valeur in deltas.values()):
+        # Rien à retirer (ex: ligne supprimée avec son magasin)
+        return
+    try:
+        with transaction.atomic():
+            RecouvrementMensuel.objects.create(mois=mois.replace(day=1), magasin_id=magasin_id, **deltas)
+    except IntegrityError:
+        # Ligne créée entre-temps par une écriture concurrente
+        lignes.update(**expressions)
+
+
+def cumuler_credit(date, magasin_id, montant_total, solde_restant, signe=1):
+    """Ajoute (signe=1) ou retire (signe=-1) un crédit de son mois"""
+    ajuster_recouvrement(
+        date, magasin_id, nb_credits=signe,
+        montant_credits=signe * montant_total, solde_restant=signe * solde_restant,
+    )
+
+
+def cumuler_paiement(magasin_id, date_credit, date_paiement, montant):
+    """
+    Encaisse un paiement (montant négatif pour une annulation) dans le mois
+    du paiement et le retire du solde du mois du crédit
+    """
+    ajuster_recouvrement(date_paiement, magasin_id, montant_encaisse=montant)
+    ajuster_recouvrement(date_credit, magasin_id, solde_restant=-montant)
+
+
+def reconstruire_recouvrement():
+    """Recalcule toute la table du recouvrement mensuel depuis les crédits et paiements"""
+    lignes = defaultdict(dict)
+    credits = (
+        CreditClient.objects.order_by().annotate(mois=TruncMonth('date'))
+        .values('mois', 'magasin_id')
+        .annotate(nb_credits=Count('id'), montant_credits=Sum('montant_total'), solde_restant=Sum('solde_restant'))
+    )
+    for ligne in credits:
+        lignes[(ligne.pop('mois'), ligne.pop('magasin_id'))].update(ligne)
+    paiements = (
+        Paiement.objects.order_by().annotate(mois=TruncMonth('date_paiement'))
+        .values('mois', magasin_id=F('credit__magasin_id'))
+        .annotate(montant_encaisse=Sum('montant'))
+    )
+    for ligne in paiements:
+        lignes[(ligne['mois'], ligne['magasin_id'])]['montant_encaisse'] = ligne['montant_encaisse']
+    with transaction.atomic():
+        RecouvrementMensuel.objects.all().delete()
+        RecouvrementMensuel.objects.bulk_create([
+            RecouvrementMensuel(mois=mois, magasin_id=magasin_id, **valeurs)
+            for (mois, magasin_id), valeurs in lignes.items()
+        ], batch_size=1000)
+
+
+def serie_recouvrement(nb_mois=36, fin=None, magasin_id=None):
+    """
+    Série mensuelle du recouvrement sur les nb_mois mois se terminant au
+    mois de `fin` (aujourd'hui par défaut), tous magasins confondus ou pour
+    un magasin, lue par une requête sur une plage de l'index (mois, magasin).
+    Les mois sans crédit ni paiement valent 0.
+    """
+    fin = (fin or dt_date.today()).replace(day=1)
+    mois = [fin]
+    while len(mois) < nb_mois:
+        precedent = mois[-1] - timedelta(days=1)
+        mois.append(precedent.replace(day=1))
+    mois.reverse()
+
+    lignes = RecouvrementMensuel.objects.filter(mois__gte=mois[0], mois__lte=fin)
+    if magasin_id:
+        lignes = lignes.filter(magasin_id=magasin_id)
+    valeurs = {
+        ligne['mois']: ligne
+        for ligne in lignes.order_by().values('mois').annotate(
+            nb=Sum('nb_credits'), credits=Sum('montant_credits'),
+            encaisse=Sum('montant_encaisse'), solde=Sum('solde_restant'),
+        )
+    }
+    serie = {'mois': [], 'nb_credits': [], 'credits': [], 'encaisse': [], 'solde': [], 'taux_recouvrement': []}
+    zero = Decimal('0')
+    for m in mois:
+        ligne = valeurs.get(m, {})
+        credits = ligne.get('credits') or zero
+        solde = ligne.get('solde') or zero
+        serie['mois'].append(m.strftime('%Y-%m'))
+        serie['nb_credits'].append(ligne.get('nb') or 0)
+        serie['credits'].append(float(credits))
+        serie['encaisse'].append(float(ligne.get('encaisse') or zero))
+        serie['solde'].append(float(solde))
+        serie['taux_recouvrement'].append(round(float((credits - solde) / credits * 100), 1) if credits > 0 else None)
+    return serie
+
+
+def actualiser_encours(client_id):
+    """
+    Recalcule l'encours, le nombre de crédits ouverts et la date du plus
+    ancien d'entre eux pour un client
+    """
+    if not client_id:
+        return
+    with transaction.atomic():
+        list(EncoursClient.objects.select_for_update().filter(pk=client_id).values_list('pk'))
+        valeurs = CreditClient.objects.filter(client_id=client_id, solde_restant__gt=0).aggregate(
+            encours=Sum('solde_restant'), nb_credits_ouverts=Count('id'), date_plus_ancien=Min('date'),
+        )
+        valeurs['encours'] = valeurs['encours'] or 0
+        valeurs['date_maj'] = timezone.now()
+        if not EncoursClient.objects.filter(pk=client_id).update(**valeurs):
+            EncoursClient.objects.create(client_id=client_id, **valeurs)
+
+
+def verifier_limite_credit(client, montant, credit_id=None):
+    """
+    Lève ValidationError si un crédit de ce montant porterait l'encours du
+    client au-delà de sa limite (0 : pas de limite). credit_id: crédit
+    modifié, dont le solde actuel est déjà compté dans l'encours.
+    Dans une transaction, la ligne d'encours du client est verrouillée
+    jusqu'à sa fin : appelée dans la transaction qui enregistre le crédit,
+    deux crédits simultanés ne peuvent pas dépasser ensemble la limite.
+    """
+    if not client.limite_credit:
+        return
+    encours_client = EncoursClient.objects.filter(pk=client.pk)
+    if transaction.get_connection().in_atomic_block:
+        # Ligne créée au besoin pour que le premier crédit la verrouille aussi
+        EncoursClient.objects.get_or_create(client_id=client.pk)
+        encours_client = encours_client.select_for_update()
+    encours = encours_client.values_list('encours', flat=True).first() or 0
+    if credit_id:
+        encours -= CreditClient.objects.filter(
+            pk=credit_id, client_id=client.pk, solde_restant__gt=0
+        ).values_list('solde_restant', flat=True).first() or 0
+    if encours + montant > client.limite_credit:
+        raise ValidationError(
+            f"Limite de crédit dépassée pour {client} : encours {encours:.0f} GNF, "
+            f"limite {client.limite_credit:.0f} GNF, disponible {max(client.limite_credit - encours, 0):.0f} GNF."
+        )
+
+
+def repartir_versement(client_id, montant, date_paiement, mode_paiement, reference=None, observations=None):
+    """
+    Répartit un versement global d'un client sur ses crédits ouverts, du
+    plus ancien au plus récent (FIFO), dans une seule transaction : les
+    paiements sont insérés par bulk_create puis chaque crédit est soldé ou
+    diminué par une requête UPDATE, et le recouvrement mensuel ajusté.
+    Retourne la liste des paiements créés.
+    Lève ValidationError si le client n'a pas de crédit ouvert ou si le
+    montant dépasse le total dû.
+    """
+    with transaction.atomic():
+        credits = list(
+            CreditClient.objects.select_for_update()
+            .filter(client_id=client_id, solde_restant__gt=0)
+            .order_by('date', 'date_creation', 'pk')
+            .values_list('pk', 'solde_restant', 'date', 'magasin_id')
+        )
+        total_du = sum(solde for _, solde, *_ in credits)
+        if not credits:
+            raise ValidationError("Ce client n'a aucun crédit en cours.")
+        if montant > total_du:
+            raise ValidationError(f"Le montant dépasse le total dû par le client ({total_du:.0f} GNF).")
+
+        paiements = []
+        reste = montant
+        for credit_id, solde, date_credit, magasin_id in credits:
+            if reste <= 0:
+                break
+            part = min(reste, solde)
+            cumuler_paiement(magasin_id, date_credit, date_paiement, part)
+            paiements.append(Paiement(
+                credit_id=credit_id, date_paiement=date_paiement, montant=part,
+                mode_paiement=mode_paiement, reference=reference, observations=observations,
+            ))
+            reste -= part
+
+        # bulk_create n'appelle pas Paiement.save() : imputation crédit par crédit.
+        # Sans verrou de ligne (SQLite), un solde diminué entre-temps par un
+        # autre paiement fait échouer l'imputation et annule le versement.
+        Paiement.objects.bulk_create(paiements)
+        for paiement in paiements:
+            if not imputer_paiement(paiement.credit_id, paiement.montant, sans_depasser=True):
+                raise ValidationError(
+                    "Le solde d'un crédit a changé pendant l'enregistrement. Veuillez réessayer."
+                )
+        actualiser_encours(client_id)
+    return paiements
+
+
+def balance_agee(date_reference, magasin_id=None, client_id=None):
+    """
+    Soldes restants par client et par magasin, répartis par ancienneté du
+    crédit à la date de référence, en une seule requête groupée (sommes
+    conditionnelles sur la date). Retourne un queryset de dictionnaires
+    trié du plus gros encours au plus petit.
+    """
+    agregats = {}
+    for cle, _, age_min, age_max in TRANCHES_ANCIENNETE:
+        filtres = {'date__lte': date_reference - timedelta(days=age_min)}
+        if age_max is not None:
+            filtres['date__gte'] = date_reference - timedelta(days=age_max)
+        agregats[cle] = somme('solde_restant', **filtres)
+    credits = CreditClient.objects.filter(solde_restant__gt=0, date__lte=date_reference)
+    if magasin_id:
+        credits = credits.filter(magasin_id=magasin_id)
+    if client_id:
+        credits = credits.filter(client_id=client_id)
+    return (
+        credits.order_by()
+        .values('client_id', 'client__nom', 'client__prenom', 'magasin_id', 'magasin__nom')
+        .annotate(**agregats, total=somme('solde_restant'))
+        .order_by('-total', 'client__nom')
+    )
+
+
+def balance_agee_en_cache(date_reference, magasin_id=None, client_id=None):
+    """
+    Lignes de la balance âgée et totaux par tranche, mis en cache quelques
+    minutes pour une même date et les mêmes filtres
+    """
+    cle = f'balance_agee:{date_reference.isoformat()}:{magasin_id or ""}:{client_id or ""}'
+    resultat = cache.get(cle)
+    if resultat is None:
+        lignes = list(balance_agee(date_reference, magasin_id, client_id))
+        totaux = {c: sum(ligne[c] or 0 for ligne in lignes) for c, *_ in TRANCHES_ANCIENNETE}
+        totaux['total'] = sum(ligne['total'] or 0 for ligne in lignes)
+        resultat = {'lignes': lignes, 'totaux': totaux}
+        cache.set(cle, resultat, DUREE_CACHE_BALANCE)
+    return resultat
@@ -0,0 +1,61 @@
+from django.db.models.signals import post_delete, pre_delete
+from django.dispatch import receiver
+from ventes.models import Client, Magasin
+from .models import CreditClient, Paiement
+from .services import (
+    actualiser_encours, ajuster_recouvrement, cumuler_credit, cumuler_paiement, imputer_paiement,
+)
+from stocks.services import annuler_sortie
+
+
+def _suppression_par(origin, modele):
+    """Vrai si la suppression en cascade part d'une fiche (ou d'un queryset) du modèle"""
+    return isinstance(origin, modele) or getattr(origin, 'model', None) is modele
+
+
+@receiver(pre_delete, sender=CreditClient)
+def retirer_credit_du_recouvrement(sender, instance, **kwargs):
+    """
+    Retire un crédit supprimé de son mois de recouvrement, avec les valeurs
+    en base (l'instance supprimée peut être périmée). Le recouvrement d'un
+    magasin supprimé disparaît avec lui.
+    """
+    if _suppression_par(kwargs.get('origin'), Magasin):
+        return
+    credit = CreditClient.objects.filter(pk=instance.pk).values(
+        'date', 'magasin_id', 'montant_total', 'solde_restant'
+    ).first()
+    if credit:
+        cumuler_credit(credit['date'], credit['magasin_id'], credit['montant_total'],
+                       credit['solde_restant'], signe=-1)
+
+
+@receiver(post_delete, sender=CreditClient)
+def remettre_credit_en_stock(sender, instance, **kwargs):
+    """Remet en stock la quantité d'un crédit supprimé et met à jour l'encours du client"""
+    origin = kwargs.get('origin')
+    annuler_sortie(origin, instance.magasin_id, instance.produit_id, instance.quantite,
+                   'credit', instance.numero, instance.date)
+    # L'encours d'un client supprimé disparaît avec lui
+    if not _suppression_par(origin, Client):
+        actualiser_encours(instance.client_id)
+
+
+@receiver(post_delete, sender=Paiement)
+def annuler_paiement(sender, instance, **kwargs):
+    """Retire du crédit et du recouvrement mensuel le montant d'un paiement supprimé"""
+    origin = kwargs.get('origin')
+    if _suppression_par(origin, Magasin):
+        return
+    credit = CreditClient.objects.filter(pk=instance.credit_id).values('client_id', 'magasin_id', 'date').first()
+    if credit is None:
+        return
+    if not _suppression_par(origin, Paiement):
+        # Suppression en cascade : le crédit est supprimé lui aussi, déjà
+        # retiré du recouvrement avec son solde ; seul l'encaissement reste à
+        # retirer (son signal met l'encours à jour)
+        ajuster_recouvrement(instance.date_paiement, credit['magasin_id'], montant_encaisse=-instance.montant)
+        return
+    if imputer_paiement(instance.credit_id, -instance.montant):
+        cumuler_paiement(credit['magasin_id'], credit['date'], instance.date_paiement, -instance.montant)
+        actualiser_encours(credit['client_id'])
@@ -11,9 +11,17 @@ urlpatterns = [
     
     # Paiements
     path('<int:credit_pk>/paiement/', views.paiement_create, name='paiement_create'),
+    path('versement/', views.versement_client, name='versement_client'),
     # Export
     path('export/', views.credit_export_excel, name='credit_export'),
     
+    # Balance âgée
+    path('balance-agee/', views.balance_agee, name='balance_agee'),
+    path('balance-agee/export/', views.balance_agee_export, name='balance_agee_export'),
+    
+    # Recouvrement mensuel
+    path('recouvrement/', views.recouvrement_mensuel, name='recouvrement_mensuel'),
+    
     # Statistiques
     path('statistiques/', views.statistiques_credits, name='statistiques'),
 
@@ -1,12 +1,27 @@
 from django.shortcuts import render, get_object_or_404, redirect
+from django.urls import reverse
 from django.http import JsonResponse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Sum, Count, Q
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError
+from django.db.models import F
 from django.core.paginator import Paginator
-from .models import CreditClient, Paiement
-from fournisseurs.models import Produit
-from stocks.models import StockActuel
+from core.pagination import paginer_par_curseur
+from core.sequences import enregistrer_numerote
+from .models import CreditClient, EncoursClient, Paiement, RecouvrementMensuel
+from .services import (
+    TRANCHES_ANCIENNETE, balance_agee_en_cache, repartir_versement, serie_recouvrement, verifier_limite_credit,
+)
+from . import exports
+from core.exports import reponse_export
+from core.filtres import identifiant
+from stocks.services import StockInsuffisant, produits_magasin
+from core.agregats import calculer_totaux, somme
+from core import referentiel
+import json
 
 
 @login_required
@@ -23,26 +38,25 @@ def credit_list(request):
     elif statut == 'impaye':
         credits = credits.filter(solde_restant__gt=0)
     
-    client_id = request.GET.get('client')
+    client_id = identifiant(request.GET, 'client')
     if client_id:
         credits = credits.filter(client_id=client_id)
     
     # Pagination
-    paginator = Paginator(credits, 15)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = paginer_par_curseur(request, credits, 15)
     
     # Statistiques
-    total_credits = credits.aggregate(Sum('montant_total'))['montant_total__sum'] or 0
-    total_paye = credits.aggregate(Sum('montant_paye'))['montant_paye__sum'] or 0
-    total_impaye = credits.aggregate(Sum('solde_restant'))['solde_restant__sum'] or 0
+    totaux = calculer_totaux(
+        credits,
+        total_credits=somme('montant_total'),
+        total_paye=somme('montant_paye'),
+        total_impaye=somme('solde_restant'),
+    )
     
     context = {
         'title': 'Crédits Clients',
         'page_obj': page_obj,
-        'total_credits': total_credits,
-        'total_paye': total_paye,
-        'total_impaye': total_impaye,
+        **totaux,
         'filters': {
             'statut': statut,
             'client': client_id,
@@ -54,48 +68,7 @@ def credit_list(request):
 @login_required
 def credit_export_excel(request):
     """Exporter la liste des crédits clients (avec filtres) en Excel"""
-    credits = CreditClient.objects.select_related('client', 'magasin', 'produit').all()
-
-    # Filtres
-    statut = request.GET.get('statut')
-    if statut == 'solde':
-        credits = credits.filter(solde_restant__lte=0)
-    elif statut == 'impaye':
-        credits = credits.filter(solde_restant__gt=0)
-
-    client_id = request.GET.get('client')
-    if client_id:
-        credits = credits.filter(client_id=client_id)
-
-    from openpyxl import Workbook
-    wb = Workbook()
-    ws = wb.active
-    ws.title = 'Crédits'
-    ws.append([
-        'N° Crédit', 'Date', 'Client', 'Magasin', 'Produit', 'Quantité', 'Prix unitaire',
-        'Montant total', 'Montant payé', 'Solde restant', 'Observations'
-    ])
-
-    for c in credits.order_by('-date'):
-        ws.append([
-            c.numero,
-            c.date.strftime('%d/%m/%Y') if c.date else '',
-            str(c.client) if c.client else '',
-            c.magasin.nom if c.magasin else '',
-            c.produit.nom if c.produit else '',
-            int(c.quantite) if c.quantite is not None else 0,
-            int(c.prix_unitaire) if c.prix_unitaire is not None else 0,
-            int(c.montant_total) if c.montant_total is not None else 0,
-            int(c.montant_paye) if c.montant_paye is not None else 0,
-            int(c.solde_restant) if c.solde_restant is not None else 0,
-            c.observations or '',
-        ])
-
-    from django.http import HttpResponse
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = 'attachment; filename="credits.xlsx"'
-    wb.save(response)
-    return response
+    return reponse_export(request, exports.CREDITS)
 
 @login_required
 def credit_create(request):
@@ -107,9 +80,23 @@ def credit_create(request):
     if request.method == 'POST':
         form = CreditClientForm(request.POST)
         if form.is_valid():
-            form.save()
-            messages.success(request, 'Crédit enregistré avec succès!')
-            return redirect('credits:credit_list')
+            def enregistrer(numero):
+                # Limite revérifiée sous verrou de l'encours, dans la transaction du crédit
+                verifier_limite_credit(form.instance.client, form.instance.quantite * form.instance.prix_unitaire)
+                form.instance.numero = numero
+                return form.save()
+
+            try:
+                enregistrer_numerote('CRD', enregistrer, form.cleaned_data['numero'])
+            except ValidationError as e:
+                form.add_error('client', e)
+            except StockInsuffisant as e:
+                form.add_error('quantite', str(e))
+            except IntegrityError:
+                form.add_error('numero', f"Le numéro {form.cleaned_data['numero']} existe déjà.")
+            else:
+                messages.success(request, 'Crédit enregistré avec succès!')
+                return redirect('credits:credit_list')
     else:
         form = CreditClientForm()
     
@@ -164,6 +151,119 @@ def paiement_create(request, credit_pk):
     return render(request, 'credits/paiement_form.html', context)
 
 
+@login_required
+def versement_client(request):
+    """
+    Enregistrer un versement global d'un client, réparti sur ses crédits
+    ouverts du plus ancien au plus récent. Accepte un formulaire ou un corps
+    JSON {client, montant, date_paiement, mode_paiement, reference, observations}.
+    """
+    from .forms import VersementClientForm
+
+    en_json = request.method == 'POST' and request.content_type == 'application/json'
+    if request.method == 'POST':
+        try:
+            donnees = json.loads(request.body) if en_json else request.POST
+        except ValueError:
+            return JsonResponse({'erreurs': ["Données du versement invalides."]}, status=400)
+        form = VersementClientForm(donnees)
+        if form.is_valid():
+            d = form.cleaned_data
+            try:
+                paiements = repartir_versement(
+                    d['client'].pk, d['montant'], d['date_paiement'], d['mode_paiement'],
+                    d.get('reference'), d.get('observations'),
+                )
+            except ValidationError as e:
+                form.add_error('montant', e)
+            else:
+                if en_json:
+                    return JsonResponse({
+                        'paiements': [{'id': p.pk, 'credit': p.credit_id, 'montant': str(p.montant)} for p in paiements],
+                    }, status=201)
+                messages.success(request, f"Versement de {d['montant']:.0f} GNF réparti sur {len(paiements)} crédit(s).")
+                return redirect(f"{reverse('credits:credit_list')}?client={d['client'].pk}")
+        if en_json:
+            return JsonResponse({'erreurs': [m for erreurs in form.errors.values() for m in erreurs]}, status=400)
+    else:
+        form = VersementClientForm(initial={'client': request.GET.get('client')})
+
+    context = {
+        'title': 'Versement client',
+        'form': form,
+    }
+    return render(request, 'credits/versement_form.html', context)
+
+
+@login_required
+def balance_agee(request):
+    """
+    Balance âgée des crédits : encours par client et par magasin répartis
+    par ancienneté (0-30, 31-60, 61-90, +90 jours)
+    """
+    date_reference = exports.date_reference(request.GET)
+    magasin_id = identifiant(request.GET, 'magasin')
+    client_id = identifiant(request.GET, 'client')
+    balance = balance_agee_en_cache(date_reference, magasin_id, client_id)
+
+    paginator = Paginator(balance['lignes'], 50)
+    page_obj = paginator.get_page(request.GET.get('page'))
+    for ligne in page_obj:
+        ligne['montants'] = [ligne[cle] or 0 for cle, *_ in TRANCHES_ANCIENNETE]
+
+    parametres = request.GET.copy()
+    parametres.pop('page', None)
+    context = {
+        'title': 'Balance âgée des crédits',
+        'page_obj': page_obj,
+        'tranches': [libelle for _, libelle, *_ in TRANCHES_ANCIENNETE],
+        'totaux': [balance['totaux'][cle] for cle, *_ in TRANCHES_ANCIENNETE],
+        'total': balance['totaux']['total'],
+        'date_reference': date_reference,
+        'filters': {'magasin': magasin_id or '', 'client': client_id or ''},
+        'parametres': parametres.urlencode(),
+        **referentiel.formulaire('magasins'),
+    }
+    return render(request, 'credits/balance_agee.html', context)
+
+
+@login_required
+def balance_agee_export(request):
+    """Exporter la balance âgée (avec filtres) en Excel"""
+    return reponse_export(request, exports.BALANCE_AGEE)
+
+
+@login_required
+def recouvrement_mensuel(request):
+    """
+    Évolution mensuelle du recouvrement (crédits accordés, encaissements,
+    solde restant) : graphique, ou série JSON avec format=json
+    """
+    magasin_id = identifiant(request.GET, 'magasin')
+    try:
+        nb_mois = min(max(int(request.GET.get('mois') or 12), 1), 120)
+    except ValueError:
+        nb_mois = 12
+    serie = serie_recouvrement(nb_mois, exports.date_reference(request.GET), magasin_id)
+    if request.GET.get('format') == 'json':
+        return JsonResponse(serie)
+
+    lignes = [
+        {'mois': m, 'nb_credits': nb, 'credits': c, 'encaisse': e, 'solde': s, 'taux': t}
+        for m, nb, c, e, s, t in zip(serie['mois'], serie['nb_credits'], serie['credits'],
+                                     serie['encaisse'], serie['solde'], serie['taux_recouvrement'])
+    ]
+    context = {
+        'title': 'Recouvrement mensuel',
+        'serie': serie,
+        'lignes': reversed(lignes),
+        'nb_mois': nb_mois,
+        'filters': {'magasin': magasin_id or '', 'date': request.GET.get('date', '')},
+        **referentiel.formulaire('magasins'),
+    }
+    return render(request, 'credits/recouvrement_mensuel.html', context)
+
+
 @login_required
 def statistiques_credits(request):
     """
@@ -171,20 +271,23 @@ def statistiques_credits(request):
     """
     from django.db.models import Avg
     
-    # Statistiques générales
-    total_credits = CreditClient.objects.aggregate(Sum('montant_total'))['montant_total__sum'] or 0
-    total_paye = CreditClient.objects.aggregate(Sum('montant_paye'))['montant_paye__sum'] or 0
-    total_impaye = CreditClient.objects.aggregate(Sum('solde_restant'))['solde_restant__sum'] or 0
+    # Statistiques générales, lues dans le recouvrement mensuel
+    totaux = calculer_totaux(
+        RecouvrementMensuel.objects.all(),
+        total_credits=somme('montant_credits'),
+        total_impaye=somme('solde_restant'),
+    )
+    total_credits = totaux['total_credits']
+    total_impaye = totaux['total_impaye']
+    total_paye = total_credits - total_impaye
     
     taux_recouvrement_global = (total_paye / total_credits * 100) if total_credits > 0 else 0
     
     # Clients débiteurs
-    clients_debiteurs = CreditClient.objects.filter(solde_restant__gt=0).values(
-        'client__nom', 'client__prenom'
-    ).annotate(
-        total_du=Sum('solde_restant'),
-        nb_credits=Count('id')
-    ).order_by('-total_du')
+    # Débiteurs lus dans la table des encours, sans regrouper les crédits
+    clients_debiteurs = EncoursClient.objects.filter(encours__gt=0).order_by('-encours').values(
+        'client__nom', 'client__prenom', total_du=F('encours'), nb_credits=F('nb_credits_ouverts')
+    )
     
     context = {
         'title': 'Statistiques Crédits',
@@ -198,8 +301,15 @@ def statistiques_credits(request):
 
 
 @login_required
+@cache_control(private=True, no_cache=True)
+@condition(
+    etag_func=lambda request, magasin_id: produits_magasin(magasin_id)['etag'],
+    last_modified_func=lambda request, magasin_id: produits_magasin(magasin_id)['modifie'],
+)
 def produits_par_magasin(request, magasin_id):
-    """Retourne la liste des produits disponibles pour un magasin (JSON)"""
-    produit_ids = StockActuel.objects.filter(magasin_id=magasin_id).values_list('produit_id', flat=True)
-    produits = Produit.objects.filter(id__in=produit_ids).order_by('nom').values('id', 'nom', 'prix_vente_conseille')
-    return JsonResponse({'produits': list(produits)})
+    """
+    Retourne la liste des produits disponibles pour un magasin (JSON).
+    La liste vient du cache ; le navigateur la revalide à chaque appel
+    (ETag / Last-Modified) et reçoit une réponse 304 vide si elle n'a pas changé.
+    """
+    return JsonResponse({'produits': produits_magasin(magasin_id)['produits']})
@@ -20,16 +20,16 @@ class ProduitAdmin(admin.ModelAdmin):
 
 @admin.register(Livraison)
 class LivraisonAdmin(admin.ModelAdmin):
-    list_display = ['numero_enregistrement', 'date', 'fournisseur', 'produit', 
+    list_display = ['numero_enregistrement', 'date', 'fournisseur', 'produit', 'magasin',
                    'quantite_livree', 'prix_achat_unitaire', 'montant_total_achat']
-    list_filter = ['date', 'fournisseur', 'produit']
+    list_filter = ['date', 'fournisseur', 'produit', 'magasin']
     search_fields = ['numero_enregistrement', 'fournisseur__nom', 'produit__nom']
     ordering = ['-date']
     readonly_fields = ['montant_total_achat', 'date_creation', 'date_modification']
     
     fieldsets = (
         ('Informations générales', {
-            'fields': ('numero_enregistrement', 'date', 'fournisseur', 'produit')
+            'fields': ('numero_enregistrement', 'date', 'fournisseur', 'produit', 'magasin')
         }),
         ('Détails de la livraison', {
             'fields': ('quantite_livree', 'prix_achat_unitaire', 'montant_total_achat')
@@ -5,3 +5,6 @@ class FournisseursConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'fournisseurs'
     verbose_name = 'Gestion des Fournisseurs'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,8 @@
+from core.autocompletion import IndexAutocompletion
+
+
+def libelle_produit(nom, unite_mesure):
+    return f"{nom} ({unite_mesure})" if unite_mesure else nom
+
+
+PRODUITS = IndexAutocompletion('produits', 'fournisseurs.Produit', ('nom', 'unite_mesure'), libelle_produit)
@@ -0,0 +1,67 @@
+from core import recherche
+from core.exports import Colonne, DefinitionExport, date_fr, entier, nombre
+from core.filtres import identifiant
+from .models import Fournisseur, Livraison, Produit
+
+
+def filtrer_livraisons(params):
+    """Livraisons filtrées par fournisseur et période"""
+    livraisons = Livraison.objects.order_by('-date')
+    fournisseur_id = identifiant(params, 'fournisseur')
+    if fournisseur_id:
+        livraisons = livraisons.filter(fournisseur_id=fournisseur_id)
+    date_debut = params.get('date_debut')
+    date_fin = params.get('date_fin')
+    if date_debut:
+        livraisons = livraisons.filter(date__gte=date_debut)
+    if date_fin:
+        livraisons = livraisons.filter(date__lte=date_fin)
+    return livraisons
+
+
+def filtrer_fournisseurs(params):
+    """Fournisseurs filtrés par recherche sur le nom, le téléphone ou l'email"""
+    fournisseurs = Fournisseur.objects.order_by('nom')
+    search = params.get('search')
+    if search:
+        fournisseurs = recherche.rechercher(fournisseurs, 'fournisseurs', search)
+    return fournisseurs
+
+
+def filtrer_produits(params):
+    """Produits filtrés par recherche sur le nom, l'unité ou la description"""
+    produits = Produit.objects.order_by('nom')
+    search = (params.get('search') or '').strip()
+    if search:
+        produits = recherche.rechercher(produits, 'produits', search)
+    return produits
+
+
+LIVRAISONS = DefinitionExport('livraisons', 'Livraisons', [
+    Colonne('N° Enregistrement', 'numero_enregistrement'),
+    Colonne('Date', 'date', formater=date_fr),
+    Colonne('Fournisseur', 'fournisseur__nom'),
+    Colonne('Produit', 'produit__nom'),
+    Colonne('Magasin', 'magasin__nom'),
+    Colonne('Quantité livrée', 'quantite_livree', formater=nombre),
+    Colonne('Unité', 'produit__unite_mesure'),
+    Colonne("Prix d'achat unitaire", 'prix_achat_unitaire', formater=entier),
+    Colonne('Montant total achat', 'montant_total_achat', formater=entier),
+    Colonne('Observations', 'observations'),
+], filtrer_livraisons)
+
+FOURNISSEURS = DefinitionExport('fournisseurs', 'Fournisseurs', [
+    Colonne('Nom', 'nom'),
+    Colonne('Téléphone', 'telephone'),
+    Colonne('Email', 'email'),
+    Colonne('Adresse', 'adresse'),
+    Colonne("Date d'enregistrement", 'date_creation', formater=date_fr),
+], filtrer_fournisseurs)
+
+PRODUITS = DefinitionExport('produits', 'Produits', [
+    Colonne('Nom', 'nom'),
+    Colonne('Unité', 'unite_mesure'),
+    Colonne('Prix conseillé', 'prix_vente_conseille', formater=entier),
+    Colonne('Description', 'description'),
+    Colonne("Date d'enregistrement", 'date_creation', formater=date_fr),
+], filtrer_produits)
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-17 14:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fournisseurs', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='livraison',
+            index=models.Index(fields=['date', 'date_creation', 'id'], name='livraison_pagination_idx'),
+        ),
+    ]
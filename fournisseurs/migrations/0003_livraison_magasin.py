@@ -0,0 +1,20 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventes', '0005_client_limite_credit'),
+        ('fournisseurs', '0002_index_pagination'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='livraison',
+            name='magasin',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE,
+                                    related_name='livraisons', to='ventes.magasin',
+                                    verbose_name='Magasin de réception'),
+        ),
+    ]
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.core.validators import MinValueValidator
 from decimal import Decimal
 
@@ -56,6 +56,10 @@ class Livraison(models.Model):
                                    verbose_name="Fournisseur")
     produit = models.ForeignKey(Produit, on_delete=models.CASCADE, 
                                verbose_name="Produit livré")
+    # Les livraisons antérieures au suivi du stock par livraison n'ont pas
+    # de magasin et ne sont pas reportées sur le stock
+    magasin = models.ForeignKey('ventes.Magasin', on_delete=models.CASCADE, null=True, blank=True,
+                                related_name='livraisons', verbose_name="Magasin de réception")
     quantite_livree = models.DecimalField(max_digits=10, decimal_places=2, 
                                         verbose_name="Quantité livrée",
                                         validators=[MinValueValidator(Decimal('0.01'))])
@@ -75,13 +79,47 @@ class Livraison(models.Model):
         verbose_name = "Livraison"
         verbose_name_plural = "Livraisons"
         ordering = ['-date', '-date_creation']
+        indexes = [
+            # Pagination par clé sur (date, date_creation, id)
+            models.Index(fields=['date', 'date_creation', 'id'], name='livraison_pagination_idx'),
+        ]
     
     def save(self, *args, **kwargs):
         """
-        Calcul automatique du montant total d'achat
+        Calcul automatique du montant total d'achat et entrée en stock du
+        magasin de réception au prix d'achat (prix moyen pondéré), dans la
+        même transaction. Une modification qui ne touche ni le magasin, ni
+        le produit, ni la quantité, ni la date, ni le prix d'achat ne fait
+        aucun mouvement de stock. Sinon la nouvelle livraison est entrée
+        puis l'ancienne retirée à son propre prix d'achat
+        (StockInsuffisant si le stock restant ne le permet pas).
         """
+        from stocks.services import annuler_entree, entrer_stock
+
         self.montant_total_achat = self.quantite_livree * self.prix_achat_unitaire
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            precedente = None
+            if self.pk:
+                precedente = Livraison.objects.filter(pk=self.pk).only(*CHAMPS_STOCK).first()
+            stock_modifie = precedente is None or (
+                (precedente.magasin_id, precedente.produit_id, precedente.quantite_livree,
+                 precedente.date, precedente.prix_achat_unitaire)
+                != (self.magasin_id, self.produit_id, self.quantite_livree, self.date, self.prix_achat_unitaire)
+            )
+            super().save(*args, **kwargs)
+            # Entrée avant le retrait : une livraison dont une partie est
+            # vendue peut être corrigée tant que le stock final est positif
+            if stock_modifie and self.magasin_id:
+                entrer_stock(self.magasin_id, self.produit_id, self.quantite_livree, self.prix_achat_unitaire,
+                             'livraison', self.numero_enregistrement, self.date)
+            if stock_modifie and precedente is not None and precedente.magasin_id:
+                annuler_entree(precedente.magasin_id, precedente.produit_id, precedente.quantite_livree,
+                               precedente.prix_achat_unitaire, 'livraison', self.numero_enregistrement,
+                               precedente.date)
     
     def __str__(self):
         return f"{self.numero_enregistrement} - {self.fournisseur.nom} - {self.date}"
+
+
+# Champs de Livraison dont dépend le stock
+CHAMPS_STOCK = ('date', 'magasin', 'produit', 'quantite_livree', 'prix_achat_unitaire')
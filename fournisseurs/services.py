@@ -0,0 +1,42 @@
+"""
+Services du module fournisseurs : enregistrement des livraisons et entrée
+en stock.
+
+Une livraison reçue dans un magasin entre en stock au prix d'achat : le
+prix moyen d'achat pondéré et la valeur du stock sont recalculés en base
+(stocks.services.entrer_stock), de sorte que StockActuel.valeur_stock est
+toujours à jour. Une livraison de plusieurs lignes passe par
+enregistrer_livraisons : une insertion des livraisons, une requête UPDATE
+par (magasin, produit) et une insertion au journal de stock.
+"""
+from django.db import transaction
+
+from core.sequences import avancer_sequence, formater, reserver_bloc
+from stocks.services import entrer_stock_groupe
+from .models import Livraison
+
+
+def enregistrer_livraisons(livraisons):
+    """
+    Enregistre des livraisons (Livraison non enregistrées) et les entre en
+    stock dans une transaction. Les numéros manquants sont réservés en un
+    bloc. Retourne les livraisons enregistrées.
+    """
+    livraisons = list(livraisons)
+    sans_numero = [livraison for livraison in livraisons if not livraison.numero_enregistrement]
+    with transaction.atomic():
+        # Numéros saisis : la séquence LIV passe au-delà avant la réservation
+        avancer_sequence(*(livraison.numero_enregistrement for livraison in livraisons))
+        if sans_numero:
+            debut, _ = reserver_bloc('LIV', len(sans_numero))
+            for valeur, livraison in enumerate(sans_numero, start=debut):
+                livraison.numero_enregistrement = formater('LIV', valeur)
+        for livraison in livraisons:
+            livraison.montant_total_achat = livraison.quantite_livree * livraison.prix_achat_unitaire
+        Livraison.objects.bulk_create(livraisons)
+        entrer_stock_groupe(
+            (livraison.magasin_id, livraison.produit_id, livraison.quantite_livree,
+             livraison.prix_achat_unitaire, livraison.numero_enregistrement, livraison.date)
+            for livraison in livraisons if livraison.magasin_id
+        )
+    return livraisons
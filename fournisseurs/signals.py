@@ -0,0 +1,21 @@
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from .models import Livraison
+from stocks.services import annuler_entree
+
+
+@receiver(post_delete, sender=Livraison)
+def sortir_livraison_du_stock(sender, instance, **kwargs):
+    """
+    Retire du stock, à son prix d'achat, une livraison supprimée
+    directement (StockInsuffisant si elle a déjà été vendue, la suppression
+    est alors annulée). Supprimée avec son fournisseur, la marchandise
+    reçue reste en stock ; avec son magasin ou son produit, la ligne de
+    stock disparaît aussi.
+    """
+    origin = kwargs.get('origin')
+    if not isinstance(origin, Livraison) and getattr(origin, 'model', None) is not Livraison:
+        return
+    if instance.magasin_id:
+        annuler_entree(instance.magasin_id, instance.produit_id, instance.quantite_livree,
+                       instance.prix_achat_unitaire, 'livraison', instance.numero_enregistrement, instance.date)
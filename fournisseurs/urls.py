@@ -10,6 +10,7 @@ urlpatterns = [
     path('<int:pk>/modifier/', views.fournisseur_edit, name='fournisseur_edit'),
     path('export/fournisseurs/', views.fournisseur_export_excel, name='fournisseur_export'),
     path('export/produits/', views.produit_export_excel, name='produit_export'),
+    path('produits/autocompletion/', views.produit_autocompletion, name='produit_autocompletion'),
     
     # Livraisons
     path('livraisons/', views.livraison_list, name='livraison_list'),
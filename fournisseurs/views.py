@@ -1,11 +1,35 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Sum, Count, Q
+from django.db import transaction
+from django.db.models import Sum, Count
 from django.core.paginator import Paginator
-from django.http import HttpResponse
+from core.agregats import calculer_totaux, somme
+from core.pagination import paginer_par_curseur
+from core.sequences import enregistrer_numerote
+from core import referentiel, recherche
+from django.http import JsonResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from decimal import Decimal, InvalidOperation
 from .models import Fournisseur, Produit, Livraison
+from . import exports
+from core.exports import reponse_export
+from core.filtres import identifiant
 from .forms import FournisseurForm, ProduitForm, LivraisonForm
+from .services import enregistrer_livraisons
+from .autocompletion import PRODUITS
+
+
+def _positif(valeur, libelle):
+    """Convertit une saisie en Decimal strictement positif, sinon lève ValueError"""
+    try:
+        nombre = Decimal(str(valeur).strip())
+    except InvalidOperation:
+        nombre = None
+    if nombre is None or not nombre.is_finite() or nombre <= 0:
+        raise ValueError(f"{libelle} doit être un nombre positif.")
+    return nombre
 
 
 @login_required
@@ -18,11 +42,7 @@ def fournisseur_list(request):
     # Recherche
     search = request.GET.get('search')
     if search:
-        fournisseurs = fournisseurs.filter(
-            Q(nom__icontains=search) | 
-            Q(telephone__icontains=search) |
-            Q(email__icontains=search)
-        )
+        fournisseurs = recherche.rechercher(fournisseurs, 'fournisseurs', search)
     
     # Pagination
     paginator = Paginator(fournisseurs, 10)
@@ -56,44 +76,48 @@ def fournisseur_create(request):
                 messages.error(request, 'Le nom du fournisseur est obligatoire.')
                 return render(request, 'fournisseurs/fournisseur_form.html', {
                     'title': 'Nouveau Fournisseur',
-                    'produits': Produit.objects.all(),
+                    **referentiel.formulaire('produits', 'magasins'),
                 })
             
-            # Créer le fournisseur
-            fournisseur = Fournisseur.objects.create(
-                nom=nom,
-                telephone=telephone or '',
-                email=email or '',
-                adresse=adresse or ''
-            )
+            # Fournisseur et livraisons dans une transaction : rien n'est gardé en cas d'erreur
+            with transaction.atomic():
+                # Créer le fournisseur
+                fournisseur = Fournisseur.objects.create(
+                    nom=nom,
+                    telephone=telephone or '',
+                    email=email or '',
+                    adresse=adresse or ''
+                )
             
-            # Traiter les produits fournis
-            produits_count = 0
-            for key, value in request.POST.items():
-                if key.startswith('produits[') and key.endswith(']'):
-                    try:
-                        produit_data = json.loads(value)
+                # Traiter les produits fournis : une livraison par produit,
+                # reçue dans le magasin choisi et entrée en stock en une fois
+                magasin_id = request.POST.get('magasin') or None
+                livraisons = []
+                for key, value in request.POST.items():
+                    if key.startswith('produits[') and key.endswith(']'):
+                        try:
+                            produit_data = json.loads(value)
                         
-                        # Récupérer le produit
-                        produit = get_object_or_404(Produit, id=produit_data['id'])
+                            # Récupérer le produit
+                            produit = get_object_or_404(Produit, id=produit_data['id'])
                         
-                        # Créer une livraison pour ce produit
-                        numero_livraison = f"LIV-{fournisseur.id}-{produits_count + 1:03d}"
+                            # Préparer une livraison pour ce produit
+                            livraisons.append(Livraison(
+                                date=timezone.localdate(),
+                                fournisseur=fournisseur,
+                                produit=produit,
+                                magasin_id=magasin_id,
+                                quantite_livree=_positif(produit_data['quantite'], 'La quantité'),
+                                prix_achat_unitaire=_positif(produit_data['prix_unitaire'], 'Le prix unitaire'),
+                                observations=produit_data.get('observations', '')
+                            ))
                         
-                        Livraison.objects.create(
-                            numero_enregistrement=numero_livraison,
-                            date='2025-08-15',  # Date du jour
-                            fournisseur=fournisseur,
-                            produit=produit,
-                            quantite_livree=float(produit_data['quantite']),
-                            prix_achat_unitaire=float(produit_data['prix_unitaire']),
-                            observations=produit_data.get('observations', '')
-                        )
-                        produits_count += 1
-                        
-                    except (json.JSONDecodeError, KeyError, ValueError) as e:
-                        messages.warning(request, f'Erreur lors du traitement d\'un produit: {str(e)}')
-                        continue
+                        except (json.JSONDecodeError, KeyError, ValueError, InvalidOperation) as e:
+                            messages.warning(request, f'Erreur lors du traitement d\'un produit: {str(e)}')
+                            continue
+            
+                enregistrer_livraisons(livraisons)
+            produits_count = len(livraisons)
             
             if produits_count > 0:
                 messages.success(request, f'Fournisseur "{nom}" créé avec succès avec {produits_count} produit(s) fourni(s)!')
@@ -107,7 +131,7 @@ def fournisseur_create(request):
     
     context = {
         'title': 'Nouveau Fournisseur',
-        'produits': Produit.objects.all(),
+        **referentiel.formulaire('produits', 'magasins'),
     }
     return render(request, 'fournisseurs/fournisseur_form.html', context)
 
@@ -141,10 +165,10 @@ def livraison_list(request):
     """
     Liste des livraisons avec filtres
     """
-    livraisons = Livraison.objects.select_related('fournisseur', 'produit').all()
+    livraisons = Livraison.objects.select_related('fournisseur', 'produit', 'magasin').all()
     
     # Filtres
-    fournisseur_id = request.GET.get('fournisseur')
+    fournisseur_id = identifiant(request.GET, 'fournisseur')
     if fournisseur_id:
         livraisons = livraisons.filter(fournisseur_id=fournisseur_id)
     
@@ -156,18 +180,20 @@ def livraison_list(request):
         livraisons = livraisons.filter(date__lte=date_fin)
     
     # Pagination
-    paginator = Paginator(livraisons, 15)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = paginer_par_curseur(request, livraisons, 15)
     
     # Statistiques
-    total_achats = livraisons.aggregate(Sum('montant_total_achat'))['montant_total_achat__sum'] or 0
+    totaux = calculer_totaux(
+        livraisons,
+        total_achats=somme('montant_total_achat'),
+        nb_livraisons=Count('id'),
+    )
     
     context = {
         'title': 'Historique des Livraisons',
         'page_obj': page_obj,
-        'fournisseurs': Fournisseur.objects.all(),
-        'total_achats': total_achats,
+        'fournisseurs': referentiel.liste('fournisseurs'),
+        **totaux,
         'filters': {
             'fournisseur': fournisseur_id,
             'date_debut': date_debut,
@@ -180,49 +206,7 @@ def livraison_list(request):
 @login_required
 def livraison_export_excel(request):
     """Exporter la liste des livraisons en Excel (en respectant les filtres)"""
-    livraisons = Livraison.objects.select_related('fournisseur', 'produit').all()
-
-    # Filtres
-    fournisseur_id = request.GET.get('fournisseur')
-    if fournisseur_id:
-        livraisons = livraisons.filter(fournisseur_id=fournisseur_id)
-
-    date_debut = request.GET.get('date_debut')
-    date_fin = request.GET.get('date_fin')
-    if date_debut:
-        livraisons = livraisons.filter(date__gte=date_debut)
-    if date_fin:
-        livraisons = livraisons.filter(date__lte=date_fin)
-
-    from openpyxl import Workbook
-    wb = Workbook()
-    ws = wb.active
-    ws.title = 'Livraisons'
-    ws.append([
-        'N° Enregistrement', 'Date', 'Fournisseur', 'Produit',
-        'Quantité livrée', "Unité", "Prix d'achat unitaire", 'Montant total achat',
-        'Observations'
-    ])
-
-    for l in livraisons.order_by('-date'):
-        prix_unit = float(l.prix_achat_unitaire) if l.prix_achat_unitaire is not None else 0
-        montant_total = float(l.montant_total_achat) if l.montant_total_achat is not None else 0
-        ws.append([
-            l.numero_enregistrement,
-            l.date.strftime('%d/%m/%Y') if l.date else '',
-            l.fournisseur.nom if l.fournisseur else '',
-            l.produit.nom if l.produit else '',
-            float(l.quantite_livree) if l.quantite_livree is not None else 0,
-            getattr(l.produit, 'unite_mesure', '') or '',
-            int(round(prix_unit)),
-            int(round(montant_total)),
-            l.observations or '',
-        ])
-
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = 'attachment; filename="livraisons.xlsx"'
-    wb.save(response)
-    return response
+    return reponse_export(request, exports.LIVRAISONS)
 
 
 @login_required
@@ -232,13 +216,14 @@ def livraison_create(request):
     """
     if request.method == 'POST':
         try:
-            # Récupérer les données du formulaire
-            numero_enregistrement = request.POST.get('numero_enregistrement')
-            date = request.POST.get('date')
+            # Récupérer les données du formulaire (numéro attribué à l'enregistrement si laissé vide)
+            numero_enregistrement = (request.POST.get('numero_enregistrement') or '').strip()
+            date = parse_date(request.POST.get('date') or '') or timezone.localdate()
             fournisseur_id = request.POST.get('fournisseur')
             produit_id = request.POST.get('produit')
-            quantite_livree = request.POST.get('quantite_livree')
-            prix_achat_unitaire = request.POST.get('prix_achat_unitaire')
+            magasin_id = request.POST.get('magasin')
+            quantite_livree = _positif(request.POST.get('quantite_livree'), 'La quantité livrée')
+            prix_achat_unitaire = _positif(request.POST.get('prix_achat_unitaire'), "Le prix d'achat unitaire")
             observations = request.POST.get('observations')
             
             # Gérer les nouvelles entrées créées dynamiquement
@@ -266,18 +251,19 @@ def livraison_create(request):
             else:
                 produit = get_object_or_404(Produit, id=produit_id) if produit_id else None
             
-            # Créer la livraison
-            if fournisseur and produit:
-                livraison = Livraison.objects.create(
-                    numero_enregistrement=numero_enregistrement,
+            # Créer la livraison et l'entrer en stock dans le magasin de réception
+            if fournisseur and produit and magasin_id:
+                livraison = enregistrer_numerote('LIV', lambda numero: Livraison.objects.create(
+                    numero_enregistrement=numero,
                     date=date,
                     fournisseur=fournisseur,
                     produit=produit,
-                    quantite_livree=float(quantite_livree),
-                    prix_achat_unitaire=float(prix_achat_unitaire),
+                    magasin_id=magasin_id,
+                    quantite_livree=quantite_livree,
+                    prix_achat_unitaire=prix_achat_unitaire,
                     observations=observations
-                )
-                messages.success(request, f'Livraison {numero_enregistrement} enregistrée avec succès!')
+                ), numero_enregistrement)
+                messages.success(request, f'Livraison {livraison.numero_enregistrement} enregistrée avec succès!')
                 return redirect('fournisseurs:livraison_list')
             else:
                 messages.error(request, 'Erreur: Tous les champs obligatoires doivent être remplis.')
@@ -288,9 +274,8 @@ def livraison_create(request):
     # Préparer les données pour le template
     context = {
         'title': 'Nouvelle Livraison',
-        'fournisseurs': Fournisseur.objects.all(),
-        'produits': Produit.objects.all(),
-        'today': '2025-08-15',  # Date du jour
+        **referentiel.formulaire('fournisseurs', 'produits', 'magasins'),
+        'today': timezone.localdate().isoformat(),
     }
     return render(request, 'fournisseurs/livraison_form.html', context)
 
@@ -330,59 +315,19 @@ def statistiques_fournisseurs(request):
 @login_required
 def fournisseur_export_excel(request):
     """Exporter la liste des fournisseurs (avec recherche) en Excel"""
-    qs = Fournisseur.objects.all().order_by('nom')
-    search = request.GET.get('search')
-    if search:
-        qs = qs.filter(
-            Q(nom__icontains=search) |
-            Q(telephone__icontains=search) |
-            Q(email__icontains=search)
-        )
-
-    from openpyxl import Workbook
-    wb = Workbook()
-    ws = wb.active
-    ws.title = 'Fournisseurs'
-    ws.append(['Nom', 'Téléphone', 'Email', 'Adresse', "Date d'enregistrement"]) 
-    for f in qs:
-        ws.append([
-            f.nom,
-            f.telephone or '',
-            f.email or '',
-            f.adresse or '',
-            f.date_creation.strftime('%d/%m/%Y') if f.date_creation else '',
-        ])
-
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = 'attachment; filename="fournisseurs.xlsx"'
-    wb.save(response)
-    return response
+    return reponse_export(request, exports.FOURNISSEURS)
 
 
 @login_required
 def produit_export_excel(request):
     """Exporter la liste des produits en Excel (avec recherche basique)"""
-    produits = Produit.objects.all().order_by('nom')
-    search = request.GET.get('search', '').strip()
-    if search:
-        produits = produits.filter(Q(nom__icontains=search) | Q(unite_mesure__icontains=search))
+    return reponse_export(request, exports.PRODUITS)
 
-    from openpyxl import Workbook
-    wb = Workbook()
-    ws = wb.active
-    ws.title = 'Produits'
-    ws.append(['Nom', 'Unité', 'Prix conseillé', 'Description', "Date d'enregistrement"]) 
-    for p in produits:
-        prix_conseille = float(p.prix_vente_conseille) if p.prix_vente_conseille is not None else 0
-        ws.append([
-            p.nom,
-            p.unite_mesure,
-            int(round(prix_conseille)),
-            p.description or '',
-            p.date_creation.strftime('%d/%m/%Y') if p.date_creation else '',
-        ])
 
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = 'attachment; filename="produits.xlsx"'
-    wb.save(response)
-    return response
+@login_required
+def produit_autocompletion(request):
+    """
+    Suggestions de produits (JSON) pour les champs de recherche des formulaires
+    """
+    resultats = PRODUITS.rechercher(request.GET.get('q', ''))
+    return JsonResponse({'resultats': [{'id': pk, 'texte': texte} for pk, texte in resultats]})
@@ -0,0 +1,34 @@
+from core import recherche
+from core.exports import Colonne, DefinitionExport, date_fr, nombre, oui_non
+from .models import Employe
+
+
+def filtrer_employes(params):
+    """Employés filtrés par statut (actifs / inactifs / all) et recherche texte"""
+    qs = Employe.objects.order_by('nom', 'prenoms')
+
+    status = params.get('status', 'actifs')
+    if status == 'actifs':
+        qs = qs.filter(actif=True)
+    elif status == 'inactifs':
+        qs = qs.filter(actif=False)
+
+    q = (params.get('q') or '').strip()
+    if q:
+        qs = recherche.rechercher(qs, 'employes', q)
+    return qs
+
+
+EMPLOYES = DefinitionExport('employes', 'Employés', [
+    Colonne('N° Employé', 'numero'),
+    Colonne('Matricule', 'matricule'),
+    Colonne('Nom', 'nom'),
+    Colonne('Prénoms', 'prenoms'),
+    Colonne('Fonction', 'fonction'),
+    Colonne("Date d'embauche", 'date_embauche', formater=date_fr),
+    Colonne('Salaire de base', 'salaire_base', formater=nombre),
+    Colonne('Prime performance', 'prime_performance', formater=nombre),
+    Colonne('Actif', 'actif', formater=oui_non),
+    Colonne('Téléphone', 'telephone'),
+    Colonne('Email', 'email'),
+], filtrer_employes)
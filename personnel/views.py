@@ -3,8 +3,11 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.db.models import Sum, Count, Q
 from django.core.paginator import Paginator
-from django.http import HttpResponse
+from core.agregats import calculer_totaux
+from core import recherche
 from .models import Employe, PaieSalaire, Conge
+from . import exports
+from core.exports import reponse_export
 from .forms import EmployeForm
 
 
@@ -24,13 +27,7 @@ def employe_list(request):
     # Recherche texte
     q = request.GET.get('q', '').strip()
     if q:
-        qs = qs.filter(
-            Q(nom__icontains=q)
-            | Q(prenoms__icontains=q)
-            | Q(matricule__icontains=q)
-            | Q(numero__icontains=q)
-            | Q(fonction__icontains=q)
-        )
+        qs = recherche.rechercher(qs, 'employes', q)
 
     # Pagination
     page_size = 10
@@ -39,8 +36,11 @@ def employe_list(request):
     page_obj = paginator.get_page(page_number)
 
     # Stats simples
-    total_employes = Employe.objects.count()
-    employes_actifs = Employe.objects.filter(actif=True).count()
+    totaux = calculer_totaux(
+        Employe.objects.all(),
+        total_employes=Count('id'),
+        employes_actifs=Count('id', filter=Q(actif=True)),
+    )
 
     context = {
         'title': 'Personnel',
@@ -49,8 +49,7 @@ def employe_list(request):
         'paginator': paginator,
         'q': q,
         'status': status,
-        'total_employes': total_employes,
-        'employes_actifs': employes_actifs,
+        **totaux,
     }
     return render(request, 'personnel/employe_list.html', context)
 
@@ -210,57 +209,4 @@ def statistiques_personnel(request):
 @login_required
 def employe_export_excel(request):
     """Exporter la liste des employés (avec filtres/recherche) en Excel"""
-    # Reprendre la même logique de filtre/recherche que employe_list
-    qs = Employe.objects.all().order_by('nom', 'prenoms')
-
-    status = request.GET.get('status', 'actifs')
-    if status == 'actifs':
-        qs = qs.filter(actif=True)
-    elif status == 'inactifs':
-        qs = qs.filter(actif=False)
-
-    q = request.GET.get('q', '').strip()
-    if q:
-        qs = qs.filter(
-            Q(nom__icontains=q)
-            | Q(prenoms__icontains=q)
-            | Q(matricule__icontains=q)
-            | Q(numero__icontains=q)
-            | Q(fonction__icontains=q)
-        )
-
-    # Génération Excel
-    from openpyxl import Workbook
-    wb = Workbook()
-    ws = wb.active
-    ws.title = 'Employés'
-
-    headers = [
-        'N° Employé', 'Matricule', 'Nom', 'Prénoms', 'Fonction',
-        "Date d'embauche", 'Salaire de base', 'Prime performance', 'Actif',
-        'Téléphone', 'Email'
-    ]
-    ws.append(headers)
-
-    for e in qs:
-        ws.append([
-            e.numero,
-            e.matricule,
-            e.nom,
-            e.prenoms,
-            e.fonction,
-            e.date_embauche.strftime('%d/%m/%Y') if e.date_embauche else '',
-            float(e.salaire_base) if e.salaire_base is not None else 0,
-            float(e.prime_performance) if e.prime_performance is not None else 0,
-            'Oui' if e.actif else 'Non',
-            e.telephone or '',
-            e.email or '',
-        ])
-
-    # Réponse HTTP
-    response = HttpResponse(
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    )
-    response['Content-Disposition'] = 'attachment; filename="employes.xlsx"'
-    wb.save(response)
-    return response
+    return reponse_export(request, exports.EMPLOYES)
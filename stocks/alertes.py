@@ -0,0 +1,99 @@
+"""
+Alertes de stock incrémentales.
+
+L'état d'alerte d'une ligne de stock (normal, alerte, rupture) n'est
+évalué que lorsque la ligne change : après chaque écriture au journal
+(stocks.services.journaliser), à l'enregistrement d'une ligne (seuil
+modifié, signal) et aux corrections de verifier_stock. Les lignes en
+alerte sont tenues dans AlerteStock, seule table lue par la page des
+alertes et le tableau de bord. Chaque changement d'état est ajouté, dans
+la même transaction que le mouvement, à la boîte d'envoi EvenementAlerte,
+que les notifications consomment par lots (commande traiter_alertes).
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import AlerteStock, EvenementAlerte, StockActuel
+
+# Nombre de lignes de stock lues par requête
+TAILLE_LOT = 500
+
+
+def etat_alerte(quantite, seuil):
+    """État d'une ligne de stock : 'rupture', 'alerte' ou 'normal'"""
+    if quantite <= 0:
+        return 'rupture'
+    if quantite <= seuil:
+        return 'alerte'
+    return 'normal'
+
+
+def evaluer_alertes(lignes):
+    """
+    Réévalue l'état d'alerte de lignes de stock {(magasin_id, produit_id)}
+    et enregistre les changements : alerte créée, modifiée ou supprimée et
+    événement dans la boîte d'envoi. Une lecture par lot de produits d'un
+    magasin ; rien n'est écrit si aucun état ne change. À appeler dans la
+    transaction du mouvement. Retourne le nombre de changements.
+    """
+    par_magasin = defaultdict(set)
+    for magasin_id, produit_id in lignes:
+        par_magasin[magasin_id].add(produit_id)
+
+    maintenant = timezone.now()
+    nouvelles, modifiees, terminees, evenements = [], [], [], []
+    for magasin_id, produits in par_magasin.items():
+        produits = list(produits)
+        for i in range(0, len(produits), TAILLE_LOT):
+            stocks = StockActuel.objects.filter(
+                magasin_id=magasin_id, produit_id__in=produits[i:i + TAILLE_LOT],
+            ).values_list('id', 'produit_id', 'quantite_actuelle', 'seuil_alerte', 'alerte__id', 'alerte__etat')
+            for stock_id, produit_id, quantite, seuil, alerte_id, ancien_etat in stocks:
+                ancien_etat = ancien_etat or 'normal'
+                nouvel_etat = etat_alerte(quantite, seuil)
+                if nouvel_etat == ancien_etat:
+                    continue
+                evenements.append(EvenementAlerte(
+                    magasin_id=magasin_id, produit_id=produit_id, ancien_etat=ancien_etat,
+                    nouvel_etat=nouvel_etat, quantite=quantite, seuil=seuil,
+                ))
+                if alerte_id is None:
+                    nouvelles.append(AlerteStock(stock_id=stock_id, magasin_id=magasin_id, produit_id=produit_id,
+                                                 etat=nouvel_etat, depuis=maintenant))
+                elif nouvel_etat == 'normal':
+                    terminees.append(alerte_id)
+                else:
+                    modifiees.append(AlerteStock(pk=alerte_id, etat=nouvel_etat, depuis=maintenant))
+
+    if not evenements:
+        return 0
+    AlerteStock.objects.bulk_create(nouvelles, batch_size=TAILLE_LOT)
+    AlerteStock.objects.bulk_update(modifiees, ['etat', 'depuis'], batch_size=TAILLE_LOT)
+    for i in range(0, len(terminees), TAILLE_LOT):
+        AlerteStock.objects.filter(pk__in=terminees[i:i + TAILLE_LOT]).delete()
+    EvenementAlerte.objects.bulk_create(evenements, batch_size=TAILLE_LOT)
+    return len(evenements)
+
+
+def traiter_evenements(traitement, taille=100):
+    """
+    Passe le prochain lot d'événements non traités (les plus anciens
+    d'abord) à traitement(evenements), puis les marque traités, dans une
+    transaction : si traitement lève une exception, le lot reste en
+    attente. Les événements verrouillés par un autre consommateur sont
+    sautés. Retourne le nombre d'événements traités.
+    """
+    with transaction.atomic():
+        evenements = list(
+            EvenementAlerte.objects.select_for_update(skip_locked=True, of=('self',))
+            .filter(date_traitement__isnull=True)
+            .select_related('magasin', 'produit')
+            .order_by('id')[:taille]
+        )
+        if not evenements:
+            return 0
+        traitement(evenements)
+        EvenementAlerte.objects.filter(pk__in=[e.pk for e in evenements]).update(date_traitement=timezone.now())
+    return len(evenements)
@@ -5,3 +5,6 @@ class StocksConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'stocks'
     verbose_name = 'Gestion des Stocks'
+
+    def ready(self):
+        from . import signals  # noqa: F401
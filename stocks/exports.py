@@ -0,0 +1,39 @@
+from django.db.models import F
+from core import recherche
+from core.exports import Colonne, DefinitionExport, date_heure_fr, nombre
+from .models import StockActuel
+
+
+def filtrer_stock_actuel(params):
+    """Stock actuel filtré par produit, unité de mesure et niveau d'alerte"""
+    qs = StockActuel.objects.order_by('magasin__nom', 'produit__nom')
+
+    search = (params.get('search') or '').strip()
+    if search:
+        qs = recherche.rechercher(qs, 'produits', search, champ='produit_id')
+
+    categorie = (params.get('categorie') or '').strip()
+    if categorie:
+        # Utilise unite_mesure comme catégorie fonctionnelle
+        qs = qs.filter(produit__unite_mesure=categorie)
+
+    alerte = (params.get('alerte') or '').strip()
+    if alerte == 'critique':
+        qs = qs.filter(quantite_actuelle__lte=0)
+    elif alerte == 'faible':
+        qs = qs.filter(quantite_actuelle__gt=0, quantite_actuelle__lte=F('seuil_alerte'))
+    elif alerte == 'normal':
+        qs = qs.filter(quantite_actuelle__gt=F('seuil_alerte'))
+    return qs
+
+
+STOCK_ACTUEL = DefinitionExport('stock_actuel', 'Stock Actuel', [
+    Colonne('Magasin', 'magasin__nom'),
+    Colonne('Produit', 'produit__nom'),
+    Colonne('Unité', 'produit__unite_mesure'),
+    Colonne('Quantité actuelle', 'quantite_actuelle', formater=nombre),
+    Colonne('Seuil alerte', 'seuil_alerte', formater=nombre),
+    Colonne('Prix moyen achat', 'prix_moyen_achat', formater=nombre),
+    Colonne('Valeur stock', 'valeur_stock', formater=nombre),
+    Colonne('Dernière mise à jour', 'date_maj', formater=date_heure_fr),
+], filtrer_stock_actuel)
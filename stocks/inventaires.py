@@ -0,0 +1,234 @@
+"""
+Sessions d'inventaire : ouverture, saisie des comptages, validation.
+
+L'ouverture d'un inventaire crée en une seule requête INSERT ... SELECT
+une ligne par produit suivi dans le magasin, avec le stock théorique
+(stock actuel, ou stock à la date de l'inventaire s'il est antidaté).
+Les comptages sont saisis par pages ou importés d'un fichier (export de
+douchette : une ligne par lecture, ou produit et quantité) et enregistrés
+par bulk_update. La validation reporte tous les écarts sur le stock par
+bulk_update et les inscrit au journal (opération 'inventaire') dans une
+transaction : un magasin de 20 000 produits se valide en quelques
+requêtes groupées.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from core.nombres import lire_decimal, tient_dans
+from fournisseurs.models import Produit
+from ventes.importation import RapportImport, lire_lignes
+from .models import EcritureStock, Inventaire, LigneInventaire, StockActuel
+from .services import etat_stock, journaliser
+
+# Colonnes attendues dans un fichier de comptage ('quantite' est facultative :
+# sans elle, chaque ligne compte pour une unité)
+COLONNES_COMPTAGE = ('produit',)
+
+# Nombre de lignes par requête groupée
+TAILLE_LOT = 1000
+
+# Champ des quantités comptées (bornes des saisies)
+CHAMP_COMPTAGE = LigneInventaire._meta.get_field('stock_physique')
+
+
+class InventaireClos(ValueError):
+    """Comptage ou validation demandé sur un inventaire déjà validé"""
+
+
+class ComptageInvalide(ValueError):
+    """Quantité comptée trop grande pour être enregistrée (comptages cumulés)"""
+
+
+def ouvrir_inventaire(inventaire):
+    """
+    Crée les lignes d'un inventaire, une par produit suivi dans le magasin,
+    avec le stock théorique. Retourne le nombre de lignes créées.
+    """
+    if inventaire.date < timezone.localdate():
+        # Inventaire antidaté : stock théorique à la fin de sa date
+        lignes = [
+            LigneInventaire(inventaire=inventaire, produit_id=produit_id, stock_theorique=quantite)
+            for (_, produit_id), (quantite, _) in etat_stock(inventaire.date, inventaire.magasin_id).items()
+        ]
+        LigneInventaire.objects.bulk_create(lignes, batch_size=TAILLE_LOT)
+        return len(lignes)
+
+    # Lignes copiées du stock actuel par la base, sans aller-retour
+    table_lignes, table_stocks = _table(LigneInventaire), _table(StockActuel)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table_lignes} ({_colonne(LigneInventaire, 'inventaire')}, "
+            f"{_colonne(LigneInventaire, 'produit')}, {_colonne(LigneInventaire, 'stock_theorique')}) "
+            f"SELECT %s, {_colonne(StockActuel, 'produit')}, {_colonne(StockActuel, 'quantite_actuelle')} "
+            f"FROM {table_stocks} WHERE {_colonne(StockActuel, 'magasin')} = %s",
+            [inventaire.pk, inventaire.magasin_id],
+        )
+        return cursor.rowcount
+
+
+def _table(modele):
+    return connection.ops.quote_name(modele._meta.db_table)
+
+
+def _colonne(modele, champ):
+    return connection.ops.quote_name(modele._meta.get_field(champ).column)
+
+
+def _verifier_ouvert(inventaire):
+    if inventaire.statut == 'valide':
+        raise InventaireClos(f"L'inventaire {inventaire.numero} est déjà validé.")
+
+
+def enregistrer_comptages(inventaire, comptages, cumuler=False):
+    """
+    Enregistre des quantités comptées {produit_id: quantité} par bulk_update.
+    cumuler=True ajoute les quantités au comptage déjà saisi (comptage par
+    zones ou par équipes). Retourne (nombre de lignes mises à jour,
+    produits absents de l'inventaire). Lève ComptageInvalide, sans rien
+    enregistrer, si un comptage cumulé dépasse la capacité du champ.
+    """
+    _verifier_ouvert(inventaire)
+    absents = []
+    modifiees = []
+    produits = list(comptages)
+    with transaction.atomic():
+        for i in range(0, len(produits), TAILLE_LOT):
+            lot = produits[i:i + TAILLE_LOT]
+            lignes = {
+                ligne.produit_id: ligne
+                for ligne in inventaire.lignes.filter(produit_id__in=lot).only(
+                    'id', 'inventaire', 'produit', 'stock_theorique', 'stock_physique'
+                )
+            }
+            for produit_id in lot:
+                ligne = lignes.get(produit_id)
+                if ligne is None:
+                    absents.append(produit_id)
+                    continue
+                quantite = comptages[produit_id]
+                if cumuler and ligne.stock_physique is not None:
+                    quantite += ligne.stock_physique
+                if not tient_dans(quantite, CHAMP_COMPTAGE):
+                    raise ComptageInvalide(f"Comptage trop élevé : {quantite}.")
+                ligne.stock_physique = quantite
+                modifiees.append(ligne)
+        LigneInventaire.objects.bulk_update(modifiees, ['stock_physique'], batch_size=TAILLE_LOT)
+        # Écarts recalculés par la base en une requête plutôt que par bulk_update
+        inventaire.lignes.filter(stock_physique__isnull=False).update(
+            ecart=F('stock_physique') - F('stock_theorique')
+        )
+    return len(modifiees), absents
+
+
+def lire_comptage(valeur):
+    """
+    Quantité comptée saisie ou importée, None si elle est illisible,
+    négative, infinie ou trop grande pour être enregistrée
+    """
+    quantite = lire_decimal(valeur, CHAMP_COMPTAGE)
+    return None if quantite is None or quantite < 0 else quantite
+
+
+def importer_comptages(inventaire, fichier, nom_fichier, cumuler=True):
+    """
+    Importe les comptages d'un fichier CSV ou XLSX : colonne 'produit'
+    (identifiant ou nom) et colonne facultative 'quantite'. Les lignes d'un
+    même produit sont additionnées. Rien n'est enregistré si une ligne est
+    en erreur. Retourne un RapportImport.
+    """
+    rapport = RapportImport()
+    try:
+        _verifier_ouvert(inventaire)
+        lignes = list(lire_lignes(fichier, nom_fichier, COLONNES_COMPTAGE))
+    except Exception as e:
+        rapport.ajouter_erreur(0, f"Fichier illisible : {e}")
+        return rapport
+    rapport.nb_lignes = len(lignes)
+
+    # Produits de l'inventaire, par identifiant et par nom
+    references = {}
+    for produit_id, nom in Produit.objects.filter(
+        ligneinventaire__inventaire=inventaire
+    ).values_list('id', 'nom'):
+        references[str(produit_id)] = produit_id
+        references.setdefault(nom.strip().lower(), produit_id)
+
+    comptages = defaultdict(Decimal)
+    for numero_ligne, ligne in lignes:
+        cle = str(ligne.get('produit') or '').strip()
+        if cle.endswith('.0') and cle[:-2].isdigit():
+            cle = cle[:-2]
+        produit_id = references.get(cle) or references.get(cle.lower())
+        brute = ligne.get('quantite')
+        quantite = Decimal('1') if brute in (None, '') else lire_comptage(brute)
+        erreurs = []
+        if produit_id is None:
+            erreurs.append(f"Produit « {cle} » absent de l'inventaire.")
+        if quantite is None:
+            erreurs.append("Quantité invalide (nombre positif attendu).")
+        elif produit_id is not None and not tient_dans(comptages[produit_id] + quantite, CHAMP_COMPTAGE):
+            erreurs.append("Quantité cumulée trop élevée pour ce produit.")
+        if erreurs:
+            rapport.ajouter_erreur(numero_ligne, ' '.join(erreurs))
+            continue
+        comptages[produit_id] += quantite
+
+    if rapport.erreurs or not comptages:
+        return rapport
+    try:
+        rapport.nb_importees, _ = enregistrer_comptages(inventaire, comptages, cumuler=cumuler)
+    except ComptageInvalide as e:
+        rapport.ajouter_erreur(0, f"{e} Aucun comptage importé.")
+    return rapport
+
+
+def valider_inventaire(inventaire):
+    """
+    Reporte les écarts des produits comptés sur le stock du magasin et les
+    inscrit au journal, dans une transaction. L'écart est appliqué au stock
+    actuel (les ventes passées pendant le comptage sont conservées) ; les
+    produits non comptés ne sont pas modifiés. Retourne le nombre de lignes
+    de stock corrigées.
+    """
+    with transaction.atomic():
+        inventaire = Inventaire.objects.select_for_update().get(pk=inventaire.pk)
+        _verifier_ouvert(inventaire)
+        ecarts = dict(
+            inventaire.lignes.filter(stock_physique__isnull=False).exclude(ecart=0).values_list('produit_id', 'ecart')
+        )
+        maintenant = timezone.now()
+        corriges = []
+        ecritures = []
+        stocks = StockActuel.objects.select_for_update().filter(magasin_id=inventaire.magasin_id).only(
+            'id', 'magasin', 'produit', 'quantite_actuelle', 'prix_moyen_achat'
+        )
+        for stock in stocks.iterator(chunk_size=TAILLE_LOT):
+            ecart = ecarts.get(stock.produit_id)
+            if not ecart:
+                continue
+            quantite = max(stock.quantite_actuelle + ecart, Decimal('0'))
+            delta = quantite - stock.quantite_actuelle
+            if not delta:
+                continue
+            stock.quantite_actuelle = quantite
+            corriges.append(stock)
+            ecritures.append(EcritureStock(
+                date=inventaire.date, magasin_id=stock.magasin_id, produit_id=stock.produit_id,
+                operation='inventaire', quantite=delta, cout_unitaire=stock.prix_moyen_achat,
+                reference=inventaire.numero,
+            ))
+        StockActuel.objects.bulk_update(corriges, ['quantite_actuelle'], batch_size=TAILLE_LOT)
+        # Valeur des lignes corrigées recalculée par la base en une requête
+        StockActuel.objects.filter(
+            magasin_id=inventaire.magasin_id, produit__in=inventaire.lignes.filter(
+                stock_physique__isnull=False
+            ).exclude(ecart=0).values('produit_id'),
+        ).update(valeur_stock=F('quantite_actuelle') * F('prix_moyen_achat'), date_maj=maintenant)
+        journaliser(ecritures)
+        inventaire.statut = 'valide'
+        inventaire.save(update_fields=['statut'])
+    return len(corriges)
@@ -0,0 +1,32 @@
+from datetime import date as dt_date
+
+from django.core.management.base import BaseCommand, CommandError
+from stocks.reapprovisionnement import COUVERTURE_CIBLE, DELAI_LIVRAISON, calculer_previsions
+
+
+class Command(BaseCommand):
+    help = ("Recalcule les prévisions de réapprovisionnement et les seuils d'alerte de tous "
+            "les produits à partir des ventes (à planifier chaque nuit)")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help="Dernier jour de ventes pris en compte (AAAA-MM-JJ, la veille par défaut)")
+        parser.add_argument('--delai', type=int, default=DELAI_LIVRAISON,
+                            help="Délai de livraison fournisseur, en jours")
+        parser.add_argument('--couverture', type=int, default=COUVERTURE_CIBLE,
+                            help="Jours de ventes couverts par une commande")
+        parser.add_argument('--garder-seuils', action='store_true',
+                            help="Ne modifie pas les seuils d'alerte des lignes de stock")
+
+    def handle(self, *args, **options):
+        date = None
+        if options['date']:
+            try:
+                date = dt_date.fromisoformat(options['date'])
+            except ValueError:
+                raise CommandError("Date invalide, format attendu : AAAA-MM-JJ")
+        try:
+            nb = calculer_previsions(date, options['delai'], options['couverture'],
+                                     ajuster_seuils=not options['garder_seuils'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(f"Prévisions calculées : {nb} ligne(s) de stock."))
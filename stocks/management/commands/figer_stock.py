@@ -0,0 +1,22 @@
+from datetime import date as dt_date
+
+from django.core.management.base import BaseCommand, CommandError
+from stocks.services import figer_stock
+
+
+class Command(BaseCommand):
+    help = ("Enregistre l'instantané du stock de tous les produits à la fin d'une date "
+            "(à planifier chaque nuit)")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help="Date de l'instantané (AAAA-MM-JJ, aujourd'hui par défaut)")
+
+    def handle(self, *args, **options):
+        date = None
+        if options['date']:
+            try:
+                date = dt_date.fromisoformat(options['date'])
+            except ValueError:
+                raise CommandError("Date invalide, format attendu : AAAA-MM-JJ")
+        nb = figer_stock(date)
+        self.stdout.write(self.style.SUCCESS(f"Instantané enregistré : {nb} ligne(s)."))
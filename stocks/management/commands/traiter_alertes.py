@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.mail import send_mail
+from django.core.management.base import BaseCommand
+from stocks.alertes import traiter_evenements
+
+
+class Command(BaseCommand):
+    help = ("Transmet par lots les changements d'état des alertes de stock : par courriel aux "
+            "adresses de ALERTES_STOCK_DESTINATAIRES, sinon sur la sortie standard "
+            "(à planifier régulièrement)")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--taille-lot', type=int, default=100,
+                            help="Nombre d'événements transmis par lot")
+
+    def handle(self, *args, **options):
+        destinataires = getattr(settings, 'ALERTES_STOCK_DESTINATAIRES', [])
+
+        def notifier(evenements):
+            lignes = [str(evenement) for evenement in evenements]
+            if destinataires:
+                send_mail(f"Alertes de stock : {len(lignes)} changement(s)", '\n'.join(lignes),
+                          None, destinataires)
+            else:
+                for ligne in lignes:
+                    self.stdout.write(ligne)
+
+        total = 0
+        while True:
+            nb = traiter_evenements(notifier, options['taille_lot'])
+            if not nb:
+                break
+            total += nb
+        self.stdout.write(self.style.SUCCESS(f"{total} événement(s) d'alerte traité(s)."))
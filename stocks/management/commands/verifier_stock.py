@@ -0,0 +1,44 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from stocks.alertes import evaluer_alertes
+from stocks.models import StockActuel
+from stocks.services import etat_stock
+
+
+class Command(BaseCommand):
+    help = ("Recalcule le stock actuel depuis le dernier instantané et le journal des mouvements "
+            "et signale les écarts (--corriger pour reconstruire la projection)")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--corriger', action='store_true',
+                            help="Enregistre les quantités recalculées pour les lignes en écart")
+        parser.add_argument('--taille-lot', type=int, default=500,
+                            help="Nombre de lignes de stock mises à jour par requête")
+
+    def handle(self, *args, **options):
+        etat = etat_stock()
+        ecarts = []
+        stocks = StockActuel.objects.select_related('magasin', 'produit').order_by('pk')
+        for stock in stocks.iterator(chunk_size=5000):
+            quantite = etat.get((stock.magasin_id, stock.produit_id), [Decimal('0')])[0]
+            if quantite != stock.quantite_actuelle:
+                self.stdout.write(
+                    f"{stock.produit.nom} - {stock.magasin.nom} : {stock.quantite_actuelle} au lieu de {quantite}"
+                )
+                stock.quantite_actuelle = quantite
+                stock.valeur_stock = quantite * stock.prix_moyen_achat
+                ecarts.append(stock)
+
+        if not ecarts:
+            self.stdout.write(self.style.SUCCESS("Aucun écart : le stock actuel correspond au journal."))
+            return
+        if not options['corriger']:
+            self.stdout.write(self.style.WARNING(f"{len(ecarts)} ligne(s) en écart (relancer avec --corriger)."))
+            return
+        with transaction.atomic():
+            StockActuel.objects.bulk_update(ecarts, ['quantite_actuelle', 'valeur_stock'],
+                                            batch_size=options['taille_lot'])
+            evaluer_alertes({(stock.magasin_id, stock.produit_id) for stock in ecarts})
+        self.stdout.write(self.style.SUCCESS(f"{len(ecarts)} ligne(s) corrigée(s)."))
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-17 14:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stocks', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='mouvementstock',
+            index=models.Index(fields=['date', 'date_creation', 'id'], name='mouvement_pagination_idx'),
+        ),
+    ]
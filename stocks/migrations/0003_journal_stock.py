@@ -0,0 +1,68 @@
+# Generated by Django 4.2.30 on 2026-10-17 15:01
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.utils import timezone
+
+
+def ouvrir_journal(apps, schema_editor):
+    """Une écriture d'ouverture par ligne de stock existante"""
+    StockActuel = apps.get_model('stocks', 'StockActuel')
+    EcritureStock = apps.get_model('stocks', 'EcritureStock')
+    aujourdhui = timezone.localdate()
+    EcritureStock.objects.bulk_create([
+        EcritureStock(date=aujourdhui, magasin_id=s.magasin_id, produit_id=s.produit_id, operation='ouverture',
+                      quantite=s.quantite_actuelle, cout_unitaire=s.prix_moyen_achat)
+        for s in StockActuel.objects.exclude(quantite_actuelle=0).iterator()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fournisseurs', '0002_index_pagination'),
+        ('ventes', '0005_client_limite_credit'),
+        ('stocks', '0002_index_pagination'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InstantaneStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Date')),
+                ('quantite', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Quantité')),
+                ('valeur', models.DecimalField(decimal_places=2, default=0, max_digits=16, verbose_name='Valeur au coût')),
+                ('magasin', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='instantanes_stock', to='ventes.magasin', verbose_name='Magasin')),
+                ('produit', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='instantanes_stock', to='fournisseurs.produit', verbose_name='Produit')),
+            ],
+            options={
+                'verbose_name': 'Instantané de stock',
+                'verbose_name_plural': 'Instantanés de stock',
+                'ordering': ['-date', 'magasin', 'produit'],
+                'indexes': [models.Index(fields=['magasin', 'produit', 'date'], name='instantane_stock_idx')],
+                'unique_together': {('date', 'magasin', 'produit')},
+            },
+        ),
+        migrations.CreateModel(
+            name='EcritureStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Date')),
+                ('operation', models.CharField(choices=[('ouverture', "Stock d'ouverture"), ('vente', 'Vente'), ('credit', 'Crédit client'), ('mouvement', 'Mouvement de stock'), ('livraison', 'Livraison'), ('transfert', 'Transfert'), ('inventaire', "Ajustement d'inventaire"), ('ajustement', 'Ajustement')], max_length=20, verbose_name='Opération')),
+                ('quantite', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='Quantité (négative pour une sortie)')),
+                ('cout_unitaire', models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='Coût unitaire')),
+                ('reference', models.CharField(blank=True, max_length=50, verbose_name='Référence')),
+                ('date_creation', models.DateTimeField(auto_now_add=True, verbose_name="Date d'écriture")),
+                ('magasin', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ecritures_stock', to='ventes.magasin', verbose_name='Magasin')),
+                ('produit', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ecritures_stock', to='fournisseurs.produit', verbose_name='Produit')),
+            ],
+            options={
+                'verbose_name': 'Écriture de stock',
+                'verbose_name_plural': 'Journal de stock',
+                'ordering': ['-date', '-id'],
+                'indexes': [models.Index(fields=['magasin', 'produit', 'date'], name='ecriture_stock_idx'), models.Index(fields=['date', 'date_creation', 'id'], name='ecriture_stock_date_idx')],
+            },
+        ),
+        migrations.RunPython(ouvrir_journal, migrations.RunPython.noop),
+    ]
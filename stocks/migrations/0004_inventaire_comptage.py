@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-17 15:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stocks', '0003_journal_stock'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='ligneinventaire',
+            name='ecart',
+            field=models.DecimalField(decimal_places=2, editable=False, max_digits=10, null=True, verbose_name='Écart'),
+        ),
+        migrations.AlterField(
+            model_name='ligneinventaire',
+            name='stock_physique',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True, verbose_name='Stock physique'),
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 4.2.30 on 2026-10-17 15:27
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import F, Q
+from django.utils import timezone
+
+
+def initialiser_alertes(apps, schema_editor):
+    """Alertes en cours des lignes de stock existantes (sans événement)"""
+    StockActuel = apps.get_model('stocks', 'StockActuel')
+    AlerteStock = apps.get_model('stocks', 'AlerteStock')
+    maintenant = timezone.now()
+    AlerteStock.objects.bulk_create([
+        AlerteStock(stock_id=s.pk, magasin_id=s.magasin_id, produit_id=s.produit_id,
+                    etat='rupture' if s.quantite_actuelle <= 0 else 'alerte', depuis=maintenant)
+        for s in StockActuel.objects.filter(Q(quantite_actuelle__lte=0) | Q(quantite_actuelle__lte=F('seuil_alerte'))).iterator()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fournisseurs', '0003_livraison_magasin'),
+        ('ventes', '0005_client_limite_credit'),
+        ('stocks', '0004_inventaire_comptage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EvenementAlerte',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ancien_etat', models.CharField(choices=[('normal', 'Normal'), ('alerte', 'Alerte'), ('rupture', 'Rupture')], max_length=10, verbose_name='Ancien état')),
+                ('nouvel_etat', models.CharField(choices=[('normal', 'Normal'), ('alerte', 'Alerte'), ('rupture', 'Rupture')], max_length=10, verbose_name='Nouvel état')),
+                ('quantite', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Quantité')),
+                ('seuil', models.DecimalField(decimal_places=2, max_digits=10, verbose_name="Seuil d'alerte")),
+                ('date_creation', models.DateTimeField(auto_now_add=True, verbose_name='Date du changement')),
+                ('date_traitement', models.DateTimeField(blank=True, null=True, verbose_name='Date de traitement')),
+                ('magasin', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='evenements_alerte', to='ventes.magasin', verbose_name='Magasin')),
+                ('produit', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='evenements_alerte', to='fournisseurs.produit', verbose_name='Produit')),
+            ],
+            options={
+                'verbose_name': "Événement d'alerte",
+                'verbose_name_plural': "Événements d'alerte",
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['date_traitement', 'id'], name='evenement_alerte_file_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='AlerteStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('etat', models.CharField(choices=[('alerte', 'Alerte'), ('rupture', 'Rupture')], max_length=10, verbose_name='État')),
+                ('depuis', models.DateTimeField(verbose_name='Depuis')),
+                ('magasin', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='alertes_stock', to='ventes.magasin', verbose_name='Magasin')),
+                ('produit', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='alertes_stock', to='fournisseurs.produit', verbose_name='Produit')),
+                ('stock', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='alerte', to='stocks.stockactuel', verbose_name='Ligne de stock')),
+            ],
+            options={
+                'verbose_name': 'Alerte de stock',
+                'verbose_name_plural': 'Alertes de stock',
+                'ordering': ['magasin', 'produit'],
+                'indexes': [models.Index(fields=['etat', 'magasin'], name='alerte_stock_etat_idx')],
+            },
+        ),
+        migrations.RunPython(initialiser_alertes, migrations.RunPython.noop),
+    ]
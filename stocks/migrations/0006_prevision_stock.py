@@ -0,0 +1,37 @@
+# Generated by Django 4.2.30 on 2026-10-17 15:33
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fournisseurs', '0003_livraison_magasin'),
+        ('ventes', '0005_client_limite_credit'),
+        ('stocks', '0005_alertes_stock'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PrevisionStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('vitesse', models.DecimalField(decimal_places=3, default=0, max_digits=12, verbose_name='Ventes par jour')),
+                ('stock_securite', models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='Stock de sécurité')),
+                ('jours_couverture', models.DecimalField(blank=True, decimal_places=1, max_digits=10, null=True, verbose_name='Couverture (jours)')),
+                ('seuil_dynamique', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True, verbose_name="Seuil d'alerte calculé")),
+                ('quantite_suggeree', models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='Quantité à commander')),
+                ('date_calcul', models.DateField(verbose_name='Calculé le')),
+                ('magasin', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='previsions_stock', to='ventes.magasin', verbose_name='Magasin')),
+                ('produit', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='previsions_stock', to='fournisseurs.produit', verbose_name='Produit')),
+                ('stock', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='prevision', to='stocks.stockactuel', verbose_name='Ligne de stock')),
+            ],
+            options={
+                'verbose_name': 'Prévision de stock',
+                'verbose_name_plural': 'Prévisions de stock',
+                'ordering': ['magasin', 'produit'],
+                'indexes': [models.Index(fields=['magasin', 'jours_couverture'], name='prevision_couverture_idx')],
+            },
+        ),
+    ]
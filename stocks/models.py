@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.core.validators import MinValueValidator
 from decimal import Decimal
 from ventes.models import Magasin, Commercial
@@ -37,13 +37,38 @@ class MouvementStock(models.Model):
         verbose_name = "Mouvement de Stock"
         verbose_name_plural = "Mouvements de Stock"
         ordering = ['-date', '-date_creation']
+        indexes = [
+            # Pagination par clé sur (date, date_creation, id)
+            models.Index(fields=['date', 'date_creation', 'id'], name='mouvement_pagination_idx'),
+        ]
     
     def save(self, *args, **kwargs):
         """
-        Calcul automatique du stock final
+        Calcul automatique du stock final et sortie de la quantité vendue
+        du stock actuel du magasin dans la même transaction. Une
+        modification qui ne touche ni le magasin, ni le produit, ni la
+        quantité vendue, ni la date ne fait aucun mouvement de stock.
+        Lève StockInsuffisant si la quantité n'est pas disponible.
         """
+        from .services import sortir_stock, rentrer_stock
+
         self.stock_final = self.stock_initial - self.stock_vendu
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            precedent = None
+            if self.pk:
+                precedent = MouvementStock.objects.filter(pk=self.pk).values(
+                    'magasin_id', 'produit_id', 'stock_vendu', 'date'
+                ).first()
+            stock_modifie = not precedent or (
+                (precedent['magasin_id'], precedent['produit_id'], precedent['stock_vendu'], precedent['date'])
+                != (self.magasin_id, self.produit_id, self.stock_vendu, self.date)
+            )
+            if stock_modifie and precedent and precedent['stock_vendu']:
+                rentrer_stock(precedent['magasin_id'], precedent['produit_id'], precedent['stock_vendu'],
+                              'mouvement', self.numero, precedent['date'])
+            if stock_modifie and self.stock_vendu:
+                sortir_stock(self.magasin_id, self.produit_id, self.stock_vendu, 'mouvement', self.numero, self.date)
+            super().save(*args, **kwargs)
     
     @property
     def est_rupture(self):
@@ -106,9 +131,96 @@ class StockActuel(models.Model):
         return f"{self.produit.nom} - {self.magasin.nom} ({self.quantite_actuelle})"
 
 
+class EcritureStock(models.Model):
+    """
+    Journal des mouvements de stock, en ajout seul : chaque vente, crédit,
+    mouvement, livraison, transfert ou ajustement d'inventaire y inscrit sa
+    quantité signée et son coût unitaire. StockActuel en est la projection,
+    tenue à jour dans la même transaction (voir stocks.services).
+    """
+    OPERATION_CHOICES = [
+        ('ouverture', "Stock d'ouverture"),
+        ('vente', 'Vente'),
+        ('credit', 'Crédit client'),
+        ('mouvement', 'Mouvement de stock'),
+        ('livraison', 'Livraison'),
+        ('transfert', 'Transfert'),
+        ('inventaire', "Ajustement d'inventaire"),
+        ('ajustement', 'Ajustement'),
+    ]
+
+    date = models.DateField(verbose_name="Date")
+    magasin = models.ForeignKey(Magasin, on_delete=models.CASCADE,
+                                related_name='ecritures_stock', verbose_name="Magasin")
+    produit = models.ForeignKey(Produit, on_delete=models.CASCADE,
+                                related_name='ecritures_stock', verbose_name="Produit")
+    operation = models.CharField(max_length=20, choices=OPERATION_CHOICES, verbose_name="Opération")
+    quantite = models.DecimalField(max_digits=12, decimal_places=2,
+                                   verbose_name="Quantité (négative pour une sortie)")
+    cout_unitaire = models.DecimalField(max_digits=10, decimal_places=2, default=0,
+                                        verbose_name="Coût unitaire")
+    reference = models.CharField(max_length=50, blank=True, verbose_name="Référence")
+    date_creation = models.DateTimeField(auto_now_add=True, verbose_name="Date d'écriture")
+
+    class Meta:
+        verbose_name = "Écriture de stock"
+        verbose_name_plural = "Journal de stock"
+        ordering = ['-date', '-id']
+        indexes = [
+            # Historique d'un produit dans un magasin, cumuls jusqu'à une date
+            models.Index(fields=['magasin', 'produit', 'date'], name='ecriture_stock_idx'),
+            # Écritures postérieures à un instantané, pagination par clé
+            models.Index(fields=['date', 'date_creation', 'id'], name='ecriture_stock_date_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.pk:
+            raise ValueError("Le journal de stock est en ajout seul : passer une écriture inverse.")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError("Le journal de stock est en ajout seul : passer une écriture inverse.")
+
+    @property
+    def valeur(self):
+        """Valeur signée de l'écriture au coût unitaire"""
+        return self.quantite * self.cout_unitaire
+
+    def __str__(self):
+        return f"{self.date} - {self.get_operation_display()} {self.reference} : {self.quantite}"
+
+
+class InstantaneStock(models.Model):
+    """
+    Stock figé en fin de journée par magasin et produit (quantité et valeur
+    au coût), calculé depuis le journal. Sert de point de départ pour
+    reconstruire StockActuel ou connaître le stock à une date passée.
+    """
+    date = models.DateField(verbose_name="Date")
+    magasin = models.ForeignKey(Magasin, on_delete=models.CASCADE,
+                                related_name='instantanes_stock', verbose_name="Magasin")
+    produit = models.ForeignKey(Produit, on_delete=models.CASCADE,
+                                related_name='instantanes_stock', verbose_name="Produit")
+    quantite = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Quantité")
+    valeur = models.DecimalField(max_digits=16, decimal_places=2, default=0, verbose_name="Valeur au coût")
+
+    class Meta:
+        verbose_name = "Instantané de stock"
+        verbose_name_plural = "Instantanés de stock"
+        unique_together = ['date', 'magasin', 'produit']
+        ordering = ['-date', 'magasin', 'produit']
+        indexes = [
+            models.Index(fields=['magasin', 'produit', 'date'], name='instantane_stock_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} - {self.produit} - {self.magasin} ({self.quantite})"
+
+
 class Inventaire(models.Model):
     """
-    Modèle pour les inventaires
+    Modèle pour les inventaires : une session de comptage d'un magasin,
+    ouverte avec une ligne par produit suivi (voir stocks.inventaires)
     """
     numero = models.CharField(max_length=50, unique=True, verbose_name="N° d'inventaire")
     date = models.DateField(verbose_name="Date d'inventaire")
@@ -142,9 +254,10 @@ class LigneInventaire(models.Model):
     produit = models.ForeignKey(Produit, on_delete=models.CASCADE, verbose_name="Produit")
     stock_theorique = models.DecimalField(max_digits=10, decimal_places=2, 
                                         verbose_name="Stock théorique")
-    stock_physique = models.DecimalField(max_digits=10, decimal_places=2, 
+    # Vide tant que le produit n'a pas été compté
+    stock_physique = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True,
                                        verbose_name="Stock physique")
-    ecart = models.DecimalField(max_digits=10, decimal_places=2, 
+    ecart = models.DecimalField(max_digits=10, decimal_places=2, null=True,
                               verbose_name="Écart", editable=False)
     observations = models.TextField(blank=True, null=True, verbose_name="Observations")
     
@@ -155,10 +268,116 @@ class LigneInventaire(models.Model):
     
     def save(self, *args, **kwargs):
         """
-        Calcul automatique de l'écart
+        Calcul automatique de l'écart (vide si le produit n'est pas compté)
         """
-        self.ecart = self.stock_physique - self.stock_theorique
+        self.ecart = None if self.stock_physique is None else self.stock_physique - self.stock_theorique
         super().save(*args, **kwargs)
     
     def __str__(self):
         return f"{self.inventaire.numero} - {self.produit.nom}"
+
+
+class AlerteStock(models.Model):
+    """
+    Alerte en cours sur une ligne de stock (sous le seuil d'alerte ou en
+    rupture). L'état n'est réévalué que lorsque la ligne change (voir
+    stocks.alertes) : une ligne revenue au-dessus du seuil n'a plus
+    d'alerte, les pages d'alertes ne lisent donc que cette table.
+    """
+    ETAT_CHOICES = [
+        ('alerte', 'Alerte'),
+        ('rupture', 'Rupture'),
+    ]
+
+    stock = models.OneToOneField(StockActuel, on_delete=models.CASCADE,
+                                 related_name='alerte', verbose_name="Ligne de stock")
+    magasin = models.ForeignKey(Magasin, on_delete=models.CASCADE,
+                                related_name='alertes_stock', verbose_name="Magasin")
+    produit = models.ForeignKey(Produit, on_delete=models.CASCADE,
+                                related_name='alertes_stock', verbose_name="Produit")
+    etat = models.CharField(max_length=10, choices=ETAT_CHOICES, verbose_name="État")
+    depuis = models.DateTimeField(verbose_name="Depuis")
+
+    class Meta:
+        verbose_name = "Alerte de stock"
+        verbose_name_plural = "Alertes de stock"
+        ordering = ['magasin', 'produit']
+        indexes = [
+            models.Index(fields=['etat', 'magasin'], name='alerte_stock_etat_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_etat_display()} - {self.produit} - {self.magasin}"
+
+
+class EvenementAlerte(models.Model):
+    """
+    Boîte d'envoi des changements d'état d'alerte (entrée en alerte ou en
+    rupture, retour à la normale), écrits dans la transaction du mouvement
+    de stock et consommés par lots par les notifications.
+    """
+    ETAT_CHOICES = [('normal', 'Normal')] + AlerteStock.ETAT_CHOICES
+
+    magasin = models.ForeignKey(Magasin, on_delete=models.CASCADE,
+                                related_name='evenements_alerte', verbose_name="Magasin")
+    produit = models.ForeignKey(Produit, on_delete=models.CASCADE,
+                                related_name='evenements_alerte', verbose_name="Produit")
+    ancien_etat = models.CharField(max_length=10, choices=ETAT_CHOICES, verbose_name="Ancien état")
+    nouvel_etat = models.CharField(max_length=10, choices=ETAT_CHOICES, verbose_name="Nouvel état")
+    quantite = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Quantité")
+    seuil = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Seuil d'alerte")
+    date_creation = models.DateTimeField(auto_now_add=True, verbose_name="Date du changement")
+    # Vide tant que l'événement n'a pas été transmis
+    date_traitement = models.DateTimeField(null=True, blank=True, verbose_name="Date de traitement")
+
+    class Meta:
+        verbose_name = "Événement d'alerte"
+        verbose_name_plural = "Événements d'alerte"
+        ordering = ['id']
+        indexes = [
+            # File des événements à traiter, dans l'ordre d'arrivée
+            models.Index(fields=['date_traitement', 'id'], name='evenement_alerte_file_idx'),
+        ]
+
+    def __str__(self):
+        return (f"{self.produit} - {self.magasin} : {self.get_ancien_etat_display()} → "
+                f"{self.get_nouvel_etat_display()} ({self.quantite} / seuil {self.seuil})")
+
+
+class PrevisionStock(models.Model):
+    """
+    Prévision de réapprovisionnement d'une ligne de stock, recalculée
+    chaque nuit en une passe sur tous les produits (voir
+    stocks.reapprovisionnement) : vitesse de vente, couverture, seuil
+    d'alerte dynamique et quantité à commander.
+    """
+    stock = models.OneToOneField(StockActuel, on_delete=models.CASCADE,
+                                 related_name='prevision', verbose_name="Ligne de stock")
+    magasin = models.ForeignKey(Magasin, on_delete=models.CASCADE,
+                                related_name='previsions_stock', verbose_name="Magasin")
+    produit = models.ForeignKey(Produit, on_delete=models.CASCADE,
+                                related_name='previsions_stock', verbose_name="Produit")
+    vitesse = models.DecimalField(max_digits=12, decimal_places=3, default=0,
+                                  verbose_name="Ventes par jour")
+    stock_securite = models.DecimalField(max_digits=10, decimal_places=2, default=0,
+                                         verbose_name="Stock de sécurité")
+    # Vide si le produit ne s'est pas vendu sur la période
+    jours_couverture = models.DecimalField(max_digits=10, decimal_places=1, null=True, blank=True,
+                                           verbose_name="Couverture (jours)")
+    seuil_dynamique = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True,
+                                          verbose_name="Seuil d'alerte calculé")
+    quantite_suggeree = models.DecimalField(max_digits=10, decimal_places=2, default=0,
+                                            verbose_name="Quantité à commander")
+    date_calcul = models.DateField(verbose_name="Calculé le")
+
+    class Meta:
+        verbose_name = "Prévision de stock"
+        verbose_name_plural = "Prévisions de stock"
+        ordering = ['magasin', 'produit']
+        indexes = [
+            # Produits à commander, les moins couverts d'abord
+            models.Index(fields=['magasin', 'jours_couverture'], name='prevision_couverture_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.produit} - {self.magasin} : {self.vitesse}/jour"
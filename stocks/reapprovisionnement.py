@@ -0,0 +1,140 @@
+"""
+Prévisions de réapprovisionnement : vitesse de vente, couverture en jours,
+seuil d'alerte dynamique et quantité à commander par magasin et produit.
+
+Le calcul est une passe nocturne sur toutes les lignes de stock (commande
+calculer_previsions) : les cumuls journaliers de ventes (VenteJournaliere)
+des HISTORIQUE_JOURS derniers jours sont lus en une requête et rangés
+dans une matrice lignes de stock × jours, sur laquelle les moyennes
+mobiles et la dispersion de la demande sont calculées par NumPy pour
+tous les produits à la fois.
+
+- vitesse : moyenne des moyennes mobiles courte et longue au dernier jour
+  (réagit à une hausse récente sans oublier le niveau habituel) ;
+- stock de sécurité : NIVEAU_SERVICE × écart type de la demande sur un
+  délai de livraison (sommes mobiles sur le délai) ;
+- seuil dynamique (point de commande) : demande pendant le délai + stock
+  de sécurité. Il remplace StockActuel.seuil_alerte ; les produits sans
+  vente sur la période gardent leur seuil ;
+- quantité à commander, quand le stock a atteint le seuil : de quoi
+  revenir au seuil plus COUVERTURE_CIBLE jours de ventes.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+import numpy as np
+from django.db import transaction
+from django.utils import timezone
+
+from ventes.models import VenteJournaliere
+from .alertes import evaluer_alertes
+from .models import PrevisionStock, StockActuel
+
+# Jours de ventes lus
+HISTORIQUE_JOURS = 56
+# Fenêtres des moyennes mobiles (jours)
+FENETRE_COURTE = 7
+FENETRE_LONGUE = 28
+# Délai de livraison fournisseur et couverture visée après commande (jours)
+DELAI_LIVRAISON = 7
+COUVERTURE_CIBLE = 14
+# Coefficient du stock de sécurité (1,65 : environ 95 % de demandes servies)
+NIVEAU_SERVICE = 1.65
+
+# Nombre de lignes par requête groupée
+TAILLE_LOT = 1000
+
+
+def matrice_ventes(index, debut, nb_jours):
+    """
+    Quantités vendues par ligne de stock et par jour depuis debut :
+    tableau NumPy (len(index), nb_jours), index donnant la ligne de chaque
+    (magasin_id, produit_id). Une seule lecture des cumuls journaliers.
+    """
+    lignes, jours, quantites = [], [], []
+    cumuls = VenteJournaliere.objects.filter(
+        date__range=(debut, debut + timedelta(days=nb_jours - 1)),
+    ).order_by().values_list('magasin_id', 'produit_id', 'date', 'quantite')
+    for magasin_id, produit_id, jour, quantite in cumuls.iterator(chunk_size=5000):
+        ligne = index.get((magasin_id, produit_id))
+        if ligne is not None:
+            lignes.append(ligne)
+            jours.append((jour - debut).days)
+            quantites.append(float(quantite))
+    ventes = np.zeros((len(index), nb_jours))
+    # Plusieurs cumuls par jour (un par type de vente) : add.at les additionne
+    np.add.at(ventes, (np.array(lignes, dtype=np.intp), np.array(jours, dtype=np.intp)), quantites)
+    return ventes
+
+
+def moyennes_mobiles(ventes, fenetre):
+    """Moyennes mobiles sur fenetre jours de chaque ligne, par sommes cumulées"""
+    cumul = np.concatenate([np.zeros((ventes.shape[0], 1)), ventes.cumsum(axis=1)], axis=1)
+    return (cumul[:, fenetre:] - cumul[:, :-fenetre]) / fenetre
+
+
+def prevoir(ventes, quantites, delai=DELAI_LIVRAISON, couverture=COUVERTURE_CIBLE):
+    """
+    Prévisions de toutes les lignes à partir de la matrice des ventes et
+    des quantités en stock. Retourne des tableaux (vitesse, stock de
+    sécurité, jours de couverture — NaN sans vente —, seuil, quantité à
+    commander).
+    """
+    vitesse = (moyennes_mobiles(ventes, FENETRE_COURTE)[:, -1] + moyennes_mobiles(ventes, FENETRE_LONGUE)[:, -1]) / 2
+    securite = NIVEAU_SERVICE * (moyennes_mobiles(ventes, delai) * delai).std(axis=1)
+    seuil = vitesse * delai + securite
+    with np.errstate(divide='ignore', invalid='ignore'):
+        jours_couverture = np.where(vitesse > 0, quantites / vitesse, np.nan)
+    a_commander = np.where(
+        quantites <= seuil, np.ceil(np.maximum(seuil + vitesse * couverture - quantites, 0)), 0,
+    )
+    return vitesse, securite, jours_couverture, seuil, a_commander
+
+
+def _decimal(valeur, decimales=2):
+    return Decimal(f'{valeur:.{decimales}f}')
+
+
+def calculer_previsions(date=None, delai=DELAI_LIVRAISON, couverture=COUVERTURE_CIBLE, ajuster_seuils=True):
+    """
+    Recalcule les prévisions de toutes les lignes de stock à partir des
+    ventes jusqu'à date (la veille par défaut) et, avec ajuster_seuils,
+    remplace le seuil d'alerte des produits vendus sur la période par le
+    seuil dynamique (les alertes concernées sont réévaluées). Retourne le
+    nombre de lignes calculées.
+    """
+    if not 0 < delai <= HISTORIQUE_JOURS:
+        raise ValueError(f"Le délai de livraison doit être compris entre 1 et {HISTORIQUE_JOURS} jours.")
+    fin = date or timezone.localdate() - timedelta(days=1)
+    debut = fin - timedelta(days=HISTORIQUE_JOURS - 1)
+    stocks = list(StockActuel.objects.order_by().values_list(
+        'id', 'magasin_id', 'produit_id', 'quantite_actuelle', 'seuil_alerte',
+    ))
+    if not stocks:
+        return 0
+
+    ventes = matrice_ventes({(m, p): i for i, (_, m, p, _, _) in enumerate(stocks)}, debut, HISTORIQUE_JOURS)
+    quantites = np.array([float(stock[3]) for stock in stocks])
+    vitesse, securite, jours_couverture, seuil, a_commander = prevoir(ventes, quantites, delai, couverture)
+    vendus = ventes.any(axis=1)
+
+    previsions, seuils = [], []
+    for i, (stock_id, magasin_id, produit_id, _, seuil_alerte) in enumerate(stocks):
+        seuil_dynamique = _decimal(seuil[i]) if vendus[i] else None
+        previsions.append(PrevisionStock(
+            stock_id=stock_id, magasin_id=magasin_id, produit_id=produit_id,
+            vitesse=_decimal(vitesse[i], 3), stock_securite=_decimal(securite[i]),
+            jours_couverture=_decimal(jours_couverture[i], 1) if vendus[i] and vitesse[i] > 0 else None,
+            seuil_dynamique=seuil_dynamique, quantite_suggeree=_decimal(a_commander[i]), date_calcul=fin,
+        ))
+        if ajuster_seuils and seuil_dynamique is not None and seuil_dynamique != seuil_alerte:
+            seuils.append(StockActuel(pk=stock_id, magasin_id=magasin_id, produit_id=produit_id,
+                                      seuil_alerte=seuil_dynamique))
+
+    with transaction.atomic():
+        PrevisionStock.objects.all().delete()
+        PrevisionStock.objects.bulk_create(previsions, batch_size=TAILLE_LOT)
+        # bulk_update n'écrit que le seuil : les quantités vendues entre-temps sont conservées
+        StockActuel.objects.bulk_update(seuils, ['seuil_alerte'], batch_size=TAILLE_LOT)
+        evaluer_alertes({(stock.magasin_id, stock.produit_id) for stock in seuils})
+    return len(previsions)
@@ -0,0 +1,435 @@
+"""
+Services du module stocks : mouvements de stock inscrits au journal
+EcritureStock et reportés sur StockActuel par une requête UPDATE
+conditionnelle dans la même transaction (deux ventes simultanées ne
+peuvent pas vendre plus que le stock), instantanés et stock à une date,
+liste en cache des produits disponibles d'un magasin.
+"""
+import hashlib
+import json
+from collections import defaultdict
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.db.models import Case, DecimalField, F, FloatField, Max, Min, Sum, Value, When
+from django.db.models.functions import Cast, Greatest
+from django.utils import timezone
+from core import referentiel
+from fournisseurs.models import Produit
+from ventes.models import Magasin
+from .alertes import evaluer_alertes
+from .models import EcritureStock, InstantaneStock, StockActuel
+
+# Nombre de lignes par requête groupée (reports sur les instantanés)
+TAILLE_LOT = 500
+
+# Durée de mise en cache des produits disponibles d'un magasin (secondes)
+DUREE_CACHE_PRODUITS_MAGASIN = 300
+
+
+class StockInsuffisant(ValueError):
+    """Levée quand une sortie dépasse la quantité disponible en magasin"""
+    def __init__(self, magasin_id, produit_id, quantite):
+        self.magasin_id = magasin_id
+        self.produit_id = produit_id
+        self.quantite = quantite
+        super().__init__(
+            f"Stock insuffisant : {quantite} demandé(s) pour ce produit dans ce magasin "
+            f"(ou produit non disponible dans le magasin)."
+        )
+
+
+def _ajuster(stocks, delta):
+    """
+    UPDATE stock SET quantite_actuelle = quantite_actuelle + delta,
+    valeur_stock recalculée dans la même requête. Retourne le nombre
+    de lignes modifiées.
+    """
+    return stocks.update(
+        quantite_actuelle=F('quantite_actuelle') + delta,
+        valeur_stock=(F('quantite_actuelle') + delta) * F('prix_moyen_achat'),
+        date_maj=timezone.now(),
+    )
+
+
+def _ligne_stock(magasin_id, produit_id):
+    return StockActuel.objects.filter(magasin_id=magasin_id, produit_id=produit_id)
+
+
+def journaliser(ecritures):
+    """
+    Inscrit des écritures (EcritureStock non enregistrées) au journal. Le
+    coût unitaire manquant est le prix moyen d'achat actuel. Les écritures
+    antérieures au dernier instantané y sont reportées et l'état d'alerte
+    des lignes de stock touchées est réévalué.
+    """
+    couts = {}
+    for e in ecritures:
+        if e.cout_unitaire is None:
+            cle = (e.magasin_id, e.produit_id)
+            if cle not in couts:
+                couts[cle] = _ligne_stock(*cle).values_list('prix_moyen_achat', flat=True).first() or 0
+            e.cout_unitaire = couts[cle]
+    EcritureStock.objects.bulk_create(ecritures)
+    derniere = date_dernier_instantane()
+    if derniere is not None:
+        # Un report par (magasin, produit, date), quel que soit le nombre d'écritures
+        reports = defaultdict(lambda: [Decimal('0'), Decimal('0')])
+        for ecriture in ecritures:
+            if ecriture.date <= derniere:
+                report = reports[(ecriture.magasin_id, ecriture.produit_id, ecriture.date)]
+                report[0] += ecriture.quantite
+                report[1] += ecriture.quantite * ecriture.cout_unitaire
+        if reports:
+            _reporter_sur_instantanes(reports)
+    evaluer_alertes({(e.magasin_id, e.produit_id) for e in ecritures})
+
+
+def _ecrire(magasin_id, produit_id, quantite, operation, reference, date, cout_unitaire=None):
+    journaliser([EcritureStock(
+        date=date or timezone.localdate(), magasin_id=magasin_id, produit_id=produit_id,
+        operation=operation, quantite=quantite, cout_unitaire=cout_unitaire, reference=reference or '',
+    )])
+
+
+def sortir_stock(magasin_id, produit_id, quantite, operation='ajustement', reference='', date=None):
+    """
+    Retire une quantité du stock du magasin, seulement si elle est disponible,
+    et l'inscrit au journal. Lève StockInsuffisant si aucune ligne n'a été
+    modifiée.
+    """
+    stocks = _ligne_stock(magasin_id, produit_id).filter(quantite_actuelle__gte=quantite)
+    if not _ajuster(stocks, -quantite):
+        raise StockInsuffisant(magasin_id, produit_id, quantite)
+    _ecrire(magasin_id, produit_id, -quantite, operation, reference, date)
+
+
+def rentrer_stock(magasin_id, produit_id, quantite, operation='ajustement', reference='', date=None):
+    """
+    Remet une quantité en stock au prix moyen actuel (annulation ou
+    modification d'une sortie) et l'inscrit au journal. Sans effet si le
+    produit n'est plus suivi dans ce magasin.
+    """
+    if _ajuster(_ligne_stock(magasin_id, produit_id), quantite):
+        _ecrire(magasin_id, produit_id, quantite, operation, reference, date)
+
+
+def annuler_sortie(origin, magasin_id, produit_id, quantite, operation, reference='', date=None):
+    """
+    Remet en stock la sortie d'un document supprimé (récepteurs post_delete).
+    Rien n'est fait si la suppression vient d'un magasin ou d'un produit :
+    sa ligne de stock et son journal disparaissent avec lui.
+    """
+    for modele in (Magasin, Produit):
+        if isinstance(origin, modele) or getattr(origin, 'model', None) is modele:
+            return
+    rentrer_stock(magasin_id, produit_id, quantite, operation, reference, date)
+
+
+def _entrer(magasin_id, produit_id, quantite, valeur):
+    """
+    Ajoute une quantité de valeur d'achat donnée à une ligne de stock : le
+    prix moyen d'achat pondéré, la quantité et la valeur sont recalculés
+    par une seule requête UPDATE. La ligne est créée si le produit n'était
+    pas suivi dans le magasin.
+    """
+    cout_moyen = (valeur / quantite).quantize(Decimal('0.01'))
+    prix_moyen = Case(
+        When(quantite_actuelle__gt=0, then=(
+            # Numérateur en flottant : SQLite stocke 5.00 comme un entier
+            # et ferait une division entière
+            Cast(F('quantite_actuelle') * F('prix_moyen_achat') + valeur, FloatField())
+            / (F('quantite_actuelle') + quantite)
+        )),
+        default=Value(cout_moyen),
+        output_field=DecimalField(max_digits=10, decimal_places=2),
+    )
+    deltas = {
+        'quantite_actuelle': F('quantite_actuelle') + quantite,
+        'prix_moyen_achat': prix_moyen,
+        'valeur_stock': (F('quantite_actuelle') + quantite) * prix_moyen,
+        'date_maj': timezone.now(),
+    }
+    lignes = _ligne_stock(magasin_id, produit_id)
+    if not lignes.update(**deltas):
+        try:
+            with transaction.atomic():
+                StockActuel.objects.create(
+                    magasin_id=magasin_id, produit_id=produit_id,
+                    quantite_actuelle=quantite, prix_moyen_achat=cout_moyen,
+                )
+        except IntegrityError:
+            # Ligne créée entre-temps par une écriture concurrente
+            lignes.update(**deltas)
+
+
+def _verifier_entree(quantite, cout_unitaire):
+    """Lève ValueError si la quantité ou le coût d'une entrée n'est pas strictement positif"""
+    if not (quantite.is_finite() and quantite > 0):
+        raise ValueError(f"Quantité entrée en stock invalide : {quantite} (doit être positive).")
+    if not (cout_unitaire.is_finite() and cout_unitaire > 0):
+        raise ValueError(f"Coût unitaire invalide : {cout_unitaire} (doit être positif).")
+
+
+def entrer_stock(magasin_id, produit_id, quantite, cout_unitaire, operation='livraison', reference='', date=None):
+    """
+    Entre une quantité achetée au coût donné (prix moyen
+    d'achat pondéré recalculé en base) et l'inscrit au journal. Lève
+    ValueError si la quantité ou le coût n'est pas strictement positif.
+    """
+    quantite = Decimal(quantite)
+    cout_unitaire = Decimal(cout_unitaire)
+    _verifier_entree(quantite, cout_unitaire)
+    _entrer(magasin_id, produit_id, quantite, quantite * cout_unitaire)
+    _ecrire(magasin_id, produit_id, quantite, operation, reference, date, cout_unitaire)
+
+
+def annuler_entree(magasin_id, produit_id, quantite, cout_unitaire, operation='livraison', reference='', date=None):
+    """
+    Retire du stock une entrée déjà inscrite (livraison modifiée ou
+    supprimée) à son propre coût : le prix moyen pondéré est recalculé sans
+    elle, alors qu'une sortie le laisse inchangé. Lève StockInsuffisant si
+    la quantité n'est plus disponible.
+    """
+    quantite = Decimal(quantite)
+    cout_unitaire = Decimal(cout_unitaire)
+    valeur = quantite * cout_unitaire
+    prix_moyen = Case(
+        When(quantite_actuelle__gt=quantite, then=Greatest(
+            Cast(F('quantite_actuelle') * F('prix_moyen_achat') - valeur, FloatField())
+            / (F('quantite_actuelle') - quantite),
+            Value(0.0),
+        )),
+        # Ligne vidée : le prix moyen est conservé pour les prochaines sorties
+        default=F('prix_moyen_achat'),
+        output_field=DecimalField(max_digits=10, decimal_places=2),
+    )
+    stocks = _ligne_stock(magasin_id, produit_id).filter(quantite_actuelle__gte=quantite)
+    modifiees = stocks.update(
+        quantite_actuelle=F('quantite_actuelle') - quantite,
+        prix_moyen_achat=prix_moyen,
+        valeur_stock=(F('quantite_actuelle') - quantite) * prix_moyen,
+        date_maj=timezone.now(),
+    )
+    if not modifiees:
+        raise StockInsuffisant(magasin_id, produit_id, quantite)
+    _ecrire(magasin_id, produit_id, -quantite, operation, reference, date, cout_unitaire)
+
+
+def entrer_stock_groupe(entrees, operation='livraison'):
+    """
+    Applique plusieurs entrées (livraison de plusieurs lignes) : une seule
+    requête UPDATE par (magasin, produit), quel que soit le nombre de
+    lignes, et une seule insertion au journal (une écriture par ligne).
+    entrees: itérable de (magasin_id, produit_id, quantité, coût unitaire,
+    référence, date). À appeler dans une transaction ; lève ValueError,
+    avant toute écriture, si une quantité ou un coût n'est pas strictement
+    positif.
+    """
+    cumuls = defaultdict(lambda: [Decimal('0'), Decimal('0')])
+    ecritures = []
+    for magasin_id, produit_id, quantite, cout_unitaire, reference, date in entrees:
+        quantite, cout_unitaire = Decimal(quantite), Decimal(cout_unitaire)
+        _verifier_entree(quantite, cout_unitaire)
+        cumul = cumuls[(magasin_id, produit_id)]
+        cumul[0] += quantite
+        cumul[1] += quantite * cout_unitaire
+        ecritures.append(EcritureStock(
+            date=date or timezone.localdate(), magasin_id=magasin_id, produit_id=produit_id,
+            operation=operation, quantite=quantite, cout_unitaire=cout_unitaire, reference=reference or '',
+        ))
+    for (magasin_id, produit_id), (quantite, valeur) in cumuls.items():
+        _entrer(magasin_id, produit_id, quantite, valeur)
+    journaliser(ecritures)
+
+
+def sortir_stock_groupe(sorties, operation, reference=''):
+    """
+    Applique plusieurs sorties regroupées par (magasin_id, produit_id, date)
+    et les inscrit au journal en une insertion.
+    sorties: dictionnaire {(magasin_id, produit_id, date): quantité totale}.
+    À appeler dans une transaction : la première sortie impossible lève
+    StockInsuffisant et l'ensemble est annulé.
+    """
+    ecritures = []
+    for (magasin_id, produit_id, date), quantite in sorties.items():
+        if not _ajuster(_ligne_stock(magasin_id, produit_id).filter(quantite_actuelle__gte=quantite), -quantite):
+            raise StockInsuffisant(magasin_id, produit_id, quantite)
+        ecritures.append(EcritureStock(
+            date=date, magasin_id=magasin_id, produit_id=produit_id, operation=operation,
+            quantite=-quantite, cout_unitaire=None, reference=reference,
+        ))
+    journaliser(ecritures)
+
+
+# Instantanés
+
+def date_dernier_instantane():
+    """
+    Date du dernier instantané (None s'il n'y en a pas). Lue en base à
+    chaque appel, sans cache de processus : un instantané figé par un
+    autre processus (commande planifiée) est vu aussitôt. L'index unique
+    (date, magasin, produit) en fait une seule lecture d'index.
+    """
+    return InstantaneStock.objects.aggregate(derniere=Max('date'))['derniere']
+
+
+def _reporter_sur_instantanes(reports):
+    """
+    Reporte des écritures antidatées {(magasin_id, produit_id, date):
+    [quantité, valeur]} sur les instantanés de même date ou postérieurs :
+    lecture verrouillée et bulk_update par lots de produits, quel que soit
+    le nombre d'écritures (validation d'inventaire, import).
+    """
+    debut = min(date for _, _, date in reports)
+    dates = list(InstantaneStock.objects.filter(date__gte=debut).order_by().values_list('date', flat=True).distinct())
+    cumuls = defaultdict(lambda: [Decimal('0'), Decimal('0')])
+    for (magasin_id, produit_id, date), (quantite, valeur) in reports.items():
+        for instant in dates:
+            if instant >= date:
+                cumul = cumuls[(magasin_id, produit_id, instant)]
+                cumul[0] += quantite
+                cumul[1] += valeur
+
+    magasins = {magasin_id for magasin_id, _, _ in cumuls}
+    produits = list({produit_id for _, produit_id, _ in cumuls})
+    modifies = []
+    for i in range(0, len(produits), TAILLE_LOT):
+        instantanes = InstantaneStock.objects.select_for_update().filter(
+            date__gte=debut, magasin_id__in=magasins, produit_id__in=produits[i:i + TAILLE_LOT],
+        ).only('id', 'date', 'magasin', 'produit', 'quantite', 'valeur')
+        for instantane in instantanes:
+            cumul = cumuls.pop((instantane.magasin_id, instantane.produit_id, instantane.date), None)
+            if cumul is not None:
+                instantane.quantite += cumul[0]
+                instantane.valeur += cumul[1]
+                modifies.append(instantane)
+    InstantaneStock.objects.bulk_update(modifies, ['quantite', 'valeur'], batch_size=TAILLE_LOT)
+    # Produit absent d'un instantané : il n'avait aucune écriture à cette date
+    InstantaneStock.objects.bulk_create([
+        InstantaneStock(date=date, magasin_id=magasin_id, produit_id=produit_id, quantite=quantite, valeur=valeur)
+        for (magasin_id, produit_id, date), (quantite, valeur) in cumuls.items()
+    ], batch_size=TAILLE_LOT)
+
+
+def _instantane_le_plus_proche(instantanes, date, avant):
+    """
+    Date de l'instantané le plus proche d'une date, antérieur ou postérieur
+    (None s'il n'y en a pas). Deux lectures servies par l'index sur la date.
+    """
+    if date is None:
+        return instantanes.aggregate(depart=Max('date'))['depart']
+    precedent = instantanes.filter(date__lt=date) if avant else instantanes.filter(date__lte=date)
+    precedent = precedent.aggregate(depart=Max('date'))['depart']
+    if precedent == date:
+        return precedent
+    suivant = instantanes.filter(date__gt=date).aggregate(depart=Min('date'))['depart']
+    if precedent is None or (suivant is not None and suivant - date < date - precedent):
+        return suivant
+    return precedent
+
+
+def etat_stock(date=None, magasin_id=None, produit_id=None, avant=False):
+    """
+    Quantité et valeur au coût par (magasin_id, produit_id) à la fin d'une
+    date (tout le journal par défaut), à partir de l'instantané le plus
+    proche : s'il est antérieur, on ajoute les écritures qui le suivent
+    jusqu'à la date ; s'il est postérieur, on retire les écritures
+    comprises entre la date et lui. Le coût ne dépend donc que du nombre
+    d'écritures entre deux instantanés, quelle que soit l'ancienneté de la
+    date. avant=True ignore un instantané daté du jour même (recalcul de
+    cet instantané). Retourne {(magasin_id, produit_id): [quantité, valeur]}.
+    """
+    instantanes = InstantaneStock.objects.all()
+    ecritures = EcritureStock.objects.all()
+    if magasin_id:
+        instantanes = instantanes.filter(magasin_id=magasin_id)
+        ecritures = ecritures.filter(magasin_id=magasin_id)
+    if produit_id:
+        instantanes = instantanes.filter(produit_id=produit_id)
+        ecritures = ecritures.filter(produit_id=produit_id)
+
+    depart = _instantane_le_plus_proche(instantanes, date, avant)
+    signe = 1
+    if depart is None:
+        if date is not None:
+            ecritures = ecritures.filter(date__lte=date)
+    elif date is None or depart <= date:
+        ecritures = ecritures.filter(date__gt=depart)
+        if date is not None:
+            ecritures = ecritures.filter(date__lte=date)
+    else:
+        # Instantané postérieur : on remonte le temps
+        ecritures = ecritures.filter(date__gt=date, date__lte=depart)
+        signe = -1
+
+    etat = defaultdict(lambda: [Decimal('0'), Decimal('0')])
+    if depart is not None:
+        for m, p, quantite, valeur in instantanes.filter(date=depart).values_list(
+            'magasin_id', 'produit_id', 'quantite', 'valeur'
+        ):
+            etat[(m, p)] = [quantite, valeur]
+    for ligne in ecritures.order_by().values('magasin_id', 'produit_id').annotate(
+        total=Sum('quantite'), valeur=Sum(F('quantite') * F('cout_unitaire')),
+    ):
+        cumul = etat[(ligne['magasin_id'], ligne['produit_id'])]
+        cumul[0] += signe * ligne['total']
+        cumul[1] += signe * Decimal(ligne['valeur']).quantize(Decimal('0.01'))
+    return dict(etat)
+
+
+def figer_stock(date=None):
+    """
+    Enregistre l'instantané du stock de tous les produits à la fin d'une
+    date (aujourd'hui par défaut), en remplaçant celui de cette date.
+    Retourne le nombre de lignes.
+    """
+    date = date or timezone.localdate()
+    etat = etat_stock(date, avant=True)
+    with transaction.atomic():
+        InstantaneStock.objects.filter(date=date).delete()
+        InstantaneStock.objects.bulk_create([
+            InstantaneStock(date=date, magasin_id=m, produit_id=p, quantite=quantite, valeur=valeur)
+            for (m, p), (quantite, valeur) in etat.items()
+        ], batch_size=1000)
+    return len(etat)
+
+
+def _cle_produits_magasin(magasin_id):
+    return f'stocks:produits_magasin:{magasin_id}'
+
+
+def invalider_produits_magasin(magasin_id):
+    """Oublie la liste en cache des produits disponibles d'un magasin"""
+    cache.delete(_cle_produits_magasin(magasin_id))
+
+
+def produits_magasin(magasin_id):
+    """
+    Produits disponibles dans un magasin (id, nom, prix de vente conseillé),
+    lus en une requête puis gardés en cache jusqu'à la prochaine
+    modification, au plus DUREE_CACHE_PRODUITS_MAGASIN secondes (délai
+    avant qu'un autre processus la voie avec le cache local). Retourne
+    {'produits': [...], 'etag': empreinte du contenu, 'modifie': date de
+    lecture}.
+    """
+    version_produits = referentiel.version('produits')
+    entree = cache.get(_cle_produits_magasin(magasin_id))
+    if entree is None or entree['version_produits'] != version_produits:
+        # Une seule requête (jointure sur le stock) ; un produit a au plus
+        # une ligne de stock par magasin
+        produits = list(
+            Produit.objects.filter(stockactuel__magasin_id=magasin_id)
+            .order_by('nom').values('id', 'nom', 'prix_vente_conseille')
+        )
+        contenu = json.dumps(produits, cls=DjangoJSONEncoder)
+        entree = {
+            'version_produits': version_produits,
+            'produits': produits,
+            'etag': hashlib.md5(contenu.encode()).hexdigest(),
+            'modifie': timezone.now().replace(microsecond=0),
+        }
+        cache.set(_cle_produits_magasin(magasin_id), entree, DUREE_CACHE_PRODUITS_MAGASIN)
+    return entree
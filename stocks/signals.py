@@ -0,0 +1,31 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .models import MouvementStock, StockActuel
+from .alertes import evaluer_alertes
+from .services import annuler_sortie, invalider_produits_magasin
+
+
+@receiver(post_delete, sender=MouvementStock)
+def remettre_mouvement_en_stock(sender, instance, **kwargs):
+    """Remet en stock la quantité vendue d'un mouvement supprimé"""
+    if instance.stock_vendu:
+        annuler_sortie(kwargs.get('origin'), instance.magasin_id, instance.produit_id, instance.stock_vendu,
+                       'mouvement', instance.numero, instance.date)
+
+
+@receiver(post_save, sender=StockActuel)
+@receiver(post_delete, sender=StockActuel)
+def invalider_liste_produits(sender, instance, **kwargs):
+    """
+    Une ligne de stock enregistrée ou supprimée peut changer la liste des
+    produits du magasin (les mouvements par update() ne passent pas ici)
+    """
+    transaction.on_commit(lambda: invalider_produits_magasin(instance.magasin_id))
+
+
+@receiver(post_save, sender=StockActuel)
+def evaluer_alerte_ligne(sender, instance, raw=False, **kwargs):
+    """Une ligne enregistrée (création, seuil ou quantité saisis) peut changer d'état d'alerte"""
+    if not raw:
+        evaluer_alertes([(instance.magasin_id, instance.produit_id)])
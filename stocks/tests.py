@@ -0,0 +1,222 @@
+import io
+import threading
+from datetime import date
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+
+from credits.models import CreditClient
+from fournisseurs.models import Fournisseur, Livraison, Produit
+from ventes.models import Client, Commercial, Magasin, Vente
+from .inventaires import importer_comptages, ouvrir_inventaire
+from .models import EcritureStock, Inventaire, LigneInventaire, MouvementStock, StockActuel
+from .services import StockInsuffisant, entrer_stock, sortir_stock
+
+
+class SortiesConcurrentesTests(TransactionTestCase):
+    """
+    Plusieurs caisses vendent le même produit en même temps, chacune dans
+    son thread et sa connexion, sur la base de test en fichier.
+    """
+    STOCK_INITIAL = 100
+    CAISSES = 8
+    VENTES_PAR_CAISSE = 15
+
+    def setUp(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest("Base de test en mémoire : les connexions des threads ne sont pas indépendantes")
+        self.magasin = Magasin.objects.create(nom='Magasin test')
+        self.produit = Produit.objects.create(nom='Riz', unite_mesure='sac', prix_vente_conseille=Decimal('10'))
+        entrer_stock(self.magasin.pk, self.produit.pk, self.STOCK_INITIAL, Decimal('5'), 'ajustement', 'INIT')
+
+    def _caisse(self, numero, depart, vendus, refusees, erreurs):
+        try:
+            depart.wait()
+            for i in range(self.VENTES_PAR_CAISSE):
+                # Quantités de 1 à 3 : la demande totale dépasse le stock
+                quantite = Decimal(1 + (numero + i) % 3)
+                try:
+                    with transaction.atomic():
+                        sortir_stock(self.magasin.pk, self.produit.pk, quantite, 'vente', f'C{numero}-{i}')
+                except StockInsuffisant:
+                    refusees.append(quantite)
+                else:
+                    vendus.append(quantite)
+        except Exception as e:
+            erreurs.append(e)
+        finally:
+            connection.close()
+
+    def test_stock_jamais_negatif(self):
+        depart = threading.Barrier(self.CAISSES)
+        vendus, refusees, erreurs = [], [], []
+        caisses = [
+            threading.Thread(target=self._caisse, args=(numero, depart, vendus, refusees, erreurs))
+            for numero in range(self.CAISSES)
+        ]
+        for caisse in caisses:
+            caisse.start()
+        for caisse in caisses:
+            caisse.join()
+
+        self.assertEqual(erreurs, [])
+        self.assertEqual(len(vendus) + len(refusees), self.CAISSES * self.VENTES_PAR_CAISSE)
+        self.assertTrue(refusees)
+        stock = StockActuel.objects.get(magasin=self.magasin, produit=self.produit)
+        self.assertGreaterEqual(stock.quantite_actuelle, 0)
+        # Chaque vente acceptée a décrémenté le stock, et seulement elles
+        self.assertEqual(stock.quantite_actuelle, self.STOCK_INITIAL - sum(vendus))
+        self.assertEqual(stock.valeur_stock, stock.quantite_actuelle * stock.prix_moyen_achat)
+        sorties = EcritureStock.objects.filter(operation='vente').aggregate(total=Sum('quantite'))['total']
+        self.assertEqual(-sorties, sum(vendus))
+        self.assertEqual(EcritureStock.objects.filter(operation='vente').count(), len(vendus))
+
+
+class EnregistrementSansMouvementTests(TestCase):
+    """Un document réenregistré sans changement de stock ne touche ni le stock ni le journal"""
+
+    def setUp(self):
+        self.magasin = Magasin.objects.create(nom='Magasin test')
+        self.produit = Produit.objects.create(nom='Riz', unite_mesure='sac', prix_vente_conseille=Decimal('10'))
+        self.client_test = Client.objects.create(nom='Client test')
+        entrer_stock(self.magasin.pk, self.produit.pk, 50, Decimal('5'), 'ajustement', 'INIT')
+        self.aujourdhui = date.today()
+
+    def _stock(self):
+        return StockActuel.objects.get(magasin=self.magasin, produit=self.produit).quantite_actuelle
+
+    def test_vente(self):
+        vente = Vente.objects.create(
+            numero='VTE0001', date=self.aujourdhui, magasin=self.magasin, client=self.client_test,
+            produit=self.produit, quantite_vendue=Decimal('4'), prix_unitaire=Decimal('10'), type_vente='cash',
+        )
+        ecritures = EcritureStock.objects.count()
+        vente.prix_unitaire = Decimal('12')
+        vente.save()
+        self.assertEqual(EcritureStock.objects.count(), ecritures)
+        self.assertEqual(self._stock(), 46)
+
+        vente.quantite_vendue = Decimal('6')
+        vente.save()
+        self.assertEqual(EcritureStock.objects.count(), ecritures + 2)
+        self.assertEqual(self._stock(), 44)
+
+    def test_credit(self):
+        credit = CreditClient.objects.create(
+            numero='CRD0001', date=self.aujourdhui, client=self.client_test, magasin=self.magasin,
+            produit=self.produit, quantite=Decimal('5'), prix_unitaire=Decimal('10'),
+        )
+        ecritures = EcritureStock.objects.count()
+        credit.montant_paye = Decimal('20')
+        credit.save()
+        self.assertEqual(EcritureStock.objects.count(), ecritures)
+        self.assertEqual(self._stock(), 45)
+        credit.refresh_from_db()
+        self.assertEqual(credit.solde_restant, Decimal('30'))
+
+    def test_mouvement(self):
+        commercial = Commercial.objects.create(nom='Commercial test', magasin=self.magasin,
+                                               date_embauche=self.aujourdhui)
+        mouvement = MouvementStock.objects.create(
+            numero='STK0001', date=self.aujourdhui, magasin=self.magasin, commercial=commercial,
+            produit=self.produit, stock_initial=Decimal('50'), stock_vendu=Decimal('3'),
+            montant_ventes=Decimal('30'),
+        )
+        ecritures = EcritureStock.objects.count()
+        mouvement.observations = 'Relu'
+        mouvement.save()
+        self.assertEqual(EcritureStock.objects.count(), ecritures)
+        self.assertEqual(self._stock(), 47)
+
+
+class ModificationLivraisonTests(TestCase):
+    """
+    Une livraison modifiée ne touche le stock que si sa quantité, son prix,
+    sa date, son magasin ou son produit changent ; elle est alors retirée
+    à son propre prix d'achat.
+    """
+
+    def setUp(self):
+        self.magasin = Magasin.objects.create(nom='Magasin test')
+        self.produit = Produit.objects.create(nom='Riz', unite_mesure='sac', prix_vente_conseille=Decimal('20'))
+        entrer_stock(self.magasin.pk, self.produit.pk, 10, Decimal('5'), 'ajustement', 'INIT')
+        self.livraison = Livraison.objects.create(
+            numero_enregistrement='LIV0001', date=date.today(),
+            fournisseur=Fournisseur.objects.create(nom='Fournisseur test'), produit=self.produit,
+            magasin=self.magasin, quantite_livree=Decimal('10'), prix_achat_unitaire=Decimal('15'),
+        )
+
+    def _stock(self):
+        stock = StockActuel.objects.get(magasin=self.magasin, produit=self.produit)
+        return stock.quantite_actuelle, stock.prix_moyen_achat, stock.valeur_stock
+
+    def test_modification_sans_mouvement(self):
+        self.assertEqual(self._stock(), (20, Decimal('10.00'), Decimal('200.00')))
+        ecritures = EcritureStock.objects.count()
+        self.livraison.observations = 'Relu'
+        self.livraison.save()
+        self.assertEqual(EcritureStock.objects.count(), ecritures)
+        self.assertEqual(self._stock(), (20, Decimal('10.00'), Decimal('200.00')))
+
+    def test_changement_de_prix(self):
+        self.livraison.prix_achat_unitaire = Decimal('25')
+        self.livraison.save()
+        # 10 à 5 et 10 à 25, comme si la livraison avait été saisie à 25
+        self.assertEqual(self._stock(), (20, Decimal('15.00'), Decimal('300.00')))
+
+    def test_modification_apres_vente(self):
+        sortir_stock(self.magasin.pk, self.produit.pk, Decimal('15'), 'vente', 'VTE0001')
+        self.livraison.observations = 'Relu'
+        self.livraison.save()
+        self.assertEqual(self._stock(), (5, Decimal('10.00'), Decimal('50.00')))
+
+        self.livraison.quantite_livree = Decimal('12')
+        self.livraison.save()
+        # 50 de stock restant + 12 à 15 - 10 à 15 = 80 pour 7 unités
+        self.assertEqual(self._stock(), (7, Decimal('11.43'), Decimal('80.00')))
+
+        with self.assertRaises(StockInsuffisant), transaction.atomic():
+            self.livraison.delete()
+        self.assertTrue(Livraison.objects.filter(pk=self.livraison.pk).exists())
+
+    def test_suppression(self):
+        self.livraison.delete()
+        self.assertEqual(self._stock(), (10, Decimal('5.00'), Decimal('50.00')))
+        self.assertEqual(EcritureStock.objects.filter(reference='LIV0001').aggregate(
+            total=Sum('quantite'))['total'], 0)
+
+
+class ComptagesHorsBornesTests(TestCase):
+    """Un comptage infini ou trop grand pour le champ est une saisie invalide, pas une erreur 500"""
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('test', password='test'))
+        magasin = Magasin.objects.create(nom='Magasin test')
+        self.produit = Produit.objects.create(nom='Riz', unite_mesure='sac', prix_vente_conseille=Decimal('10'))
+        entrer_stock(magasin.pk, self.produit.pk, 10, Decimal('5'), 'ajustement', 'INIT')
+        self.inventaire = Inventaire.objects.create(numero='INV0001', date=date.today(), magasin=magasin,
+                                                    responsable='Responsable test')
+        ouvrir_inventaire(self.inventaire)
+
+    def _compte(self):
+        return LigneInventaire.objects.get(produit=self.produit).stock_physique
+
+    def test_saisie(self):
+        for valeur in ('1e20', 'Infinity', 'NaN', '-3', '99999999999'):
+            with self.subTest(valeur=valeur):
+                reponse = self.client.post(reverse('stocks:inventaire_detail', args=[self.inventaire.pk]),
+                                           {f'compte_{self.produit.pk}': valeur})
+                self.assertEqual(reponse.status_code, 302)
+                self.assertIsNone(self._compte())
+
+    def test_import(self):
+        for contenu in (f'produit,quantite\n{self.produit.pk},99999999999\n',
+                        f'produit,quantite\n{self.produit.pk},99999999\n{self.produit.pk},99999999\n'):
+            with self.subTest(contenu=contenu):
+                rapport = importer_comptages(self.inventaire, io.BytesIO(contenu.encode()), 'comptage.csv')
+                self.assertTrue(rapport.erreurs)
+                self.assertIsNone(self._compte())
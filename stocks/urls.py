@@ -12,10 +12,15 @@ urlpatterns = [
     path('actuel/', views.stock_actuel_list, name='stock_actuel_list'),
     path('alertes/', views.alertes_stock, name='alertes_stock'),
     path('actuel/export/', views.stock_actuel_export_excel, name='stock_actuel_export'),
+    path('journal/', views.journal_stock, name='journal_stock'),
+    path('a-date/', views.stock_a_date, name='stock_a_date'),
+    path('reapprovisionnement/', views.reapprovisionnement, name='reapprovisionnement'),
     
     # Inventaires
     path('inventaires/', views.inventaire_list, name='inventaire_list'),
     path('inventaires/nouveau/', views.inventaire_create, name='inventaire_create'),
+    path('inventaires/<int:pk>/', views.inventaire_detail, name='inventaire_detail'),
+    path('inventaires/<int:pk>/valider/', views.inventaire_valider, name='inventaire_valider'),
     
     # Statistiques
     path('statistiques/', views.statistiques_stocks, name='statistiques'),
@@ -1,12 +1,26 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Sum, Count, Q
+from django.http import JsonResponse
+from django.db.models import Sum, Count, F, Q
 from django.core.paginator import Paginator
+from core.agregats import calculer_totaux, somme
+from core.pagination import paginer_par_curseur
+from core.sequences import enregistrer_numerote
+from core import referentiel
 from django.utils import timezone
+from django.utils.dateparse import parse_date
 import re
 from decimal import Decimal, InvalidOperation
-from .models import MouvementStock, StockActuel, Inventaire
+from .models import AlerteStock, EcritureStock, MouvementStock, PrevisionStock, StockActuel, Inventaire
+from . import exports
+from .services import etat_stock
+from .inventaires import (
+    COLONNES_COMPTAGE, ComptageInvalide, InventaireClos, enregistrer_comptages, importer_comptages,
+    lire_comptage, ouvrir_inventaire, valider_inventaire,
+)
+from core.exports import reponse_export
+from core.filtres import identifiant
 from ventes.models import Magasin, Commercial
 from fournisseurs.models import Produit
 
@@ -16,9 +30,7 @@ def mouvement_list(request):
     """Liste des mouvements de stock"""
     mouvements = MouvementStock.objects.select_related('magasin', 'produit', 'commercial').all()
     
-    paginator = Paginator(mouvements, 15)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = paginer_par_curseur(request, mouvements, 15)
     
     context = {
         'title': 'Mouvements de Stock',
@@ -31,6 +43,7 @@ def mouvement_list(request):
 def mouvement_create(request):
     """Créer un nouveau mouvement de stock"""
     if request.method == 'POST':
+        # Numéro attribué à l'enregistrement si laissé vide
         numero = request.POST.get('numero', '').strip()
         date_str = request.POST.get('date')
         magasin_id = request.POST.get('magasin', '').strip()
@@ -43,7 +56,7 @@ def mouvement_create(request):
 
         # Validations
         errors = []
-        if not re.match(r'^STK\d{4,}$', numero):
+        if numero and not re.match(r'^STK\d{4,}$', numero):
             errors.append("Le numéro doit respecter le format STK0001.")
 
         # Date
@@ -100,11 +113,11 @@ def mouvement_create(request):
                     messages.error(request, "Le produit sélectionné n'est pas disponible dans le magasin choisi.")
                     return render(request, 'stocks/mouvement_form.html', {
                         'title': 'Nouveau Mouvement de Stock',
-                        'magasins': Magasin.objects.all(),
+                        'magasins': referentiel.liste('magasins'),
                     })
 
             try:
-                mouvement = MouvementStock.objects.create(
+                enregistrer_numerote('STK', lambda numero: MouvementStock.objects.create(
                     numero=numero,
                     date=date_val,
                     magasin=magasin,
@@ -114,7 +127,7 @@ def mouvement_create(request):
                     stock_vendu=sv,
                     montant_ventes=mv,
                     observations=observations or None,
-                )
+                ), numero)
                 messages.success(request, "Mouvement de stock enregistré avec succès.")
                 return redirect('stocks:mouvement_list')
             except Exception as ex:
@@ -122,7 +135,7 @@ def mouvement_create(request):
 
     context = {
         'title': 'Nouveau Mouvement de Stock',
-        'magasins': Magasin.objects.all(),
+        'magasins': referentiel.liste('magasins'),
     }
     return render(request, 'stocks/mouvement_form.html', context)
 
@@ -132,48 +145,295 @@ def stock_actuel_list(request):
     """Liste des stocks actuels"""
     stocks = StockActuel.objects.select_related('magasin', 'produit').all()
     
+    # Valorisation lue dans valeur_stock, tenue à jour à chaque entrée et sortie
+    totaux = calculer_totaux(
+        stocks,
+        total_produits=Count('id'),
+        valeur_stock=somme('valeur_stock'),
+        alertes_stock=Count('id', filter=Q(quantite_actuelle__lte=F('seuil_alerte'))),
+    )
+    
     context = {
         'title': 'Stocks Actuels',
         'stocks': stocks,
+        **totaux,
     }
     return render(request, 'stocks/stock_actuel_list.html', context)
 
 
+@login_required
+def journal_stock(request):
+    """Journal des mouvements de stock, filtré par magasin, produit et opération"""
+    ecritures = EcritureStock.objects.select_related('magasin', 'produit')
+    magasin_id = identifiant(request.GET, 'magasin')
+    produit_id = identifiant(request.GET, 'produit')
+    operation = request.GET.get('operation')
+    if magasin_id:
+        ecritures = ecritures.filter(magasin_id=magasin_id)
+    if produit_id:
+        ecritures = ecritures.filter(produit_id=produit_id)
+    if operation:
+        ecritures = ecritures.filter(operation=operation)
+
+    page_obj = paginer_par_curseur(request, ecritures, 50)
+
+    context = {
+        'title': 'Journal de stock',
+        'page_obj': page_obj,
+        'operations': EcritureStock.OPERATION_CHOICES,
+        'filters': {'magasin': magasin_id or '', 'produit': produit_id or '', 'operation': operation or ''},
+        **referentiel.formulaire('magasins', 'produits'),
+    }
+    return render(request, 'stocks/journal_stock.html', context)
+
+
+@login_required
+def stock_a_date(request):
+    """
+    Stock théorique (quantité et valeur au coût) par magasin et produit à
+    la fin d'une date : tableau, ou JSON avec format=json
+    """
+    try:
+        date = parse_date(request.GET.get('date') or '') or timezone.localdate()
+    except ValueError:
+        date = timezone.localdate()
+    magasin_id = identifiant(request.GET, 'magasin')
+    produit_id = identifiant(request.GET, 'produit')
+
+    etat = etat_stock(date, magasin_id, produit_id)
+    magasins = {m.pk: m for m in referentiel.liste('magasins')}
+    produits = {p.pk: p for p in referentiel.liste('produits')}
+    # Fiches créées depuis la lecture des listes (autre processus) : lues en base
+    magasins.update(Magasin.objects.in_bulk({m for m, _ in etat} - magasins.keys()))
+    produits.update(Produit.objects.in_bulk({p for _, p in etat} - produits.keys()))
+    lignes = sorted((
+        {
+            'magasin_id': m, 'magasin': magasins[m].nom,
+            'produit_id': p, 'produit': produits[p].nom, 'unite': produits[p].unite_mesure,
+            'quantite': quantite, 'valeur': valeur,
+        }
+        for (m, p), (quantite, valeur) in etat.items()
+        if (quantite or valeur) and m in magasins and p in produits
+    ), key=lambda ligne: (ligne['magasin'], ligne['produit']))
+    valeur_totale = sum((ligne['valeur'] for ligne in lignes), Decimal('0'))
+
+    if request.GET.get('format') == 'json':
+        return JsonResponse({'date': date, 'lignes': lignes, 'valeur_totale': valeur_totale})
+
+    context = {
+        'title': 'Stock à date',
+        'date': date,
+        'lignes': lignes,
+        'valeur_totale': valeur_totale,
+        'filters': {'magasin': magasin_id or '', 'produit': produit_id or ''},
+        **referentiel.formulaire('magasins', 'produits'),
+    }
+    return render(request, 'stocks/stock_a_date.html', context)
+
+
 @login_required
 def alertes_stock(request):
-    """Alertes de stock"""
-    stocks_faibles = StockActuel.objects.filter(
-        quantite_actuelle__lte=models.F('seuil_alerte')
-    ).select_related('magasin', 'produit')
-    
+    """
+    Alertes de stock en cours, lues dans la table des alertes tenue à jour
+    à chaque mouvement (pas de parcours du stock)
+    """
+    alertes = AlerteStock.objects.select_related('magasin', 'produit', 'stock')
+    magasin_id = identifiant(request.GET, 'magasin')
+    etat = request.GET.get('etat')
+    if magasin_id:
+        alertes = alertes.filter(magasin_id=magasin_id)
+    compteurs = dict(alertes.order_by().values_list('etat').annotate(nb=Count('id')))
+    if etat:
+        alertes = alertes.filter(etat=etat)
+
+    paginator = Paginator(alertes.order_by('-etat', 'magasin__nom', 'produit__nom'), 50)
+    page_obj = paginator.get_page(request.GET.get('page'))
+
     context = {
         'title': 'Alertes de Stock',
-        'stocks_faibles': stocks_faibles,
+        'page_obj': page_obj,
+        'nb_alertes': compteurs.get('alerte', 0),
+        'nb_ruptures': compteurs.get('rupture', 0),
+        'etats': AlerteStock.ETAT_CHOICES,
+        'filters': {'magasin': magasin_id or '', 'etat': etat or ''},
+        **referentiel.formulaire('magasins'),
     }
     return render(request, 'stocks/alertes_stock.html', context)
 
 
+@login_required
+def reapprovisionnement(request):
+    """
+    Produits à commander d'après les prévisions de la nuit, les moins
+    couverts d'abord (tous les produits avec tous=1)
+    """
+    previsions = PrevisionStock.objects.select_related('magasin', 'produit', 'stock')
+    magasin_id = identifiant(request.GET, 'magasin')
+    tous = request.GET.get('tous') == '1'
+    if magasin_id:
+        previsions = previsions.filter(magasin_id=magasin_id)
+    if not tous:
+        previsions = previsions.filter(quantite_suggeree__gt=0)
+
+    paginator = Paginator(
+        previsions.order_by(F('jours_couverture').asc(nulls_last=True), 'magasin__nom', 'produit__nom'), 50
+    )
+    page_obj = paginator.get_page(request.GET.get('page'))
+
+    context = {
+        'title': 'Réapprovisionnement',
+        'page_obj': page_obj,
+        'date_calcul': PrevisionStock.objects.values_list('date_calcul', flat=True).first(),
+        'filters': {'magasin': magasin_id or '', 'tous': '1' if tous else ''},
+        **referentiel.formulaire('magasins'),
+    }
+    return render(request, 'stocks/reapprovisionnement.html', context)
+
+
 @login_required
 def inventaire_list(request):
     """Liste des inventaires"""
-    inventaires = Inventaire.objects.select_related('magasin').all()
+    inventaires = Inventaire.objects.select_related('magasin').annotate(
+        nb_lignes=Count('lignes'),
+        nb_comptes=Count('lignes', filter=Q(lignes__stock_physique__isnull=False)),
+    ).order_by('-date', '-date_creation')
+    
+    paginator = Paginator(inventaires, 15)
+    page_obj = paginator.get_page(request.GET.get('page'))
     
     context = {
         'title': 'Inventaires',
-        'inventaires': inventaires,
+        'page_obj': page_obj,
     }
     return render(request, 'stocks/inventaire_list.html', context)
 
 
 @login_required
 def inventaire_create(request):
-    """Créer un nouvel inventaire"""
+    """
+    Ouvrir un inventaire : une ligne par produit suivi dans le magasin,
+    avec son stock théorique
+    """
+    if request.method == 'POST':
+        magasin_id = request.POST.get('magasin')
+        date = parse_date(request.POST.get('date') or '') or timezone.localdate()
+        responsable = (request.POST.get('responsable') or '').strip()
+        
+        if not magasin_id or not responsable:
+            messages.error(request, 'Le magasin et le responsable sont obligatoires.')
+        elif date > timezone.localdate():
+            messages.error(request, "La date d'inventaire ne peut pas être dans le futur.")
+        elif Inventaire.objects.filter(magasin_id=magasin_id, statut='en_cours').exists():
+            messages.error(request, 'Un inventaire est déjà en cours pour ce magasin.')
+        else:
+            def ouvrir(numero):
+                inventaire = Inventaire.objects.create(
+                    numero=numero,
+                    date=date,
+                    magasin_id=magasin_id,
+                    responsable=responsable,
+                    observations=request.POST.get('observations') or '',
+                )
+                return inventaire, ouvrir_inventaire(inventaire)
+
+            inventaire, nb_lignes = enregistrer_numerote('INV', ouvrir)
+            messages.success(request, f'Inventaire {inventaire.numero} ouvert : {nb_lignes} produit(s) à compter.')
+            return redirect('stocks:inventaire_detail', pk=inventaire.pk)
+    
     context = {
         'title': 'Nouvel Inventaire',
+        'magasins': referentiel.liste('magasins'),
+        'today': timezone.localdate().isoformat(),
     }
     return render(request, 'stocks/inventaire_form.html', context)
 
 
+@login_required
+def inventaire_detail(request, pk):
+    """
+    Écran de comptage d'un inventaire : saisie des quantités par page,
+    import d'un fichier de comptage, suivi des écarts
+    """
+    inventaire = get_object_or_404(Inventaire.objects.select_related('magasin'), pk=pk)
+    rapport = None
+    
+    if request.method == 'POST':
+        try:
+            if request.POST.get('action') == 'import':
+                fichier = request.FILES.get('fichier')
+                if not fichier:
+                    messages.error(request, 'Veuillez choisir un fichier CSV ou Excel.')
+                else:
+                    rapport = importer_comptages(inventaire, fichier.file, fichier.name,
+                                                 cumuler=bool(request.POST.get('cumuler')))
+                    if rapport.erreurs:
+                        messages.error(request, f'Aucun comptage importé : {len(rapport.erreurs)} ligne(s) en erreur.')
+                    else:
+                        messages.success(request, f'{rapport.nb_importees} produit(s) compté(s) '
+                                                  f'sur {rapport.nb_lignes} ligne(s) lue(s).')
+            else:
+                comptages = {}
+                erreurs = 0
+                for cle, valeur in request.POST.items():
+                    if cle.startswith('compte_') and valeur.strip():
+                        quantite = lire_comptage(valeur)
+                        if quantite is None or not cle[len('compte_'):].isdigit():
+                            erreurs += 1
+                        else:
+                            comptages[int(cle[len('compte_'):])] = quantite
+                nb, _ = enregistrer_comptages(inventaire, comptages)
+                if erreurs:
+                    messages.warning(request, f'{erreurs} quantité(s) invalide(s) ignorée(s).')
+                messages.success(request, f'{nb} comptage(s) enregistré(s).')
+                return redirect(request.get_full_path())
+        except (InventaireClos, ComptageInvalide) as e:
+            messages.error(request, str(e))
+    
+    lignes = inventaire.lignes.select_related('produit').order_by('produit__nom')
+    search = request.GET.get('search')
+    if search:
+        lignes = lignes.filter(produit__nom__icontains=search)
+    filtre = request.GET.get('filtre')
+    if filtre == 'non_comptes':
+        lignes = lignes.filter(stock_physique__isnull=True)
+    elif filtre == 'ecarts':
+        lignes = lignes.filter(stock_physique__isnull=False).exclude(ecart=0)
+    
+    paginator = Paginator(lignes, 50)
+    page_obj = paginator.get_page(request.GET.get('page'))
+    
+    totaux = calculer_totaux(
+        inventaire.lignes.all(),
+        nb_lignes=Count('id'),
+        nb_comptes=Count('id', filter=Q(stock_physique__isnull=False)),
+        nb_ecarts=Count('id', filter=Q(stock_physique__isnull=False) & ~Q(ecart=0)),
+    )
+    
+    context = {
+        'title': f'Inventaire {inventaire.numero}',
+        'inventaire': inventaire,
+        'page_obj': page_obj,
+        'rapport': rapport,
+        'colonnes': COLONNES_COMPTAGE,
+        'filters': {'search': search or '', 'filtre': filtre or ''},
+        **totaux,
+    }
+    return render(request, 'stocks/inventaire_detail.html', context)
+
+
+@login_required
+def inventaire_valider(request, pk):
+    """Valider un inventaire : les écarts comptés sont reportés sur le stock"""
+    inventaire = get_object_or_404(Inventaire, pk=pk)
+    if request.method == 'POST':
+        try:
+            nb = valider_inventaire(inventaire)
+            messages.success(request, f'Inventaire {inventaire.numero} validé : {nb} ligne(s) de stock corrigée(s).')
+        except (InventaireClos, ComptageInvalide) as e:
+            messages.error(request, str(e))
+    return redirect('stocks:inventaire_detail', pk=pk)
+
+
 @login_required
 def statistiques_stocks(request):
     """Statistiques des stocks"""
@@ -186,51 +446,4 @@ def statistiques_stocks(request):
 @login_required
 def stock_actuel_export_excel(request):
     """Exporter la liste du stock actuel en Excel (avec filtres)"""
-    qs = StockActuel.objects.select_related('magasin', 'produit').all()
-
-    # Filtres
-    search = request.GET.get('search', '').strip()
-    if search:
-        qs = qs.filter(produit__nom__icontains=search)
-
-    categorie = request.GET.get('categorie', '').strip()
-    if categorie:
-        # Utilise unite_mesure comme catégorie fonctionnelle
-        qs = qs.filter(produit__unite_mesure=categorie)
-
-    alerte = request.GET.get('alerte', '').strip()
-    if alerte == 'critique':
-        qs = qs.filter(quantite_actuelle__lte=0)
-    elif alerte == 'faible':
-        from django.db.models import F
-        qs = qs.filter(quantite_actuelle__gt=0, quantite_actuelle__lte=F('seuil_alerte'))
-    elif alerte == 'normal':
-        from django.db.models import F
-        qs = qs.filter(quantite_actuelle__gt=F('seuil_alerte'))
-
-    from openpyxl import Workbook
-    wb = Workbook()
-    ws = wb.active
-    ws.title = 'Stock Actuel'
-    ws.append([
-        'Magasin', 'Produit', 'Unité', 'Quantité actuelle', 'Seuil alerte',
-        'Prix moyen achat', 'Valeur stock', 'Dernière mise à jour'
-    ])
-
-    for s in qs.order_by('magasin__nom', 'produit__nom'):
-        ws.append([
-            s.magasin.nom if s.magasin else '',
-            s.produit.nom if s.produit else '',
-            getattr(s.produit, 'unite_mesure', '') or '',
-            float(s.quantite_actuelle) if s.quantite_actuelle is not None else 0,
-            float(s.seuil_alerte) if s.seuil_alerte is not None else 0,
-            float(s.prix_moyen_achat) if s.prix_moyen_achat is not None else 0,
-            float(s.valeur_stock) if s.valeur_stock is not None else 0,
-            s.date_maj.strftime('%d/%m/%Y %H:%M') if s.date_maj else '',
-        ])
-
-    from django.http import HttpResponse
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = 'attachment; filename="stock_actuel.xlsx"'
-    wb.save(response)
-    return response
+    return reponse_export(request, exports.STOCK_ACTUEL)
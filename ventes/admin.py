@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Magasin, Client, Vente, Commercial
+from .models import Magasin, Client, Ticket, Vente, Commercial
 
 
 @admin.register(Magasin)
@@ -48,3 +48,20 @@ class VenteAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
     )
+
+
+class LigneTicketInline(admin.TabularInline):
+    model = Vente
+    fields = ['numero', 'produit', 'quantite_vendue', 'prix_unitaire', 'total_vente']
+    readonly_fields = ['total_vente']
+    extra = 0
+
+
+@admin.register(Ticket)
+class TicketAdmin(admin.ModelAdmin):
+    list_display = ['numero', 'date', 'magasin', 'client', 'type_vente', 'nb_lignes', 'total']
+    list_filter = ['date', 'magasin', 'type_vente']
+    search_fields = ['numero', 'client__nom', 'client__prenom']
+    ordering = ['-date']
+    readonly_fields = ['nb_lignes', 'total', 'date_creation']
+    inlines = [LigneTicketInline]
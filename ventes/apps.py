@@ -5,3 +5,6 @@ class VentesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'ventes'
     verbose_name = 'Gestion des Ventes'
+
+    def ready(self):
+        from . import signals  # noqa: F401
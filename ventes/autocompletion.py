@@ -0,0 +1,10 @@
+from core.autocompletion import IndexAutocompletion
+from core.exports import nom_complet
+
+
+def libelle_client(nom, prenom, telephone):
+    libelle = nom_complet(nom, prenom)
+    return f"{libelle} ({telephone})" if telephone else libelle
+
+
+CLIENTS = IndexAutocompletion('clients', 'ventes.Client', ('nom', 'prenom', 'telephone'), libelle_client)
@@ -0,0 +1,54 @@
+from core import recherche
+from core.exports import Colonne, DefinitionExport, date_fr, nom_complet, nombre
+from core.filtres import identifiant
+from .models import Client, Vente
+
+
+def filtrer_ventes(params):
+    """Ventes filtrées par magasin, type de vente et période"""
+    ventes = Vente.objects.order_by('-date')
+    magasin_id = identifiant(params, 'magasin')
+    if magasin_id:
+        ventes = ventes.filter(magasin_id=magasin_id)
+    type_vente = params.get('type_vente')
+    if type_vente in {'cash', 'credit'}:
+        ventes = ventes.filter(type_vente=type_vente)
+    date_debut = params.get('date_debut')
+    date_fin = params.get('date_fin')
+    if date_debut:
+        ventes = ventes.filter(date__gte=date_debut)
+    if date_fin:
+        ventes = ventes.filter(date__lte=date_fin)
+    return ventes
+
+
+def filtrer_clients(params):
+    """Clients filtrés par recherche sur le nom, le prénom, le téléphone ou l'email"""
+    clients = Client.objects.order_by('nom', 'prenom')
+    search = params.get('search')
+    if search:
+        clients = recherche.rechercher(clients, 'clients', search)
+    return clients
+
+
+VENTES = DefinitionExport('ventes', 'Ventes', [
+    Colonne('N° Vente', 'numero'),
+    Colonne('Date', 'date', formater=date_fr),
+    Colonne('Magasin', 'magasin__nom'),
+    Colonne('Client', 'client__nom', 'client__prenom', formater=nom_complet),
+    Colonne('Produit', 'produit__nom'),
+    Colonne('Quantité', 'quantite_vendue', formater=nombre),
+    Colonne('Unité', 'produit__unite_mesure'),
+    Colonne('Type', 'type_vente'),
+    Colonne('Prix unitaire', 'prix_unitaire', formater=nombre),
+    Colonne('Total', 'total_vente', formater=nombre),
+], filtrer_ventes)
+
+CLIENTS = DefinitionExport('clients', 'Clients', [
+    Colonne('Nom', 'nom'),
+    Colonne('Prénom', 'prenom'),
+    Colonne('Téléphone', 'telephone'),
+    Colonne('Email', 'email'),
+    Colonne('Limite de crédit', 'limite_credit', formater=nombre),
+    Colonne('Crédit actuel', 'encours__encours', formater=nombre),
+], filtrer_clients)
@@ -46,7 +46,7 @@ class ClientForm(forms.ModelForm):
     """
     class Meta:
         model = Client
-        fields = ['nom', 'prenom', 'telephone', 'email', 'adresse']
+        fields = ['nom', 'prenom', 'telephone', 'email', 'adresse', 'limite_credit']
         widgets = {
             'adresse': forms.Textarea(attrs={'rows': 3}),
         }
@@ -66,6 +66,7 @@ class ClientForm(forms.ModelForm):
                     Column('email', css_class='form-group col-md-6 mb-0'),
                 ),
                 'adresse',
+                'limite_credit',
             ),
             Submit('submit', 'Enregistrer', css_class='btn btn-primary')
         )
@@ -0,0 +1,287 @@
+"""
+Import en masse des ventes depuis un fichier CSV ou XLSX.
+
+Le fichier est lu en entier, puis toutes les références (magasins, clients,
+produits, stock disponible, numéros déjà utilisés) sont résolues par
+quelques requêtes groupées au lieu d'une requête par ligne. Les règles de
+vente_create sont appliquées à chaque ligne, y compris le stock
+disponible, décompté au fil du fichier ; les erreurs sont rapportées avec
+leur numéro de ligne, et les ventes valides sont insérées par bulk_create
+par lots.
+"""
+import csv
+import io
+import itertools
+import re
+from collections import defaultdict
+from datetime import date as dt_date, datetime
+from decimal import Decimal
+
+from django.db import transaction
+
+from core.nombres import lire_decimal, tient_dans
+from core.sequences import avancer_sequence
+from fournisseurs.models import Produit
+from stocks.models import StockActuel
+from stocks.services import StockInsuffisant, sortir_stock_groupe
+from .models import Magasin, Client, Vente
+from .services import ajuster_cumul
+
+# Colonnes attendues (première ligne du fichier)
+COLONNES = ('numero', 'date', 'magasin', 'client', 'produit',
+            'quantite_vendue', 'prix_unitaire', 'type_vente')
+
+# Nombre de ventes insérées par requête
+TAILLE_LOT = 1000
+
+# Nombre de valeurs par clause IN (limite de variables SQLite)
+TAILLE_IN = 500
+
+FORMAT_NUMERO = re.compile(r'^VTE\d{4,}$')
+FORMATS_DATE = ('%Y-%m-%d', '%d/%m/%Y')
+
+
+class RapportImport:
+    """
+    Résultat d'un import : nombre de lignes lues, importées et erreurs
+    (numéro de ligne du fichier, message)
+    """
+    def __init__(self):
+        self.nb_lignes = 0
+        self.nb_importees = 0
+        self.erreurs = []
+
+    def ajouter_erreur(self, ligne, message):
+        self.erreurs.append((ligne, message))
+
+    @property
+    def valide(self):
+        return not self.erreurs
+
+
+def _cle(valeur):
+    """Normalise une cellule texte (nom, téléphone, identifiant)"""
+    if valeur is None:
+        return ''
+    if isinstance(valeur, float) and valeur.is_integer():
+        valeur = int(valeur)
+    return str(valeur).strip()
+
+
+def _par_lots(valeurs, taille=TAILLE_IN):
+    valeurs = list(valeurs)
+    for i in range(0, len(valeurs), taille):
+        yield valeurs[i:i + taille]
+
+
+def lire_lignes(fichier, nom_fichier, colonnes=COLONNES):
+    """
+    Générateur de (numéro de ligne, dictionnaire colonne -> valeur)
+    pour un fichier CSV (séparateur ';' ou ',') ou XLSX dont la première
+    ligne contient au moins les colonnes données
+    """
+    if nom_fichier.lower().endswith('.xlsx'):
+        from openpyxl import load_workbook
+        wb = load_workbook(fichier, read_only=True, data_only=True)
+        lignes = wb.active.iter_rows(values_only=True)
+    else:
+        texte = io.TextIOWrapper(fichier, encoding='utf-8-sig', newline='')
+        premiere = texte.readline()
+        separateur = ';' if premiere.count(';') > premiere.count(',') else ','
+        lignes = csv.reader(itertools.chain([premiere], texte), delimiter=separateur)
+
+    entetes = None
+    for numero_ligne, valeurs in enumerate(lignes, start=1):
+        if entetes is None:
+            entetes = [_cle(v).lower() for v in valeurs]
+            manquantes = [c for c in colonnes if c not in entetes]
+            if manquantes:
+                raise ValueError(f"Colonnes manquantes : {', '.join(manquantes)}")
+            continue
+        if not any(v not in (None, '') for v in valeurs):
+            continue
+        yield numero_ligne, dict(zip(entetes, valeurs))
+
+
+def _resoudre(modele, cles, champ_texte):
+    """
+    Résout des références données par identifiant ou par valeur du champ
+    texte, en une requête par lot de clés. Retourne {clé: id}.
+    """
+    ids = {c for c in cles if c.isdigit()}
+    textes = cles - ids
+    resolues = {}
+    for lot in _par_lots(ids):
+        for pk in modele.objects.filter(pk__in=lot).values_list('pk', flat=True):
+            resolues[str(pk)] = pk
+    for lot in _par_lots(textes):
+        for pk, valeur in modele.objects.filter(**{f'{champ_texte}__in': lot}).values_list('pk', champ_texte):
+            resolues.setdefault(valeur, pk)
+    return resolues
+
+
+def _lire_date(valeur, cache):
+    """Date d'une cellule ; les textes déjà lus sont pris dans le cache"""
+    if isinstance(valeur, datetime):
+        return valeur.date()
+    if isinstance(valeur, dt_date):
+        return valeur
+    texte = _cle(valeur)
+    if texte not in cache:
+        cache[texte] = _analyser_date(texte)
+    return cache[texte]
+
+
+def _analyser_date(texte):
+    for format_date in FORMATS_DATE:
+        try:
+            return datetime.strptime(texte, format_date).date()
+        except ValueError:
+            continue
+    return None
+
+
+def _lire_decimal(valeur, champ):
+    """Nombre d'une cellule arrondi au champ, None s'il est illisible, infini ou trop grand"""
+    return lire_decimal(_cle(valeur), champ)
+
+
+def importer_ventes(fichier, nom_fichier, partiel=False):
+    """
+    Importe les ventes d'un fichier. Par défaut rien n'est enregistré si
+    une ligne est en erreur ; avec partiel=True les lignes valides sont
+    importées et les autres rapportées. Retourne un RapportImport.
+    """
+    rapport = RapportImport()
+    try:
+        lignes = list(lire_lignes(fichier, nom_fichier))
+    except Exception as e:
+        rapport.ajouter_erreur(0, f"Fichier illisible : {e}")
+        return rapport
+    rapport.nb_lignes = len(lignes)
+
+    # Résolution groupée des références
+    cles_magasins, cles_clients, cles_produits, numeros = set(), set(), set(), set()
+    for _, ligne in lignes:
+        cles_magasins.add(_cle(ligne.get('magasin')))
+        cles_clients.add(_cle(ligne.get('client')))
+        cles_produits.add(_cle(ligne.get('produit')))
+        numeros.add(_cle(ligne.get('numero')))
+    magasins = _resoudre(Magasin, cles_magasins - {''}, 'nom')
+    clients = _resoudre(Client, cles_clients - {''}, 'telephone')
+    produits = _resoudre(Produit, cles_produits - {''}, 'nom')
+
+    numeros_existants = set()
+    for lot in _par_lots(numeros - {''}):
+        numeros_existants.update(Vente.objects.filter(numero__in=lot).values_list('numero', flat=True))
+
+    # Stock disponible par (magasin, produit), décompté au fil des lignes
+    disponibles = {}
+    for lot in _par_lots(set(magasins.values())):
+        disponibles.update(
+            ((magasin_id, produit_id), quantite)
+            for magasin_id, produit_id, quantite in StockActuel.objects.filter(magasin_id__in=lot).values_list(
+                'magasin_id', 'produit_id', 'quantite_actuelle'
+            )
+        )
+
+    # Validation ligne par ligne (mêmes règles que vente_create)
+    aujourdhui = dt_date.today()
+    dates_lues = {}
+    numeros_vus = set()
+    champ_quantite = Vente._meta.get_field('quantite_vendue')
+    champ_prix = Vente._meta.get_field('prix_unitaire')
+    champ_total = Vente._meta.get_field('total_vente')
+    ventes = []
+    for numero_ligne, ligne in lignes:
+        erreurs = []
+        numero = _cle(ligne.get('numero'))
+        if not FORMAT_NUMERO.match(numero):
+            erreurs.append("Numéro invalide. Format attendu: VTE0001")
+        elif numero in numeros_existants:
+            erreurs.append(f"Le numéro {numero} existe déjà.")
+        elif numero in numeros_vus:
+            erreurs.append(f"Le numéro {numero} apparaît plusieurs fois dans le fichier.")
+        numeros_vus.add(numero)
+
+        date_vente = _lire_date(ligne.get('date'), dates_lues)
+        if date_vente is None:
+            erreurs.append("Date invalide.")
+        elif date_vente > aujourdhui:
+            erreurs.append("La date ne peut pas être dans le futur.")
+
+        type_vente = _cle(ligne.get('type_vente')).lower()
+        if type_vente not in {'cash', 'credit'}:
+            erreurs.append("Type de vente invalide.")
+
+        quantite = _lire_decimal(ligne.get('quantite_vendue'), champ_quantite)
+        if quantite is None:
+            erreurs.append("Quantité invalide.")
+        elif quantite <= 0:
+            erreurs.append("La quantité doit être positive.")
+
+        prix = _lire_decimal(ligne.get('prix_unitaire'), champ_prix)
+        if prix is None:
+            erreurs.append("Prix unitaire invalide.")
+        elif prix <= 0:
+            erreurs.append("Le prix unitaire doit être positif.")
+
+        magasin_id = magasins.get(_cle(ligne.get('magasin')))
+        client_id = clients.get(_cle(ligne.get('client')))
+        produit_id = produits.get(_cle(ligne.get('produit')))
+        if magasin_id is None:
+            erreurs.append("Magasin introuvable.")
+        if client_id is None:
+            erreurs.append("Client introuvable.")
+        if produit_id is None:
+            erreurs.append("Produit introuvable.")
+        if magasin_id and produit_id and (magasin_id, produit_id) not in disponibles:
+            erreurs.append("Le produit n'est pas disponible dans le magasin choisi.")
+        if quantite and prix and not tient_dans(quantite * prix, champ_total):
+            erreurs.append("Montant trop élevé.")
+
+        if not erreurs and quantite > disponibles[(magasin_id, produit_id)]:
+            erreurs.append(f"Stock insuffisant : {quantite} demandé(s), "
+                           f"{disponibles[(magasin_id, produit_id)]} disponible(s).")
+        if erreurs:
+            rapport.ajouter_erreur(numero_ligne, ' '.join(erreurs))
+            continue
+        disponibles[(magasin_id, produit_id)] -= quantite
+        ventes.append(Vente(
+            numero=numero, date=date_vente, magasin_id=magasin_id, client_id=client_id,
+            produit_id=produit_id, quantite_vendue=quantite, prix_unitaire=prix,
+            type_vente=type_vente, total_vente=quantite * prix,
+        ))
+
+    if not ventes or (rapport.erreurs and not partiel):
+        return rapport
+
+    # bulk_create n'appelle pas Vente.save() : le stock est sorti une fois par
+    # (magasin, produit, date) et les cumuls journaliers ajustés une fois par
+    # groupe (date, magasin, produit, type de vente)
+    sorties = defaultdict(Decimal)
+    cumuls = defaultdict(lambda: [0, Decimal('0'), Decimal('0')])
+    for vente in ventes:
+        sorties[(vente.magasin_id, vente.produit_id, vente.date)] += vente.quantite_vendue
+        cumul = cumuls[(vente.date, vente.magasin_id, vente.produit_id, vente.type_vente)]
+        cumul[0] += 1
+        cumul[1] += vente.quantite_vendue
+        cumul[2] += vente.total_vente
+
+    try:
+        with transaction.atomic():
+            sortir_stock_groupe(sorties, 'vente', f'Import {nom_fichier}'[:50])
+            Vente.objects.bulk_create(ventes, batch_size=TAILLE_LOT)
+            # Numéros du fichier : la séquence VTE passe au-delà
+            avancer_sequence(*(vente.numero for vente in ventes))
+            for (date_vente, magasin_id, produit_id, type_vente), (nb, quantite, total) in cumuls.items():
+                ajuster_cumul(date_vente, magasin_id, produit_id, type_vente, nb, quantite, total)
+    except StockInsuffisant as e:
+        # Stock sorti par une autre écriture depuis la lecture
+        magasin = Magasin.objects.filter(pk=e.magasin_id).values_list('nom', flat=True).first()
+        produit = Produit.objects.filter(pk=e.produit_id).values_list('nom', flat=True).first()
+        rapport.ajouter_erreur(0, f"Stock insuffisant pour {produit} dans {magasin} : "
+                                  f"{e.quantite} demandé(s). Aucune vente importée.")
+        return rapport
+    rapport.nb_importees = len(ventes)
+    return rapport
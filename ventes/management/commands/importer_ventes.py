@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+from ventes.importation import importer_ventes
+
+
+class Command(BaseCommand):
+    help = "Importe des ventes depuis un fichier CSV ou Excel (fichier de fin de journée)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('fichier', help="Chemin du fichier .csv ou .xlsx")
+        parser.add_argument('--partiel', action='store_true',
+                            help="Importer les lignes valides même si d'autres sont en erreur")
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['fichier'], 'rb') as fichier:
+                rapport = importer_ventes(fichier, options['fichier'], partiel=options['partiel'])
+        except OSError as e:
+            raise CommandError(str(e))
+
+        for ligne, message in rapport.erreurs:
+            self.stderr.write(f"Ligne {ligne} : {message}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{rapport.nb_importees} vente(s) importée(s) sur {rapport.nb_lignes} ligne(s), "
+            f"{len(rapport.erreurs)} erreur(s)."
+        ))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Sum
+from ventes.models import Vente, VenteJournaliere
+
+
+class Command(BaseCommand):
+    help = "Reconstruit entièrement la table des cumuls journaliers des ventes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--taille-lot', type=int, default=5000,
+                            help="Nombre de lignes insérées par lot")
+
+    def handle(self, *args, **options):
+        taille_lot = options['taille_lot']
+        cumuls = (
+            Vente.objects.order_by()
+            .values('date', 'magasin_id', 'produit_id', 'type_vente')
+            .annotate(nb_ventes=Count('id'), quantite=Sum('quantite_vendue'), total=Sum('total_vente'))
+        )
+        with transaction.atomic():
+            VenteJournaliere.objects.all().delete()
+            lot = []
+            nb_lignes = 0
+            for c in cumuls.iterator(chunk_size=taille_lot):
+                lot.append(VenteJournaliere(**c))
+                if len(lot) >= taille_lot:
+                    VenteJournaliere.objects.bulk_create(lot)
+                    nb_lignes += len(lot)
+                    lot = []
+            if lot:
+                VenteJournaliere.objects.bulk_create(lot)
+                nb_lignes += len(lot)
+        self.stdout.write(self.style.SUCCESS(f"{nb_lignes} ligne(s) de cumul reconstruite(s)."))
@@ -0,0 +1,52 @@
+# Generated by Django 4.2.30 on 2026-10-17 14:18
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def initialiser_cumuls(apps, schema_editor):
+    Vente = apps.get_model('ventes', 'Vente')
+    VenteJournaliere = apps.get_model('ventes', 'VenteJournaliere')
+    cumuls = (
+        Vente.objects.order_by()
+        .values('date', 'magasin_id', 'produit_id', 'type_vente')
+        .annotate(
+            nb_ventes=models.Count('id'),
+            quantite=models.Sum('quantite_vendue'),
+            total=models.Sum('total_vente'),
+        )
+    )
+    VenteJournaliere.objects.bulk_create(
+        [VenteJournaliere(**c) for c in cumuls.iterator()], batch_size=5000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fournisseurs', '0001_initial'),
+        ('ventes', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VenteJournaliere',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Date')),
+                ('type_vente', models.CharField(choices=[('cash', 'Cash'), ('credit', 'Crédit')], max_length=10, verbose_name='Type de vente')),
+                ('nb_ventes', models.IntegerField(default=0, verbose_name='Nombre de ventes')),
+                ('quantite', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Quantité vendue')),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=16, verbose_name='Total des ventes')),
+                ('magasin', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ventes_journalieres', to='ventes.magasin', verbose_name='Magasin')),
+                ('produit', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ventes_journalieres', to='fournisseurs.produit', verbose_name='Produit')),
+            ],
+            options={
+                'verbose_name': 'Vente journalière',
+                'verbose_name_plural': 'Ventes journalières',
+                'ordering': ['-date', 'magasin', 'produit'],
+                'unique_together': {('date', 'magasin', 'produit', 'type_vente')},
+            },
+        ),
+        migrations.RunPython(initialiser_cumuls, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.30 on 2026-10-17 14:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventes', '0003_index_pagination'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Ticket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('numero', models.CharField(max_length=50, unique=True, verbose_name='N° de ticket')),
+                ('date', models.DateField(verbose_name='Date de vente')),
+                ('type_vente', models.CharField(choices=[('cash', 'Cash'), ('credit', 'Crédit')], max_length=10, verbose_name='Type de vente')),
+                ('nb_lignes', models.IntegerField(default=0, verbose_name='Nombre de lignes')),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Total du ticket')),
+                ('date_creation', models.DateTimeField(auto_now_add=True, verbose_name='Date de création')),
+                ('client', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tickets', to='ventes.client', verbose_name='Client')),
+                ('magasin', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tickets', to='ventes.magasin', verbose_name='Magasin')),
+            ],
+            options={
+                'verbose_name': 'Ticket de vente',
+                'verbose_name_plural': 'Tickets de vente',
+                'ordering': ['-date', '-date_creation'],
+            },
+        ),
+        migrations.AddField(
+            model_name='vente',
+            name='ticket',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='lignes', to='ventes.ticket', verbose_name='Ticket'),
+        ),
+    ]
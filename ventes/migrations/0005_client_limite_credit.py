@@ -0,0 +1,20 @@
+# Generated by Django 4.2.30 on 2026-10-17 14:50
+
+from decimal import Decimal
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventes', '0004_ticket'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='client',
+            name='limite_credit',
+            field=models.DecimalField(decimal_places=2, default=0, help_text='Encours maximal autorisé (0 : pas de limite)', max_digits=12, validators=[django.core.validators.MinValueValidator(Decimal('0'))], verbose_name='Limite de crédit'),
+        ),
+    ]
@@ -1,8 +1,15 @@
-from django.db import models
+from django.db import models, transaction
+from django.core.exceptions import ObjectDoesNotExist
 from django.core.validators import MinValueValidator
 from decimal import Decimal
 from fournisseurs.models import Produit
 
+# Types de vente, communs aux ventes et aux tickets
+TYPE_VENTE_CHOICES = [
+    ('cash', 'Cash'),
+    ('credit', 'Crédit'),
+]
+
 
 class Magasin(models.Model):
     """
@@ -32,6 +39,10 @@ class Client(models.Model):
     telephone = models.CharField(max_length=20, blank=True, null=True, verbose_name="Téléphone")
     email = models.EmailField(blank=True, null=True, verbose_name="Email")
     adresse = models.TextField(blank=True, null=True, verbose_name="Adresse")
+    limite_credit = models.DecimalField(max_digits=12, decimal_places=2, default=0,
+                                       verbose_name="Limite de crédit",
+                                       help_text="Encours maximal autorisé (0 : pas de limite)",
+                                       validators=[MinValueValidator(Decimal('0'))])
     date_creation = models.DateTimeField(auto_now_add=True, verbose_name="Date de création")
     
     class Meta:
@@ -39,21 +50,55 @@ class Client(models.Model):
         verbose_name_plural = "Clients"
         ordering = ['nom', 'prenom']
     
+    @property
+    def credit_actuel(self):
+        """Encours de crédit du client (table credits.EncoursClient)"""
+        try:
+            return self.encours.encours
+        except ObjectDoesNotExist:
+            return Decimal('0')
+    
     def __str__(self):
         if self.prenom:
             return f"{self.nom} {self.prenom}"
         return self.nom
 
 
+class Ticket(models.Model):
+    """
+    En-tête d'une vente à plusieurs produits (panier).
+    Chaque ligne du ticket est une Vente rattachée par le champ ticket,
+    ce qui laisse les listes et statistiques de ventes inchangées.
+    """
+    numero = models.CharField(max_length=50, unique=True, verbose_name="N° de ticket")
+    date = models.DateField(verbose_name="Date de vente")
+    magasin = models.ForeignKey(Magasin, on_delete=models.CASCADE, related_name='tickets',
+                                verbose_name="Magasin")
+    client = models.ForeignKey(Client, on_delete=models.CASCADE, related_name='tickets',
+                               verbose_name="Client")
+    type_vente = models.CharField(max_length=10, choices=TYPE_VENTE_CHOICES, verbose_name="Type de vente")
+    nb_lignes = models.IntegerField(default=0, verbose_name="Nombre de lignes")
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0,
+                                verbose_name="Total du ticket")
+    
+    # Champs automatiques
+    date_creation = models.DateTimeField(auto_now_add=True, verbose_name="Date de création")
+    
+    class Meta:
+        verbose_name = "Ticket de vente"
+        verbose_name_plural = "Tickets de vente"
+        ordering = ['-date', '-date_creation']
+    
+    def __str__(self):
+        return f"{self.numero} - {self.client} - {self.date}"
+
+
 class Vente(models.Model):
     """
     Modèle pour les ventes
     Correspond au Module 2 : Gestion des ventes
     """
-    TYPE_VENTE_CHOICES = [
-        ('cash', 'Cash'),
-        ('credit', 'Crédit'),
-    ]
+    TYPE_VENTE_CHOICES = TYPE_VENTE_CHOICES
     
     numero = models.CharField(max_length=50, unique=True, verbose_name="N° de vente")
     date = models.DateField(verbose_name="Date de vente")
@@ -70,6 +115,8 @@ class Vente(models.Model):
                                       validators=[MinValueValidator(Decimal('0.01'))])
     total_vente = models.DecimalField(max_digits=12, decimal_places=2, 
                                     verbose_name="Total vente", editable=False)
+    ticket = models.ForeignKey(Ticket, on_delete=models.CASCADE, blank=True, null=True,
+                               related_name='lignes', verbose_name="Ticket")
     
     # Champs automatiques
     date_creation = models.DateTimeField(auto_now_add=True, verbose_name="Date de création")
@@ -79,18 +126,77 @@ class Vente(models.Model):
         verbose_name = "Vente"
         verbose_name_plural = "Ventes"
         ordering = ['-date', '-date_creation']
+        indexes = [
+            # Pagination par clé sur (date, date_creation, id)
+            models.Index(fields=['date', 'date_creation', 'id'], name='vente_pagination_idx'),
+        ]
     
     def save(self, *args, **kwargs):
         """
-        Calcul automatique du total de vente
+        Calcul automatique du total de vente, sortie du stock du magasin et
+        mise à jour du cumul journalier dans la même transaction. Une
+        modification qui ne touche ni le magasin, ni le produit, ni la
+        quantité, ni la date ne fait aucun mouvement de stock.
+        Lève StockInsuffisant si la quantité n'est pas disponible.
         """
+        from .services import cumuler_vente
+        from stocks.services import sortir_stock, rentrer_stock
+
         self.total_vente = self.quantite_vendue * self.prix_unitaire
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            precedente = None
+            if self.pk:
+                precedente = Vente.objects.filter(pk=self.pk).only(*CHAMPS_CUMUL).first()
+            stock_modifie = precedente is None or (
+                (precedente.magasin_id, precedente.produit_id, precedente.quantite_vendue, precedente.date)
+                != (self.magasin_id, self.produit_id, self.quantite_vendue, self.date)
+            )
+            if precedente is not None and stock_modifie:
+                rentrer_stock(precedente.magasin_id, precedente.produit_id, precedente.quantite_vendue,
+                              'vente', self.numero, precedente.date)
+            if stock_modifie:
+                sortir_stock(self.magasin_id, self.produit_id, self.quantite_vendue, 'vente', self.numero, self.date)
+            super().save(*args, **kwargs)
+            if precedente is not None:
+                cumuler_vente(precedente, signe=-1)
+            cumuler_vente(self)
     
     def __str__(self):
         return f"{self.numero} - {self.client} - {self.date}"
 
 
+# Champs de Vente dont dépendent le cumul journalier et le stock
+CHAMPS_CUMUL = ('date', 'magasin', 'produit', 'type_vente', 'quantite_vendue', 'total_vente')
+
+
+class VenteJournaliere(models.Model):
+    """
+    Cumul journalier des ventes par magasin, produit et type de vente.
+    Tenu à jour à chaque création, modification et suppression de Vente.
+    """
+    date = models.DateField(verbose_name="Date")
+    magasin = models.ForeignKey(Magasin, on_delete=models.CASCADE,
+                                related_name='ventes_journalieres', verbose_name="Magasin")
+    produit = models.ForeignKey(Produit, on_delete=models.CASCADE,
+                                related_name='ventes_journalieres', verbose_name="Produit")
+    type_vente = models.CharField(max_length=10, choices=Vente.TYPE_VENTE_CHOICES,
+                                  verbose_name="Type de vente")
+    nb_ventes = models.IntegerField(default=0, verbose_name="Nombre de ventes")
+    quantite = models.DecimalField(max_digits=14, decimal_places=2, default=0,
+                                   verbose_name="Quantité vendue")
+    total = models.DecimalField(max_digits=16, decimal_places=2, default=0,
+                                verbose_name="Total des ventes")
+    
+    class Meta:
+        verbose_name = "Vente journalière"
+        verbose_name_plural = "Ventes journalières"
+        unique_together = ['date', 'magasin', 'produit', 'type_vente']
+        ordering = ['-date', 'magasin', 'produit']
+    
+    def __str__(self):
+        return f"{self.date} - {self.magasin} - {self.produit} ({self.type_vente})"
+
+
 class Commercial(models.Model):
     """
     Modèle pour les commerciaux/vendeurs
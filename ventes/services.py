@@ -0,0 +1,156 @@
+"""
+Services du module ventes : maintenance incrémentale des cumuls journaliers
+et enregistrement des tickets à plusieurs lignes
+"""
+import re
+from collections import defaultdict
+from datetime import date as dt_date
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from core.nombres import lire_decimal, tient_dans
+from core.sequences import enregistrer_numerote
+from .models import Ticket, Vente, VenteJournaliere
+
+
+def ajuster_cumul(date, magasin_id, produit_id, type_vente, nb_ventes, quantite, total):
+    """
+    Applique un delta (positif ou négatif) à la ligne de cumul
+    (date, magasin, produit, type_vente) par une mise à jour SQL atomique.
+    La ligne est créée pour un delta positif, et supprimée lorsqu'elle
+    ne compte plus aucune vente.
+    """
+    lignes = VenteJournaliere.objects.filter(
+        date=date, magasin_id=magasin_id, produit_id=produit_id, type_vente=type_vente
+    )
+    deltas = {
+        'nb_ventes': F('nb_ventes') + nb_ventes,
+        'quantite': F('quantite') + quantite,
+        'total': F('total') + total,
+    }
+    if lignes.update(**deltas):
+        if nb_ventes < 0:
+            lignes.filter(nb_ventes__lte=0).delete()
+        return
+    if nb_ventes <= 0:
+        # Rien à retirer (ex: cumul déjà supprimé par une cascade)
+        return
+    try:
+        with transaction.atomic():
+            VenteJournaliere.objects.create(
+                date=date, magasin_id=magasin_id, produit_id=produit_id, type_vente=type_vente,
+                nb_ventes=nb_ventes, quantite=quantite, total=total,
+            )
+    except IntegrityError:
+        # Ligne créée entre-temps par une écriture concurrente
+        lignes.update(**deltas)
+
+
+def cumuler_vente(vente, signe=1):
+    """
+    Ajoute (signe=1) ou retire (signe=-1) une vente de son cumul journalier
+    """
+    ajuster_cumul(
+        vente.date, vente.magasin_id, vente.produit_id, vente.type_vente,
+        signe, signe * vente.quantite_vendue, signe * vente.total_vente,
+    )
+
+
+def enregistrer_ticket(numero, date, magasin, client, type_vente, lignes):
+    """
+    Valide puis enregistre un ticket et toutes ses lignes en une transaction.
+    lignes: liste de dictionnaires {'produit': id, 'quantite': ..., 'prix_unitaire': ...}.
+    Les règles sont celles de vente_create, appliquées à toutes les lignes
+    avant toute écriture ; les erreurs sont levées ensemble dans une
+    ValidationError. Sans numéro, le prochain numéro VTE est attribué à
+    l'enregistrement. Retourne le ticket créé.
+    """
+    from fournisseurs.models import Produit
+    from stocks.models import StockActuel
+    from stocks.services import StockInsuffisant, sortir_stock
+    from credits.services import verifier_limite_credit
+
+    erreurs = []
+    if numero and not re.match(r'^VTE\d{4,}$', numero):
+        erreurs.append("Numéro invalide. Format attendu: VTE0001")
+    elif numero and (Ticket.objects.filter(numero=numero).exists() or Vente.objects.filter(numero=numero).exists()):
+        erreurs.append(f"Le numéro {numero} existe déjà.")
+    if date > dt_date.today():
+        erreurs.append("La date ne peut pas être dans le futur.")
+    if type_vente not in {'cash', 'credit'}:
+        erreurs.append("Type de vente invalide.")
+    if not lignes:
+        erreurs.append("Le ticket doit contenir au moins une ligne.")
+
+    # Une requête pour les produits et une pour le stock du magasin
+    produits = Produit.objects.in_bulk({str(l.get('produit')) for l in lignes if str(l.get('produit')).isdigit()})
+    en_stock = set(
+        StockActuel.objects.filter(magasin=magasin, produit_id__in=produits).values_list('produit_id', flat=True)
+    )
+
+    champ_quantite = Vente._meta.get_field('quantite_vendue')
+    champ_prix = Vente._meta.get_field('prix_unitaire')
+    champ_total = Vente._meta.get_field('total_vente')
+    ventes = []
+    for i, ligne in enumerate(lignes, start=1):
+        produit = produits.get(int(ligne['produit'])) if str(ligne.get('produit')).isdigit() else None
+        quantite = lire_decimal(ligne.get('quantite'), champ_quantite)
+        prix = lire_decimal(ligne.get('prix_unitaire'), champ_prix)
+        if produit is None:
+            erreurs.append(f"Ligne {i} : produit introuvable.")
+        elif produit.pk not in en_stock:
+            erreurs.append(f"Ligne {i} : {produit.nom} n'est pas disponible dans le magasin choisi.")
+        if quantite is None or quantite <= 0:
+            erreurs.append(f"Ligne {i} : la quantité doit être un nombre positif valide.")
+        if prix is None or prix <= 0:
+            erreurs.append(f"Ligne {i} : le prix unitaire doit être un nombre positif valide.")
+        if produit is not None and quantite and prix:
+            total = (quantite * prix).quantize(Decimal('0.01'))
+            if not tient_dans(total, champ_total):
+                erreurs.append(f"Ligne {i} : montant trop élevé.")
+                continue
+            ventes.append(Vente(
+                date=date, magasin=magasin, client=client,
+                produit=produit, quantite_vendue=quantite, prix_unitaire=prix,
+                type_vente=type_vente, total_vente=total,
+            ))
+    if ventes and not erreurs and not tient_dans(sum(v.total_vente for v in ventes), Ticket._meta.get_field('total')):
+        erreurs.append("Montant total du ticket trop élevé.")
+    if type_vente == 'credit' and ventes and not erreurs:
+        try:
+            verifier_limite_credit(client, sum(v.total_vente for v in ventes))
+        except ValidationError as e:
+            erreurs.extend(e.messages)
+    if erreurs:
+        raise ValidationError(erreurs)
+
+    # bulk_create n'appelle pas Vente.save() : stock et cumuls ajustés par produit
+    cumuls = defaultdict(lambda: [0, Decimal('0'), Decimal('0')])
+    for vente in ventes:
+        cumul = cumuls[vente.produit_id]
+        cumul[0] += 1
+        cumul[1] += vente.quantite_vendue
+        cumul[2] += vente.total_vente
+
+    def enregistrer(numero):
+        for produit_id, (_, quantite, _) in cumuls.items():
+            try:
+                sortir_stock(magasin.pk, produit_id, quantite, 'vente', numero, date)
+            except StockInsuffisant:
+                raise ValidationError(f"Stock insuffisant pour {produits[produit_id].nom} : {quantite} demandé(s).")
+        ticket = Ticket.objects.create(
+            numero=numero, date=date, magasin=magasin, client=client, type_vente=type_vente,
+            nb_lignes=len(ventes), total=sum(v.total_vente for v in ventes),
+        )
+        for i, vente in enumerate(ventes, start=1):
+            vente.numero = f"{numero}-{i:02d}"
+            vente.ticket = ticket
+        Vente.objects.bulk_create(ventes)
+        for produit_id, (nb, quantite, total) in cumuls.items():
+            ajuster_cumul(date, magasin.pk, produit_id, type_vente, nb, quantite, total)
+        return ticket
+
+    # Une seule transaction : un numéro attribué déjà pris est remplacé par le suivant
+    return enregistrer_numerote('VTE', enregistrer, numero or None)
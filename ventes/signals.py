@@ -0,0 +1,22 @@
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from .models import Vente
+from .services import cumuler_vente
+from stocks.services import annuler_sortie
+
+
+@receiver(post_delete, sender=Vente)
+def retirer_vente_du_cumul(sender, instance, **kwargs):
+    """
+    Retire la vente supprimée de son cumul journalier.
+    Le signal est émis dans la transaction de suppression, y compris
+    lors des suppressions en cascade (client, magasin, produit).
+    """
+    cumuler_vente(instance, signe=-1)
+
+
+@receiver(post_delete, sender=Vente)
+def remettre_vente_en_stock(sender, instance, **kwargs):
+    """Remet en stock la quantité d'une vente supprimée"""
+    annuler_sortie(kwargs.get('origin'), instance.magasin_id, instance.produit_id, instance.quantite_vendue,
+                   'vente', instance.numero, instance.date)
@@ -0,0 +1,45 @@
+import io
+from datetime import date
+from decimal import Decimal
+
+from django.test import TestCase
+
+from fournisseurs.models import Produit
+from stocks.models import StockActuel
+from stocks.services import entrer_stock
+from .importation import importer_ventes
+from .models import Client, Magasin, Vente
+
+
+class ImportVentesTests(TestCase):
+
+    def setUp(self):
+        self.magasin = Magasin.objects.create(nom='Magasin test')
+        self.produit = Produit.objects.create(nom='Riz', unite_mesure='sac', prix_vente_conseille=Decimal('10'))
+        self.client_test = Client.objects.create(nom='Client test')
+        entrer_stock(self.magasin.pk, self.produit.pk, 1000, Decimal('5'), 'ajustement', 'INIT')
+
+    def _importer(self, lignes, partiel):
+        jour = date.today().isoformat()
+        contenu = 'numero,date,magasin,client,produit,quantite_vendue,prix_unitaire,type_vente\n' + ''.join(
+            f'VTE{i:04d},{jour},{self.magasin.pk},{self.client_test.pk},{self.produit.pk},{quantite},{prix},cash\n'
+            for i, (quantite, prix) in enumerate(lignes, start=1)
+        )
+        return importer_ventes(io.BytesIO(contenu.encode()), 'ventes.csv', partiel=partiel)
+
+    def test_valeurs_hors_bornes(self):
+        rapport = self._importer([('1e30', '10'), ('99999999999999999999999999999', '10'),
+                                  ('99999999', '99999999')], partiel=False)
+        self.assertEqual([ligne for ligne, _ in rapport.erreurs], [2, 3, 4])
+        self.assertEqual(Vente.objects.count(), 0)
+
+    def test_stock_insuffisant_sur_sa_ligne(self):
+        lignes = [('600', '10'), ('500', '10'), ('400', '10')]
+        rapport = self._importer(lignes, partiel=False)
+        self.assertEqual([ligne for ligne, _ in rapport.erreurs], [3])
+        self.assertEqual(rapport.nb_importees, 0)
+
+        rapport = self._importer(lignes, partiel=True)
+        self.assertEqual([ligne for ligne, _ in rapport.erreurs], [3])
+        self.assertEqual(rapport.nb_importees, 2)
+        self.assertEqual(StockActuel.objects.get().quantite_actuelle, 0)
@@ -7,12 +7,15 @@ urlpatterns = [
     # Ventes
     path('ventes/', views.vente_list, name='vente_list'),
     path('ventes/nouvelle/', views.vente_create, name='vente_create'),
+    path('ventes/ticket/', views.ticket_create, name='ticket_create'),
     path('ventes/export/', views.vente_export_excel, name='vente_export'),
+    path('ventes/import/', views.vente_import, name='vente_import'),
     
     # Clients
     path('clients/', views.client_list, name='client_list'),
     path('clients/nouveau/', views.client_create, name='client_create'),
     path('clients/export/', views.client_export_excel, name='client_export'),
+    path('clients/autocompletion/', views.client_autocompletion, name='client_autocompletion'),
     
     # Statistiques
     path('statistiques/', views.statistiques_ventes, name='statistiques'),
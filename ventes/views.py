@@ -1,13 +1,27 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Sum, Count, Q
+from django.db.models import Sum
 from django.core.paginator import Paginator
-from django.http import HttpResponse
-from .models import Magasin, Client, Vente, Commercial
+from core.pagination import paginer_par_curseur
+from django.http import JsonResponse
+from django.core.exceptions import ValidationError
+from .models import Magasin, Client, Vente, VenteJournaliere, Commercial
+from . import exports
+from core.exports import reponse_export
+from core.filtres import identifiant
+from .importation import importer_ventes, COLONNES
+from .services import enregistrer_ticket
+from .autocompletion import CLIENTS
 from stocks.models import StockActuel
+from core.agregats import calculer_totaux, somme
+from core.sequences import enregistrer_numerote
+from core import referentiel, recherche
+from credits.services import verifier_limite_credit
 from .forms import MagasinForm, ClientForm, VenteForm
 from datetime import datetime, date as dt_date
+from decimal import Decimal, InvalidOperation
+import json
 import re
 
 
@@ -19,7 +33,7 @@ def vente_list(request):
     ventes = Vente.objects.select_related('magasin', 'client', 'produit').all()
     
     # Filtres
-    magasin_id = request.GET.get('magasin')
+    magasin_id = identifiant(request.GET, 'magasin')
     if magasin_id:
         ventes = ventes.filter(magasin_id=magasin_id)
     
@@ -35,22 +49,21 @@ def vente_list(request):
         ventes = ventes.filter(date__lte=date_fin)
     
     # Pagination
-    paginator = Paginator(ventes, 15)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = paginer_par_curseur(request, ventes, 15)
     
     # Statistiques
-    total_ventes = ventes.aggregate(Sum('total_vente'))['total_vente__sum'] or 0
-    ventes_cash = ventes.filter(type_vente='cash').aggregate(Sum('total_vente'))['total_vente__sum'] or 0
-    ventes_credit = ventes.filter(type_vente='credit').aggregate(Sum('total_vente'))['total_vente__sum'] or 0
+    totaux = calculer_totaux(
+        ventes,
+        total_ventes=somme('total_vente'),
+        ventes_cash=somme('total_vente', type_vente='cash'),
+        ventes_credit=somme('total_vente', type_vente='credit'),
+    )
     
     context = {
         'title': 'Liste des Ventes',
         'page_obj': page_obj,
-        'magasins': Magasin.objects.all(),
-        'total_ventes': total_ventes,
-        'ventes_cash': ventes_cash,
-        'ventes_credit': ventes_credit,
+        'magasins': referentiel.liste('magasins'),
+        **totaux,
         'filters': {
             'magasin': magasin_id,
             'type_vente': type_vente,
@@ -68,8 +81,8 @@ def vente_create(request):
     """
     if request.method == 'POST':
         try:
-            # Récupérer les données du formulaire
-            numero = request.POST.get('numero')
+            # Récupérer les données du formulaire (numéro attribué à l'enregistrement si laissé vide)
+            numero = (request.POST.get('numero') or '').strip()
             date = request.POST.get('date')
             magasin_id = request.POST.get('magasin')
             client_id = request.POST.get('client')
@@ -80,7 +93,7 @@ def vente_create(request):
             
             # Validations serveur
             # Numéro: format VTE + chiffres (au moins 4)
-            if not numero or not re.match(r'^VTE\d{4,}$', numero):
+            if numero and not re.match(r'^VTE\d{4,}$', numero):
                 messages.error(request, "Numéro invalide. Format attendu: VTE0001")
                 raise ValueError('numero_invalide')
 
@@ -184,9 +197,17 @@ def vente_create(request):
                     messages.error(request, "Le produit sélectionné n'est pas disponible dans le magasin choisi.")
                     raise ValueError('produit_non_disponible_dans_magasin')
 
+            # Limite de crédit du client (encours lu en une requête)
+            if type_vente == 'credit' and client:
+                try:
+                    verifier_limite_credit(client, Decimal(str(quantite_val)) * Decimal(str(prix_val)))
+                except ValidationError as e:
+                    messages.error(request, e.messages[0])
+                    raise ValueError('limite_credit_depassee')
+
             # Créer la vente
             if magasin and client and produit:
-                vente = Vente.objects.create(
+                vente = enregistrer_numerote('VTE', lambda numero: Vente.objects.create(
                     numero=numero,
                     date=date_obj,
                     magasin=magasin,
@@ -195,8 +216,8 @@ def vente_create(request):
                     quantite_vendue=quantite_val,
                     prix_unitaire=prix_val,
                     type_vente=type_vente
-                )
-                messages.success(request, f'Vente {numero} enregistrée avec succès!')
+                ), numero)
+                messages.success(request, f'Vente {vente.numero} enregistrée avec succès!')
                 return redirect('ventes:vente_list')
             else:
                 messages.error(request, 'Erreur: Tous les champs obligatoires doivent être remplis.')
@@ -205,32 +226,110 @@ def vente_create(request):
             messages.error(request, f'Erreur lors de l\'enregistrement: {str(e)}')
     
     # Préparer les données pour le template
-    from fournisseurs.models import Produit
     context = {
         'title': 'Nouvelle Vente',
-        'magasins': Magasin.objects.all(),
-        'clients': Client.objects.all(),
-        'produits': Produit.objects.all(),
+        **referentiel.formulaire('magasins'),
         'today': '2025-08-15',  # Date du jour
     }
     return render(request, 'ventes/vente_form.html', context)
 
 
+@login_required
+def ticket_create(request):
+    """
+    Enregistrer un ticket (panier) de plusieurs produits en un seul envoi.
+    Accepte un formulaire (listes produit/quantite/prix_unitaire) ou un
+    corps JSON {numero, date, magasin, client, type_vente, lignes: [...]}.
+    """
+    if request.method == 'POST':
+        en_json = request.content_type == 'application/json'
+        try:
+            if en_json:
+                donnees = json.loads(request.body)
+                if not isinstance(donnees, dict):
+                    raise ValidationError("Le panier doit être un objet JSON.")
+                lignes = donnees.get('lignes') or []
+                if not isinstance(lignes, list) or not all(isinstance(ligne, dict) for ligne in lignes):
+                    raise ValidationError("Les lignes du panier doivent être une liste d'objets.")
+            else:
+                donnees = request.POST
+                lignes = [
+                    {'produit': produit, 'quantite': quantite, 'prix_unitaire': prix}
+                    for produit, quantite, prix in zip(
+                        donnees.getlist('produit'), donnees.getlist('quantite'), donnees.getlist('prix_unitaire')
+                    )
+                    if produit
+                ]
+            try:
+                date_obj = datetime.strptime(donnees.get('date') or '', '%Y-%m-%d').date()
+            except ValueError:
+                raise ValidationError("Date invalide.")
+            magasin = Magasin.objects.filter(pk=donnees.get('magasin')).first()
+            client = Client.objects.filter(pk=donnees.get('client')).first()
+            if magasin is None or client is None:
+                raise ValidationError("Magasin et client sont obligatoires.")
+            ticket = enregistrer_ticket(
+                str(donnees.get('numero') or '').strip(), date_obj, magasin, client, donnees.get('type_vente'), lignes
+            )
+        except (ValueError, TypeError, InvalidOperation, ValidationError) as e:
+            erreurs = e.messages if isinstance(e, ValidationError) else ["Données du panier invalides."]
+            if en_json:
+                return JsonResponse({'erreurs': erreurs}, status=400)
+            for erreur in erreurs:
+                messages.error(request, erreur)
+        else:
+            if en_json:
+                return JsonResponse({'id': ticket.pk, 'numero': ticket.numero,
+                                     'nb_lignes': ticket.nb_lignes, 'total': str(ticket.total)}, status=201)
+            messages.success(request, f'Ticket {ticket.numero} enregistré : {ticket.nb_lignes} ligne(s).')
+            return redirect('ventes:vente_list')
+    
+    context = {
+        'title': 'Nouveau Ticket',
+        **referentiel.formulaire('magasins'),
+        'today': dt_date.today().isoformat(),
+    }
+    return render(request, 'ventes/ticket_form.html', context)
+
+
+@login_required
+def vente_import(request):
+    """
+    Importer des ventes en masse depuis un fichier CSV ou Excel
+    """
+    rapport = None
+    if request.method == 'POST':
+        fichier = request.FILES.get('fichier')
+        if not fichier:
+            messages.error(request, "Veuillez choisir un fichier CSV ou Excel.")
+        else:
+            rapport = importer_ventes(fichier.file, fichier.name, partiel=bool(request.POST.get('partiel')))
+            if rapport.nb_importees:
+                messages.success(request, f"{rapport.nb_importees} vente(s) importée(s) sur {rapport.nb_lignes} ligne(s).")
+            if rapport.erreurs and not rapport.nb_importees:
+                messages.error(request, f"Aucune vente importée : {len(rapport.erreurs)} ligne(s) en erreur.")
+            elif rapport.erreurs:
+                messages.warning(request, f"{len(rapport.erreurs)} ligne(s) ignorée(s).")
+    
+    context = {
+        'title': 'Import de Ventes',
+        'rapport': rapport,
+        'colonnes': COLONNES,
+    }
+    return render(request, 'ventes/vente_import.html', context)
+
+
 @login_required
 def client_list(request):
     """
     Liste des clients
     """
-    clients = Client.objects.all()
+    clients = Client.objects.select_related('encours')
     
     # Recherche
     search = request.GET.get('search')
     if search:
-        clients = clients.filter(
-            Q(nom__icontains=search) | 
-            Q(prenom__icontains=search) |
-            Q(telephone__icontains=search)
-        )
+        clients = recherche.rechercher(clients, 'clients', search)
     
     # Pagination
     paginator = Paginator(clients, 10)
@@ -245,6 +344,15 @@ def client_list(request):
     return render(request, 'ventes/client_list.html', context)
 
 
+@login_required
+def client_autocompletion(request):
+    """
+    Suggestions de clients (JSON) pour les champs de recherche des formulaires
+    """
+    resultats = CLIENTS.rechercher(request.GET.get('q', ''))
+    return JsonResponse({'resultats': [{'id': pk, 'texte': texte} for pk, texte in resultats]})
+
+
 @login_required
 def client_create(request):
     """
@@ -271,44 +379,52 @@ def statistiques_ventes(request):
     """
     Statistiques des ventes
     """
-    from datetime import datetime, timedelta
+    from datetime import timedelta
     from django.utils import timezone
-    from django.db.models import TruncMonth, TruncDay
+    from django.db.models.functions import TruncMonth
+    
+    # Toutes les statistiques sont lues depuis les cumuls journaliers
+    cumuls = VenteJournaliere.objects.all()
     
     # Statistiques générales
-    total_ventes = Vente.objects.aggregate(Sum('total_vente'))['total_vente__sum'] or 0
-    ventes_cash = Vente.objects.filter(type_vente='cash').aggregate(Sum('total_vente'))['total_vente__sum'] or 0
-    ventes_credit = Vente.objects.filter(type_vente='credit').aggregate(Sum('total_vente'))['total_vente__sum'] or 0
+    totaux = calculer_totaux(
+        cumuls,
+        total_ventes=somme('total'),
+        ventes_cash=somme('total', type_vente='cash'),
+        ventes_credit=somme('total', type_vente='credit'),
+    )
     
     # Ventes par magasin
     ventes_par_magasin = Magasin.objects.annotate(
-        total_ventes=Sum('vente__total_vente'),
-        nb_ventes=Count('vente')
+        total_ventes=Sum('ventes_journalieres__total'),
+        nb_ventes=Sum('ventes_journalieres__nb_ventes')
     ).filter(total_ventes__isnull=False).order_by('-total_ventes')
     
     # Ventes mensuelles (derniers 12 mois)
     date_limite = timezone.now().date() - timedelta(days=365)
-    ventes_mensuelles = Vente.objects.filter(date__gte=date_limite).annotate(
-        mois=TruncMonth('date')
-    ).values('mois').annotate(
-        total=Sum('total_vente'),
-        nb_ventes=Count('id')
-    ).order_by('mois')
+    ventes_mensuelles = [
+        {'mois': r['mois'], 'total': r['montant'], 'nb_ventes': r['nb']}
+        for r in cumuls.filter(date__gte=date_limite).annotate(
+            mois=TruncMonth('date')
+        ).values('mois').annotate(
+            montant=Sum('total'),
+            nb=Sum('nb_ventes')
+        ).order_by('mois')
+    ]
     
     # Ventes journalières (derniers 30 jours)
     date_limite_jour = timezone.now().date() - timedelta(days=30)
-    ventes_journalieres = Vente.objects.filter(date__gte=date_limite_jour).annotate(
-        jour=TruncDay('date')
-    ).values('jour').annotate(
-        total=Sum('total_vente'),
-        nb_ventes=Count('id')
-    ).order_by('jour')
+    ventes_journalieres = [
+        {'jour': r['date'], 'total': r['montant'], 'nb_ventes': r['nb']}
+        for r in cumuls.filter(date__gte=date_limite_jour).values('date').annotate(
+            montant=Sum('total'),
+            nb=Sum('nb_ventes')
+        ).order_by('date')
+    ]
     
     context = {
         'title': 'Statistiques des Ventes',
-        'total_ventes': total_ventes,
-        'ventes_cash': ventes_cash,
-        'ventes_credit': ventes_credit,
+        **totaux,
         'ventes_par_magasin': ventes_par_magasin,
         'ventes_mensuelles': ventes_mensuelles,
         'ventes_journalieres': ventes_journalieres,
@@ -318,80 +434,11 @@ def statistiques_ventes(request):
 
 @login_required
 def client_export_excel(request):
-    """Exporter la liste des clients (avec recherche/type) en Excel"""
-    clients = Client.objects.all().order_by('nom', 'prenom')
-
-    search = request.GET.get('search')
-    if search:
-        clients = clients.filter(
-            Q(nom__icontains=search)
-            | Q(prenom__icontains=search)
-            | Q(telephone__icontains=search)
-        )
-    type_client = request.GET.get('type_client')
-    if type_client in {'particulier', 'entreprise'}:
-        clients = clients.filter(type_client=type_client)
-
-    from openpyxl import Workbook
-    wb = Workbook()
-    ws = wb.active
-    ws.title = 'Clients'
-    ws.append(['Nom', 'Prénom', 'Téléphone', 'Email', 'Type', 'Limite crédit', 'Crédit actuel'])
-    for c in clients:
-        ws.append([
-            c.nom,
-            c.prenom or '',
-            c.telephone or '',
-            c.email or '',
-            c.type_client,
-            float(c.limite_credit) if c.limite_credit is not None else 0,
-            float(c.credit_actuel) if c.credit_actuel is not None else 0,
-        ])
-
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = 'attachment; filename="clients.xlsx"'
-    wb.save(response)
-    return response
+    """Exporter la liste des clients (avec recherche) en Excel"""
+    return reponse_export(request, exports.CLIENTS)
 
 
 @login_required
 def vente_export_excel(request):
     """Exporter la liste des ventes (avec filtres) en Excel"""
-    ventes = Vente.objects.select_related('magasin', 'client', 'produit').all().order_by('-date')
-
-    magasin_id = request.GET.get('magasin')
-    if magasin_id:
-        ventes = ventes.filter(magasin_id=magasin_id)
-    type_vente = request.GET.get('type_vente')
-    if type_vente in {'cash', 'credit'}:
-        ventes = ventes.filter(type_vente=type_vente)
-    date_debut = request.GET.get('date_debut')
-    date_fin = request.GET.get('date_fin')
-    if date_debut:
-        ventes = ventes.filter(date__gte=date_debut)
-    if date_fin:
-        ventes = ventes.filter(date__lte=date_fin)
-
-    from openpyxl import Workbook
-    wb = Workbook()
-    ws = wb.active
-    ws.title = 'Ventes'
-    ws.append(['N° Vente', 'Date', 'Magasin', 'Client', 'Produit', 'Quantité', 'Unité', 'Type', 'Prix unitaire', 'Total'])
-    for v in ventes:
-        ws.append([
-            v.numero,
-            v.date.strftime('%d/%m/%Y') if v.date else '',
-            v.magasin.nom if v.magasin else '',
-            str(v.client) if v.client else '',
-            v.produit.nom if v.produit else '',
-            float(v.quantite_vendue) if v.quantite_vendue is not None else 0,
-            v.produit.unite_mesure if v.produit else '',
-            v.type_vente,
-            float(v.prix_unitaire) if v.prix_unitaire is not None else 0,
-            float(v.total_vente) if getattr(v, 'total_vente', None) is not None else (float(v.quantite_vendue or 0) * float(v.prix_unitaire or 0)),
-        ])
-
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = 'attachment; filename="ventes.xlsx"'
-    wb.save(response)
-    return response
+    return reponse_export(request, exports.VENTES)